@@ -1,17 +1,173 @@
 # -*- coding: utf-8 -*-
+import hashlib
+import os
+import re
 import sqlite3
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
 from load_config import load_config as read_config
+from schema_module import ColumnSchema
+from instrument_module import instrumented
+from export_module import export_xlsx
 
-def calculate_goals(sales_df, goal_df, period_df):
+# 目标类型：输出列 → (目标表中月度列前缀, 池列, 参与完成度计算的渠道)
+GOAL_TYPES = {
+    '全渠道目标': ('全渠道', '全渠道池', ['pos小程序', '美团团购', '抖音']),
+    '外卖目标': ('外卖渠道', '外卖池', ['线上外卖']),
+}
+COMPLETION_METRICS = ['流水', '实收', '订单数']
+GOAL_COLUMN_PATTERN = re.compile(r'^(全渠道|外卖渠道)(\d{6})$')
 
+GOAL_MEMO_SIZE = 4  # 进程内最多保留的目标矩阵个数（监视模式下目标表每变一次新增一个）
+_goal_memo = OrderedDict()  # 进程内已解析的目标矩阵 {内容哈希: GoalMatrix}，按最近使用排序
+
+
+def _frame_digest(goal_df: pd.DataFrame) -> str:
+    """目标表内容哈希（列名 + 逐行哈希），用于跨运行缓存"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update('\x1f'.join(map(str, goal_df.columns)).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(goal_df.astype(str), index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def period_month_weights(start_date, end_date, months: list, prorate: bool = False) -> np.ndarray:
     """
-    计算门店的渠道目标完成情况
+    计算各月目标计入本期的权重
+
+    参数:
+        start_date / end_date: 本期起止日期（含两端）
+        months: 目标月份列表（YYYYMM）
+        prorate: 为 True 时按本期覆盖的天数 / 当月天数折算；否则本期涉及的月份计全月
+
+    返回:
+        np.ndarray: 与 months 对齐的权重
+    """
+    start, end = pd.Timestamp(str(start_date)), pd.Timestamp(str(end_date))
+    month_starts = pd.to_datetime(pd.Series(months, dtype=str), format='%Y%m')
+    month_ends = month_starts + pd.offsets.MonthEnd(0)
+    overlap_start = month_starts.where(month_starts > start, start)
+    overlap_end = month_ends.where(month_ends < end, end)
+    overlap_days = ((overlap_end - overlap_start).dt.days + 1).clip(lower=0).to_numpy(dtype=np.float64)
+    if not prorate:
+        return (overlap_days > 0).astype(np.float64)
+    return overlap_days / month_starts.dt.days_in_month.to_numpy(dtype=np.float64)
+
+
+class GoalMatrix:
+    """
+    目标表解析结果：门店 × 月份 × 目标类型 的月度目标矩阵及各门店的池标记
+
+    属性:
+        stores: 门店编号（pd.Index）
+        months: 月份列表（YYYYMM）
+        goal_types: 目标类型（GOAL_TYPES 的键）
+        values: 形状为 (门店, 月份, 目标类型) 的月度目标，无法解析的值为0
+        pools: 形状为 (门店, 目标类型) 的池标记，缺失或无法解析的值为0
+    """
+
+    def __init__(self, stores, months, goal_types, values, pools):
+        self.stores = pd.Index(stores)
+        self.months = list(months)
+        self.goal_types = list(goal_types)
+        self.values = values
+        self.pools = pools
+
+    @classmethod
+    def from_frame(cls, goal_df: pd.DataFrame) -> 'GoalMatrix':
+        """
+        一次性解析目标表（不修改 goal_df）：月度列按 全渠道YYYYMM/外卖渠道YYYYMM 识别，全部取值一次转换为数值
+
+        参数:
+            goal_df (pd.DataFrame): 原始目标数据（门店编号、全渠道池、外卖池及月度目标列）
+
+        返回:
+            GoalMatrix: 目标矩阵
+        """
+        if goal_df['门店编号'].duplicated().any():
+            print("警告：目标表存在重复的门店编号，仅保留第一行")
+            goal_df = goal_df.drop_duplicates(subset='门店编号', keep='first')
+        goal_types = list(GOAL_TYPES)
+        prefix_index = {prefix: i for i, (prefix, _, _) in enumerate(GOAL_TYPES.values())}
+
+        matches = [(col, GOAL_COLUMN_PATTERN.match(str(col))) for col in goal_df.columns]
+        matches = [(col, m.group(1), m.group(2)) for col, m in matches if m]
+        months = sorted({month for _, _, month in matches})
+        month_index = {month: i for i, month in enumerate(months)}
+
+        values = np.zeros((len(goal_df), len(months), len(goal_types)), dtype=np.float64)
+        if matches:
+            columns = [col for col, _, _ in matches]
+            parsed = pd.to_numeric(goal_df[columns].to_numpy(dtype=object).ravel(), errors='coerce')
+            parsed = np.nan_to_num(np.asarray(parsed, dtype=np.float64).reshape(len(goal_df), len(columns)))
+            month_idx = [month_index[month] for _, _, month in matches]
+            type_idx = [prefix_index[prefix] for _, prefix, _ in matches]
+            values[:, month_idx, type_idx] = parsed
+
+        pool_columns = [pool for _, pool, _ in GOAL_TYPES.values()]
+        pools = goal_df.reindex(columns=pool_columns).to_numpy(dtype=object).ravel()
+        pools = np.nan_to_num(np.asarray(pd.to_numeric(pools, errors='coerce'), dtype=np.float64))
+        pools = pools.reshape(len(goal_df), len(pool_columns))
+        return cls(goal_df['门店编号'].astype(str).to_numpy(), months, goal_types, values, pools)
+
+    @classmethod
+    def cached(cls, goal_df: pd.DataFrame, cache_dir: str = None) -> 'GoalMatrix':
+        """
+        按目标表内容哈希缓存解析结果：进程内复用最近 GOAL_MEMO_SIZE 份，指定 cache_dir 时另存为 .npz 供下次运行直接读取
+
+        参数:
+            goal_df (pd.DataFrame): 原始目标数据
+            cache_dir (str): 缓存目录，留空则只在进程内缓存
+
+        返回:
+            GoalMatrix: 目标矩阵
+        """
+        key = _frame_digest(goal_df)
+        if key in _goal_memo:
+            _goal_memo.move_to_end(key)
+            return _goal_memo[key]
+        cache_path = os.path.join(cache_dir, f"goals_{key}.npz") if cache_dir else None
+        if cache_path and os.path.exists(cache_path):
+            with np.load(cache_path, allow_pickle=False) as npz:
+                goals = cls(npz['stores'], npz['months'].tolist(), npz['goal_types'].tolist(),
+                            npz['values'], np.nan_to_num(npz['pools']))
+            print(f"命中目标表缓存 {os.path.basename(cache_path)}")
+        else:
+            goals = cls.from_frame(goal_df)
+            if cache_path:
+                os.makedirs(cache_dir, exist_ok=True)
+                tmp_path = f"{cache_path}.tmp.npz"
+                np.savez(tmp_path, stores=np.asarray(goals.stores, dtype=str), months=np.asarray(goals.months, dtype=str),
+                         goal_types=np.asarray(goals.goal_types, dtype=str), values=goals.values, pools=goals.pools)
+                os.replace(tmp_path, cache_path)
+        _goal_memo[key] = goals
+        while len(_goal_memo) > GOAL_MEMO_SIZE:
+            _goal_memo.popitem(last=False)
+        return goals
+
+    def period_goals(self, start_date, end_date, prorate: bool = False) -> np.ndarray:
+        """
+        计算各门店在 [start_date, end_date] 内的目标合计
+
+        返回:
+            np.ndarray: 形状为 (门店, 目标类型) 的目标值
+        """
+        weights = period_month_weights(start_date, end_date, self.months, prorate)
+        return np.einsum('smt,m->st', self.values, weights)
+
+
+@instrumented('目标计算')
+def calculate_goals(sales_df, goal_df, period_df, schema=None, prorate=False):
+
+    """
+    计算门店的渠道目标完成情况（不修改任何输入，同一份目标可用于多个时段）
     
     参数:
         sales_df (pd.DataFrame): 销售数据（包含本期各渠道指标）
-        goal_df (pd.DataFrame): 目标数据（包含月度目标值）
+        goal_df (pd.DataFrame | GoalMatrix): 目标数据（包含月度目标值），或已解析的目标矩阵
         period_df (pd.DataFrame): 期数数据（包含本期时间范围）
+        schema (ColumnSchema): 宽表列名注册表，默认从 sales_df 列名推断
+        prorate (bool): 本期只覆盖部分月份时按天数折算月度目标；默认不折算，本期涉及的月份计全月目标
         
     返回:
         pd.DataFrame: 包含目标完成情况的计算结果
@@ -19,32 +175,26 @@ def calculate_goals(sales_df, goal_df, period_df):
     # 获取本期起止日期
     benqi = period_df[period_df["标准时段"] == "本期"]["原始时段"].iloc[0]
     start_date, end_date = benqi.split('~')
-    
-    # 生成月份列表
-    months = pd.date_range(
-        pd.to_datetime(start_date), 
-        pd.to_datetime(end_date), 
-        freq='MS'
-    ).strftime('%Y%m').tolist()
-
-    # 处理目标数据
-    goal_processed = process_goals(goal_df, months)
-    
+
+    goals = goal_df if isinstance(goal_df, GoalMatrix) else GoalMatrix.cached(goal_df)
+
     # 处理销售数据
-    sales_processed = process_sales(sales_df)
-    
-    # 合并销售和目标数据
-    merged_df = pd.merge(sales_processed, goal_processed, on='门店编号', how='left')
-    merged_df = merged_df.fillna(0)
-    
+    sales_processed = process_sales(sales_df, schema)
+
+    # 按门店编号对齐目标（无目标的门店目标与池均为0）
+    positions = goals.stores.get_indexer(sales_processed['门店编号'].astype(str))
+    matched = positions >= 0
+    targets = np.zeros((len(positions), len(goals.goal_types)))
+    pools = np.zeros((len(positions), len(goals.goal_types)))
+    targets[matched] = goals.period_goals(start_date, end_date, prorate)[positions[matched]]
+    pools[matched] = goals.pools[positions[matched]]
+
     # 计算各渠道目标完成情况
-    result = calculate_target_completion(merged_df)
-    
-    return result
+    return calculate_target_completion(sales_processed, targets, pools, goals.goal_types)
 
 def process_goals(goal_df, months):
     """
-    处理目标数据，计算总目标值
+    处理目标数据，计算总目标值（按整月累加，不修改 goal_df）
     
     参数:
         goal_df (pd.DataFrame): 原始目标数据
@@ -53,83 +203,61 @@ def process_goals(goal_df, months):
     返回:
         pd.DataFrame: 处理后的目标数据
     """
-    # 创建目标列列表
-    target_columns = []
-    for month in months:
-        target_columns.extend([
-            f'全渠道{month}',
-            f'外卖渠道{month}'
-        ])
-    
-    # 转换数值类型
-    for col in target_columns:
-        if col in goal_df.columns:
-            goal_df[col] = pd.to_numeric(goal_df[col], errors='coerce').fillna(0)
-    
-    # 初始化目标列
-    goal_df['全渠道目标'] = 0.0
-    goal_df['外卖目标'] = 0.0
-    
-    # 累加月度目标值
-    for month in months:
-        if f'全渠道{month}' in goal_df.columns:
-            goal_df['全渠道目标'] += goal_df[f'全渠道{month}']
-        if f'外卖渠道{month}' in goal_df.columns:
-            goal_df['外卖目标'] += goal_df[f'外卖渠道{month}']
-    
-    # 保留所需列
-    return goal_df[['门店编号', '全渠道池', '全渠道目标', '外卖池', '外卖目标']]
+    goals = GoalMatrix.cached(goal_df)
+    weights = np.isin(goals.months, months).astype(np.float64)
+    totals = np.einsum('smt,m->st', goals.values, weights)
+    result = goal_df.drop_duplicates(subset='门店编号', keep='first')[['门店编号', '全渠道池', '外卖池']].copy()
+    for i, goal_type in enumerate(goals.goal_types):
+        result[goal_type] = totals[:, i]
+    return result[['门店编号', '全渠道池', '全渠道目标', '外卖池', '外卖目标']].reset_index(drop=True)
 
-def process_sales(sales_df):
+def process_sales(sales_df, schema=None):
     """
     处理销售数据，筛选本期相关字段
     
     参数:
         sales_df (pd.DataFrame): 原始销售数据
+        schema (ColumnSchema): 宽表列名注册表，默认从 sales_df 列名推断
         
     返回:
         pd.DataFrame: 处理后的销售数据
     """
     # 筛选门店编号和本期相关字段
-    return sales_df.filter(
-        regex='^(门店编号|本期)', 
-        axis=1
-    )
+    if schema is None:
+        schema = ColumnSchema.from_columns(sales_df.columns)
+    return sales_df[['门店编号'] + schema.select(sales_df.columns, period='本期')]
 
-def calculate_target_completion(df):
+def calculate_target_completion(sales_df, targets, pools, goal_types):
     """
-    计算各渠道目标完成情况
+    计算各渠道目标完成情况：本期 渠道 × 指标 一次广播乘以对应的池标记
     
     参数:
-        df (pd.DataFrame): 合并后的数据
+        sales_df (pd.DataFrame): 门店编号 + 本期各渠道指标
+        targets (np.ndarray): 形状为 (门店, 目标类型) 的本期目标
+        pools (np.ndarray): 形状为 (门店, 目标类型) 的池标记
+        goal_types (list): 目标类型顺序
         
     返回:
         pd.DataFrame: 计算结果
     """
-    # 转换池值为数值类型
-    df['外卖池'] = pd.to_numeric(df['外卖池'], errors='coerce')
-    df['全渠道池'] = pd.to_numeric(df['全渠道池'], errors='coerce')
-    
-    # 计算各渠道目标完成情况
-    for channel in ['线上外卖', 'pos小程序', '美团团购', '抖音']:
-        pool_type = '外卖池' if channel == '线上外卖' else '全渠道池'
-        
-        for metric in ['流水', '实收', '订单数']:
-            src_col = f'本期_{channel}_{metric}'
-            target_col = f'{pool_type}_{channel}_{metric}'
-            df[target_col] = df[src_col] * df[pool_type]
-    
-    # 选择最终结果列
-    result_columns = [
-        '门店编号', '全渠道目标',
-        '全渠道池_pos小程序_流水', '全渠道池_pos小程序_实收', '全渠道池_pos小程序_订单数',
-        '全渠道池_美团团购_流水', '全渠道池_美团团购_实收', '全渠道池_美团团购_订单数',
-        '全渠道池_抖音_流水', '全渠道池_抖音_实收', '全渠道池_抖音_订单数',
-        '外卖目标',
-        '外卖池_线上外卖_流水', '外卖池_线上外卖_实收', '外卖池_线上外卖_订单数'
-    ]
-    
-    return df[result_columns]
+    # (渠道) → 所属目标类型，渠道按 GOAL_TYPES 顺序排列
+    channels = [(goal_type, channel) for goal_type, (_, _, type_channels) in GOAL_TYPES.items()
+                for channel in type_channels]
+    type_idx = [goal_types.index(goal_type) for goal_type, _ in channels]
+    source_columns = [f'本期_{channel}_{metric}' for _, channel in channels for metric in COMPLETION_METRICS]
+    sales = sales_df[source_columns].to_numpy(dtype=np.float64)
+    sales = sales.reshape(len(sales_df), len(channels), len(COMPLETION_METRICS))
+    completion = sales * pools[:, type_idx, None]
+
+    # 选择最终结果列：每个目标类型的目标值后接其池下各渠道的完成值
+    result = {'门店编号': sales_df['门店编号'].to_numpy()}
+    for goal_type, (_, pool, type_channels) in GOAL_TYPES.items():
+        result[goal_type] = targets[:, goal_types.index(goal_type)]
+        for channel in type_channels:
+            j = channels.index((goal_type, channel))
+            for k, metric in enumerate(COMPLETION_METRICS):
+                result[f'{pool}_{channel}_{metric}'] = completion[:, j, k]
+    return pd.DataFrame(result, index=sales_df.index)
 
 def main():
     # 读取配置文件
@@ -147,8 +275,8 @@ def main():
     # 计算目标完成情况
     result_df = calculate_goals(sales_df, goal_df, period_df)
     
-    # 打印结果（实际应用中可将结果保存或输出）
-    result_df.to_excel('test.xlsx')
+    # 流式写出结果（xlsx 逐行落盘，内存不随行数增长）
+    export_xlsx({'目标数据': result_df}, 'test.xlsx')
     
     # 关闭数据库连接
     conn.close()
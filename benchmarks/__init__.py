@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+"""性能基准：合成数据生成与各处理阶段计时"""
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+性能基准：在多个数据规模下对各处理阶段计时并记录峰值内存
+
+用法（在项目根目录执行）:
+    python -m benchmarks.run_benchmarks --scales 200x30 1000x30 5000x60 --label v1
+    python -m benchmarks.run_benchmarks --scales 1000x30 --label v2 --compare benchmarks/results/v1.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from addition import calculate_goals
+from benchmarks.synthetic_data import generate_goal_data, write_synthetic_csv
+from channel_cube import process_sales_data_cube, process_sales_data_views
+from cleaning_module import cleaning_sales_data
+from main import (CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER, filter_monthly_valid_stores,
+                  monthly_valid_store_mask, process_sales_data, save_to_sqlite_db)
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure(func, *args, repeat: int = 1, **kwargs) -> tuple:
+    """
+    对函数计时（取多次中的最短耗时），并单独运行一次统计 tracemalloc 峰值内存
+
+    参数:
+        func: 被测函数
+        repeat: 计时重复次数
+        *args, **kwargs: 传给被测函数的参数
+
+    返回:
+        (函数返回值, 耗时秒数, 峰值内存MB)
+    """
+    timings = []
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        timings.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    func(*args, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, min(timings), peak / 1024 / 1024
+
+
+def run_scale(n_stores: int, n_days: int, n_periods: int, sparsity: float, repeat: int,
+              data_dir: str) -> list:
+    """
+    在一个数据规模下运行全部阶段
+
+    返回:
+        list: [{'stage', 'wall_s', 'peak_mb', ...}]
+    """
+    sales_path, supplement_path = write_synthetic_csv(
+        data_dir, n_stores=n_stores, n_days=n_days, n_periods=n_periods, sparsity=sparsity
+    )
+    records = []
+
+    def record(stage: str, func, *args, **kwargs):
+        result, wall, peak = measure(func, *args, repeat=repeat, **kwargs)
+        records.append({'stage': stage, 'wall_s': round(wall, 4), 'peak_mb': round(peak, 2)})
+        print(f"  {stage:<40} {wall:>9.3f}s {peak:>10.1f}MB")
+        return result
+
+    raw = record('cleaning_sales_data', cleaning_sales_data, sales_path, supplement_path)
+    record('cleaning_sales_data(chunked)', cleaning_sales_data, sales_path, supplement_path, chunksize=100000)
+    yoy_df, period_df = record('process_sales_data', process_sales_data,
+                               raw, CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER)
+    record('process_sales_data_cube', process_sales_data_cube,
+           raw, CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER)
+    filtered = record('filter_monthly_valid_stores', filter_monthly_valid_stores, raw)
+    cunliang_df, _ = record('process_sales_data(存量)', process_sales_data,
+                            filtered, CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER)
+    record('process_sales_data_views(全部+存量)', lambda: process_sales_data_views(
+        raw, CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER,
+        {'同比数据': None, '同比数据(存量)': monthly_valid_store_mask(raw)}))
+
+    benqi = period_df.loc[period_df['标准时段'] == '本期', '原始时段'].iloc[0]
+    start, end = benqi.split('~')
+    months = pd.date_range(pd.to_datetime(start), pd.to_datetime(end), freq='MS').strftime('%Y%m').tolist()
+    goal_df = generate_goal_data(yoy_df['门店编号'], months)
+    goals = record('calculate_goals', lambda: calculate_goals(yoy_df, goal_df.copy(), period_df))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'benchmark.db')
+        for table_name, table in [('同比数据', yoy_df), ('同比数据(存量)', cunliang_df),
+                                  ('期数', period_df), ('目标数据', goals)]:
+            record(f'save_to_sqlite_db({table_name})', save_to_sqlite_db, table, table_name, db_path)
+
+    for rec in records:
+        rec.update({'scale': f"{n_stores}x{n_days}", 'stores': n_stores, 'days': n_days,
+                    'periods': n_periods, 'rows': len(raw)})
+    return records
+
+
+def compare(current: dict, baseline_path: str) -> None:
+    """打印与历史结果的耗时/内存对比（比值 >1 表示变慢/变大）"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = {(r['scale'], r['stage']): r for r in baseline['results']}
+    print(f"\n与 {baseline['label']} 对比：")
+    print(f"  {'规模':<12}{'阶段':<40}{'耗时比':>10}{'内存比':>10}")
+    for rec in current['results']:
+        old = previous.get((rec['scale'], rec['stage']))
+        if not old:
+            continue
+        wall_ratio = rec['wall_s'] / old['wall_s'] if old['wall_s'] else float('nan')
+        mem_ratio = rec['peak_mb'] / old['peak_mb'] if old['peak_mb'] else float('nan')
+        print(f"  {rec['scale']:<12}{rec['stage']:<40}{wall_ratio:>10.2f}{mem_ratio:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多时段渠道汇总性能基准')
+    parser.add_argument('--scales', nargs='+', default=['200x30', '1000x30', '5000x60'],
+                        help='数据规模列表，格式为 门店数x天数')
+    parser.add_argument('--periods', type=int, default=3, help='查询时段数')
+    parser.add_argument('--sparsity', type=float, default=0.4, help='渠道无交易的概率')
+    parser.add_argument('--repeat', type=int, default=1, help='计时重复次数（取最短）')
+    parser.add_argument('--label', default=datetime.now().strftime('%Y%m%d%H%M%S'), help='本次结果标签')
+    parser.add_argument('--data-dir', default=os.path.join(BENCHMARK_DIR, 'data'), help='合成数据目录')
+    parser.add_argument('--output-dir', default=os.path.join(BENCHMARK_DIR, 'results'), help='结果保存目录')
+    parser.add_argument('--compare', help='用于对比的历史结果 JSON')
+    args = parser.parse_args()
+
+    results = []
+    for scale in args.scales:
+        n_stores, n_days = (int(x) for x in scale.lower().split('x'))
+        print(f"规模 {scale}（{args.periods} 个时段）：")
+        results.extend(run_scale(n_stores, n_days, args.periods, args.sparsity, args.repeat, args.data_dir))
+
+    report = {
+        'label': args.label,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'sqlite': sqlite3.sqlite_version,
+        'results': results,
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
+    output_path = os.path.join(args.output_dir, f"{args.label}.json")
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存到 {output_path}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+import os
+
+import numpy as np
+import pandas as pd
+
+from cleaning_module import (METRICS, SALES_CHANNELS, SUPPLEMENT_CHANNELS,
+                             sales_columns, supplement_columns)
+
+
+def build_periods(n_periods: int, n_days: int, current_start: str = '20250901') -> list:
+    """
+    生成查询时段（本期 / 环比期 / 同期），格式与 SQL 导出一致 'YYYYMMDD~YYYYMMDD'
+
+    参数:
+        n_periods: 时段数（2 为本期+同期，3 为本期+环比期+同期，更多时继续向前追加月份）
+        n_days: 每个时段的天数
+        current_start: 本期开始日期
+
+    返回:
+        list: [(查询时段, 日期列表)]，日期为 YYYYMMDD 整数
+    """
+    start = pd.Timestamp(current_start)
+    starts = [start]
+    if n_periods >= 3:
+        starts.append(start - pd.DateOffset(months=1))
+    starts.append(start - pd.DateOffset(years=1))
+    for i in range(3, n_periods):
+        starts.append(start - pd.DateOffset(months=i - 1))
+    periods = []
+    for period_start in starts[:n_periods]:
+        dates = pd.date_range(period_start, periods=n_days, freq='D')
+        label = f"{dates[0]:%Y%m%d}~{dates[-1]:%Y%m%d}"
+        periods.append((label, dates.strftime('%Y%m%d').astype(np.int64).to_numpy()))
+    return periods
+
+
+def generate_sales_data(n_stores: int = 1000, n_days: int = 30, n_periods: int = 3,
+                        sparsity: float = 0.4, open_rate: float = 0.95,
+                        supplement_rate: float = 0.05, seed: int = 0) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    生成与两条 SQL 导出列布局完全一致的合成数据
+
+    参数:
+        n_stores: 门店数（TLL/ZYD 前缀各半）
+        n_days: 每个时段的天数
+        n_periods: 时段数
+        sparsity: 门店-日中渠道无交易的概率
+        open_rate: 门店每日营业的概率
+        supplement_rate: 补录数据行数占主数据行数的比例
+        seed: 随机种子
+
+    返回:
+        (主销售数据DataFrame, 补录数据DataFrame)
+    """
+    rng = np.random.default_rng(seed)
+    stores = np.array([f"{'TLL' if i % 2 else 'ZYD'}{i:06d}" for i in range(n_stores)])
+
+    # 全部 (时段, 门店, 日期) 组合，按营业概率抽样
+    labels, dates = [], []
+    for label, period_dates in build_periods(n_periods, n_days):
+        labels.append(np.full(n_stores * len(period_dates), label))
+        dates.append(np.tile(period_dates, n_stores))
+    labels = np.concatenate(labels)
+    dates = np.concatenate(dates)
+    store_ids = np.tile(np.repeat(stores, n_days), n_periods)
+    is_open = rng.random(len(labels)) < open_rate
+
+    def channel_values(n_rows: int, n_channels: int) -> dict:
+        """按渠道生成 流水/实收/优惠/订单数 矩阵"""
+        active = rng.random((n_rows, n_channels)) >= sparsity
+        flow = np.round(rng.gamma(2.0, 150.0, (n_rows, n_channels)) * active, 2)
+        income = np.round(flow * rng.uniform(0.7, 0.95, (n_rows, n_channels)), 2)
+        orders = np.ceil(flow / rng.uniform(15, 30, (n_rows, n_channels)))
+        return {'流水': flow, '实收': income, '优惠': np.round(flow - income, 2), '订单数': orders}
+
+    # 主数据
+    n_rows = int(is_open.sum())
+    values = channel_values(n_rows, len(SALES_CHANNELS))
+    sales = {'查询时段': labels[is_open], '门店编号': store_ids[is_open], '日期': dates[is_open]}
+    for metric in METRICS:
+        for i, channel in enumerate(SALES_CHANNELS):
+            sales[f"{channel}_{metric}"] = values[metric][:, i]
+    for metric in METRICS:
+        sales[f"汇总_{metric}"] = values[metric].sum(axis=1)
+    sales['汇总_营业天数'] = np.ones(n_rows, dtype=np.int64)
+    sales_df = pd.DataFrame(sales, columns=sales_columns())
+
+    # 补录数据：多数与主数据同键，少量为主数据中不存在的门店-日（未营业日补录）
+    n_supplement = int(n_rows * supplement_rate)
+    open_rows = np.flatnonzero(is_open)
+    closed_rows = np.flatnonzero(~is_open)
+    n_extra = min(len(closed_rows), max(n_supplement // 10, 0))
+    picked = np.concatenate([
+        rng.choice(open_rows, n_supplement - n_extra, replace=False) if n_supplement - n_extra else open_rows[:0],
+        rng.choice(closed_rows, n_extra, replace=False) if n_extra else closed_rows[:0],
+    ])
+    online_channels = [c for c in SUPPLEMENT_CHANNELS if c != '新增汇总']
+    values = channel_values(len(picked), len(online_channels))
+    supplement = {'查询时段': labels[picked], '门店编号': store_ids[picked], '日期': dates[picked]}
+    for i, channel in enumerate(online_channels):
+        for metric in METRICS:
+            supplement[f"{channel}_{metric}"] = values[metric][:, i]
+    for metric in METRICS:
+        supplement[f"新增汇总_{metric}"] = values[metric].sum(axis=1)
+    supplement_df = pd.DataFrame(supplement, columns=supplement_columns())
+    supplement_df = supplement_df.sort_values(['查询时段', '门店编号', '日期'], ignore_index=True)
+    return sales_df, supplement_df
+
+
+def generate_goal_data(stores, months: list, seed: int = 0) -> pd.DataFrame:
+    """
+    生成 goal 表（门店编号、全渠道池、外卖池、全渠道YYYYMM、外卖渠道YYYYMM）
+
+    参数:
+        stores: 门店编号列表
+        months: 目标月份列表（YYYYMM）
+        seed: 随机种子
+
+    返回:
+        pd.DataFrame: 目标数据
+    """
+    rng = np.random.default_rng(seed)
+    stores = np.asarray(stores)
+    goal = {
+        '门店编号': stores,
+        '全渠道池': rng.choice(['0', '1'], len(stores), p=[0.2, 0.8]),
+        '外卖池': rng.choice(['0', '1'], len(stores), p=[0.3, 0.7]),
+    }
+    for month in months:
+        goal[f'全渠道{month}'] = rng.integers(50000, 200000, len(stores)).astype(str)
+        goal[f'外卖渠道{month}'] = rng.integers(10000, 60000, len(stores)).astype(str)
+    return pd.DataFrame(goal)
+
+
+def write_synthetic_csv(out_dir: str, **kwargs) -> tuple[str, str]:
+    """
+    生成合成数据并写出 CSV（同参数已生成过时直接复用）
+
+    参数:
+        out_dir: 输出目录
+        **kwargs: 传给 generate_sales_data 的参数
+
+    返回:
+        (主销售数据CSV路径, 补录数据CSV路径)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    tag = '_'.join(f"{k}{v}" for k, v in sorted(kwargs.items()))
+    sales_path = os.path.join(out_dir, f"多时段详细渠道查询_{tag}.csv")
+    supplement_path = os.path.join(out_dir, f"销售数据补录查询_{tag}.csv")
+    if not (os.path.exists(sales_path) and os.path.exists(supplement_path)):
+        sales_df, supplement_df = generate_sales_data(**kwargs)
+        sales_df.to_csv(sales_path, index=False)
+        supplement_df.to_csv(supplement_path, index=False)
+    return sales_path, supplement_path
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from cleaning_module import AGGREGATION_MAPPING, cleaning_sales_data
+from instrument_module import stage
+
+CACHE_VERSION = 2  # 清洗逻辑或存储格式变化时递增，使旧缓存失效
+
+
+def file_fingerprint(file_path: str, block_size: int = 1 << 20) -> dict:
+    """
+    计算文件指纹（大小、修改时间、内容哈希）
+
+    参数:
+        file_path (str): 文件路径
+        block_size (int): 分块读取哈希的字节数
+
+    返回:
+        dict: {'size', 'mtime', 'hash'}，文件不存在时返回 {'missing': True}
+    """
+    if not os.path.exists(file_path):
+        return {'missing': True}
+    stat = os.stat(file_path)
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': digest.hexdigest()}
+
+
+def cache_key(input_file_path: str, supplemental_data_path: str) -> str:
+    """
+    生成清洗结果的缓存键：两个输入文件的指纹 + 子渠道聚合关系
+
+    参数:
+        input_file_path (str): 主销售数据 CSV 文件路径
+        supplemental_data_path (str): 补充数据 CSV 文件路径
+
+    返回:
+        str: 十六进制缓存键
+    """
+    payload = {
+        'version': CACHE_VERSION,
+        'sales': file_fingerprint(input_file_path),
+        'supplement': file_fingerprint(supplemental_data_path),
+        'aggregation_mapping': AGGREGATION_MAPPING,
+    }
+    text = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def save_frame_npz(data: pd.DataFrame, file_path: str) -> None:
+    """
+    按列保存 DataFrame 为 .npz（数值列保留原类型，分类列保存整数编码和字典，其余列保存为定长字符串）
+
+    参数:
+        data (pd.DataFrame): 待保存的数据
+        file_path (str): 目标 .npz 路径
+    """
+    arrays = {'__columns__': np.array(data.columns, dtype=str)}
+    for i, col in enumerate(data.columns):
+        series = data[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            arrays[f'c{i}'] = series.cat.codes.to_numpy()
+            arrays[f'k{i}'] = series.cat.categories.to_numpy(dtype=str)
+        elif pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            arrays[f'c{i}'] = series.to_numpy()
+        else:
+            arrays[f'c{i}'] = series.to_numpy(dtype=str)
+    # 先写临时文件再替换，避免中断时留下损坏的缓存
+    tmp_path = f"{file_path}.tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, file_path)
+
+
+def load_frame_npz(file_path: str) -> pd.DataFrame:
+    """
+    读取 save_frame_npz 保存的数据
+
+    参数:
+        file_path (str): .npz 路径
+
+    返回:
+        pd.DataFrame: 还原的数据
+    """
+    with np.load(file_path, allow_pickle=False) as npz:
+        columns = npz['__columns__'].tolist()
+        return pd.DataFrame({
+            col: (pd.Categorical.from_codes(npz[f'c{i}'], categories=npz[f'k{i}'].astype(object))
+                  if f'k{i}' in npz.files else npz[f'c{i}'])
+            for i, col in enumerate(columns)
+        }, columns=columns)
+
+
+def evict_cache(cache_dir: str, max_bytes: int, keep: str = None) -> None:
+    """
+    按最近使用时间淘汰缓存文件，直到目录总大小不超过上限
+
+    参数:
+        cache_dir (str): 缓存目录
+        max_bytes (int): 缓存目录大小上限（字节）
+        keep (str): 不参与淘汰的文件路径（通常为刚写入的缓存）
+    """
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.endswith('.npz') and os.path.isfile(path):
+            stat = os.stat(path)
+            entries.append((stat.st_atime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if keep and os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        os.remove(path)
+        total -= size
+        print(f"已淘汰缓存文件 {os.path.basename(path)}")
+
+
+def cached_cleaning_sales_data(input_file_path: str, supplemental_data_path: str, cache_dir: str,
+                               max_cache_mb: float = 2048, chunksize: int = None) -> pd.DataFrame:
+    """
+    带磁盘缓存的 cleaning_sales_data：输入文件未变化时直接读取缓存，跳过 CSV 解析
+
+    参数:
+        input_file_path (str): 主销售数据 CSV 文件路径
+        supplemental_data_path (str): 补充数据 CSV 文件路径
+        cache_dir (str): 缓存目录
+        max_cache_mb (float): 缓存目录大小上限（MB）
+        chunksize (int): 未命中缓存时传给 cleaning_sales_data 的分块行数
+
+    返回:
+        pd.DataFrame: 处理后的销售数据
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = os.path.join(cache_dir, f"cleaned_{cache_key(input_file_path, supplemental_data_path)}.npz")
+
+    if os.path.exists(cache_path):
+        print(f"命中清洗缓存 {os.path.basename(cache_path)}，跳过CSV解析")
+        os.utime(cache_path)  # 更新访问时间，供淘汰策略使用
+        with stage('读取清洗缓存') as st:
+            cleaned = load_frame_npz(cache_path)
+            st.set_output(cleaned)
+        return cleaned
+
+    print("未命中清洗缓存，开始解析CSV...")
+    cleaned = cleaning_sales_data(input_file_path, supplemental_data_path, chunksize=chunksize)
+    with stage('写入清洗缓存', cleaned):
+        save_frame_npz(cleaned, cache_path)
+    evict_cache(cache_dir, int(max_cache_mb * 1024 * 1024), keep=cache_path)
+    return cleaned
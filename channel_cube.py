@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+from instrument_module import instrumented, stage
+from key_module import key_codes
+from kpi_module import YOY_KPIS, evaluate_kpis
+from memory_module import restore_money
+from period_module import PERIOD_TYPES, identify_period_mapping
+
+
+def _sort_groups(group_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    按分组编号排序一次，供多次分组求和复用
+
+    参数:
+        group_ids: 每行所属的分组编号
+
+    返回:
+        (行排序下标, 每段的分组编号, 每段在排序后数组中的起始位置)
+    """
+    order = np.argsort(group_ids, kind='stable')
+    sorted_ids = group_ids[order]
+    if len(sorted_ids) == 0:
+        return order, sorted_ids, sorted_ids
+    starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+    return order, sorted_ids[starts], starts
+
+
+def _group_sum(sorted_values: np.ndarray, segment_ids: np.ndarray, starts: np.ndarray,
+               n_groups: int) -> np.ndarray:
+    """
+    对已按分组排序的二维数组逐段求和（reduceat，避免逐列赋值）
+
+    参数:
+        sorted_values: 形状为 (行数, 列数)、已按 _sort_groups 顺序排列的数值数组
+        segment_ids: 每段的分组编号
+        starts: 每段的起始位置
+        n_groups: 分组总数
+
+    返回:
+        np.ndarray: 形状为 (n_groups, 列数) 的分组合计，缺失分组为0
+    """
+    result = np.zeros((n_groups, sorted_values.shape[1]), dtype=np.float64)
+    if len(starts):
+        result[segment_ids] = np.add.reduceat(sorted_values, starts, axis=0)
+    return result
+
+
+def identify_base_channels(columns, category_config: list, metrics: list) -> list:
+    """
+    从日度数据列名中识别基础渠道（组合渠道始终由组成部分重新计算）
+
+    参数:
+        columns: 日度数据列名
+        category_config: 渠道分类配置（包含新前缀和组成部分）
+        metrics: 需要统计的核心指标列表
+
+    返回:
+        list: 按列出现顺序排列的基础渠道
+    """
+    new_prefixes = {category['new_prefix'] for category in category_config}
+    base_channels = []
+    for col in columns:
+        channel, _, metric = col.rpartition('_')
+        if metric in metrics and channel and channel not in new_prefixes and channel not in base_channels:
+            base_channels.append(channel)
+    return base_channels
+
+
+def build_composition_matrix(base_channels: list, category_config: list) -> tuple[list, np.ndarray]:
+    """
+    根据渠道分类配置生成组合矩阵（基础渠道 → 全部渠道）
+
+    参数:
+        base_channels: 原始数据中的基础渠道列表
+        category_config: 渠道分类配置（包含新前缀和组成部分）
+
+    返回:
+        (全部渠道列表, 形状为 (基础渠道数, 全部渠道数) 的0/1组合矩阵)
+    """
+    channels = list(base_channels) + [category['new_prefix'] for category in category_config]
+    matrix = np.zeros((len(base_channels), len(channels)), dtype=np.float64)
+    matrix[np.arange(len(base_channels)), np.arange(len(base_channels))] = 1.0
+    base_index = {channel: i for i, channel in enumerate(base_channels)}
+    for j, category in enumerate(category_config, start=len(base_channels)):
+        for part in category['parts']:
+            if part not in base_index:
+                raise KeyError(f"组合渠道 {category['new_prefix']} 的组成部分 {part} 不在原始数据中")
+            matrix[base_index[part], j] = 1.0
+    return channels, matrix
+
+
+class ChannelCube:
+    """
+    门店 × 时段 × 渠道 × 指标 的稠密数组
+
+    属性:
+        stores: 门店编号（已排序）
+        periods: 标准时段类型（按 PERIOD_TYPES 顺序）
+        channels: 渠道列表（基础渠道 + 组合渠道）
+        metrics: 指标列表
+        values: 形状为 (门店, 时段, 渠道, 指标) 的指标合计
+        operating_days: 形状为 (门店, 时段, 渠道) 的营业天数（流水>0的天数）
+        period_mapping: {原始查询时段: 标准时段类型}
+        has_rows: 形状为 (门店, 时段) 的布尔数组，表示该门店在该时段是否有日度记录
+    """
+
+    def __init__(self, stores, periods, channels, metrics, values, operating_days, period_mapping,
+                 has_rows=None):
+        self.stores = stores
+        self.periods = periods
+        self.channels = channels
+        self.metrics = metrics
+        self.values = values
+        self.operating_days = operating_days
+        self.period_mapping = period_mapping
+        self.has_rows = has_rows if has_rows is not None else np.ones((len(stores), len(periods)), dtype=bool)
+
+    @classmethod
+    def from_daily(cls, daily_data: pd.DataFrame, category_config: list, metrics: list) -> 'ChannelCube':
+        """
+        将清洗后的日度数据一次性载入数组，并通过组合矩阵生成组合渠道
+
+        参数:
+            daily_data: 清洗后的日度销售数据（查询时段/门店编号/日期 + 渠道_指标列）
+            category_config: 渠道分类配置（包含新前缀和组成部分）
+            metrics: 需要统计的核心指标列表
+
+        返回:
+            ChannelCube: 聚合后的渠道立方体
+        """
+        return cls.from_daily_views(daily_data, category_config, metrics, {'全部': None})['全部']
+
+    @classmethod
+    def from_daily_views(cls, daily_data: pd.DataFrame, category_config: list, metrics: list,
+                         views: dict, period_mapping: dict = None) -> dict:
+        """
+        一次载入日度数据，按多个行权重（视图）分别聚合为渠道立方体
+
+        渠道识别、组合矩阵、分组排序和日度流水组合只计算一次；每个视图仅多一次加权分组求和。
+        视图的门店范围为权重非0的行所涉及的门店。
+
+        参数:
+            daily_data: 清洗后的日度销售数据（查询时段/门店编号/日期 + 渠道_指标列）
+            category_config: 渠道分类配置（包含新前缀和组成部分）
+            metrics: 需要统计的核心指标列表
+            views: {视图名称: 与行对齐的权重/布尔掩码，None 表示全部行}
+            period_mapping: 指定的时段映射（分片计算时由全量数据识别），默认自动识别
+
+        返回:
+            dict: {视图名称: ChannelCube}
+        """
+        if period_mapping is None:
+            period_mapping = identify_period_mapping(daily_data)
+            print('查询时段识别成功！')
+        periods = [p for p in PERIOD_TYPES if p in period_mapping.values()]
+
+        base_channels = identify_base_channels(daily_data.columns, category_config, metrics)
+        channels, composition = build_composition_matrix(base_channels, category_config)
+
+        with stage('立方体载入', daily_data):
+            # 行 → (门店, 时段) 分组编号，只排序一次；载入时已编码的键直接复用整数编码
+            store_codes, stores = key_codes(daily_data['门店编号'])
+            raw_codes, raw_periods = key_codes(daily_data['查询时段'])
+            period_index = np.array([periods.index(period_mapping[raw]) if raw in period_mapping else -1
+                                     for raw in raw_periods], dtype=np.int64)
+            period_codes = period_index[raw_codes]
+            group_ids = store_codes.astype(np.int64) * len(periods) + period_codes
+            n_groups = len(stores) * len(periods)
+            order, segment_ids, starts = _sort_groups(group_ids)
+
+            # 载入基础渠道数值：(行, 基础渠道, 指标)，缺失列与 NaN 视为0
+            base_columns = [f"{channel}_{metric}" for channel in base_channels for metric in metrics]
+            daily_values = (restore_money(daily_data.reindex(columns=base_columns))
+                            .to_numpy(dtype=np.float64, na_value=0.0)
+                            .reshape(len(daily_data), len(base_channels), len(metrics)))
+            np.nan_to_num(daily_values, copy=False)
+
+            # 营业天数需按日判断组合后的流水>0，因此在日度层面对流水做组合
+            if '流水' in metrics:
+                daily_flags = (daily_values[:, :, metrics.index('流水')] @ composition > 0).astype(np.float64)
+            else:
+                daily_flags = np.zeros((len(daily_data), len(channels)), dtype=np.float64)
+            sorted_values = daily_values.reshape(len(daily_data), -1)[order]
+            sorted_flags = daily_flags[order]
+            del daily_values, daily_flags
+
+        cubes = {}
+        for name, weights in views.items():
+            with stage(f'视图聚合:{name}', daily_data) as st:
+                if weights is None:
+                    view_values, view_flags = sorted_values, sorted_flags
+                    row_mask = np.ones((len(order), 1), dtype=np.float64)
+                else:
+                    sorted_weights = np.asarray(weights, dtype=np.float64)[order]
+                    view_values = sorted_values * sorted_weights[:, None]
+                    view_flags = sorted_flags * sorted_weights[:, None]
+                    row_mask = (sorted_weights != 0).astype(np.float64)[:, None]
+                has_rows = _group_sum(row_mask, segment_ids, starts, n_groups).reshape(len(stores), len(periods)) > 0
+                present = has_rows.any(axis=1)
+
+                # 先按 (门店, 时段) 聚合基础渠道，再用组合矩阵一次乘法得到全部渠道
+                base_sums = _group_sum(view_values, segment_ids, starts, n_groups)
+                base_sums = base_sums.reshape(n_groups, len(base_channels), len(metrics))
+                values = np.einsum('gbm,bc->gcm', base_sums, composition)
+                values = values.reshape(len(stores), len(periods), len(channels), len(metrics))
+                operating_days = _group_sum(view_flags, segment_ids, starts, n_groups)
+                operating_days = operating_days.reshape(len(stores), len(periods), len(channels))
+
+                cubes[name] = cls(stores[present], periods, channels, list(metrics),
+                                  values[present], operating_days[present], period_mapping, has_rows[present])
+                st.output_rows, st.output_cols = int(present.sum()), len(channels) * len(metrics)
+        return cubes
+
+    def column_layout(self, priority_order: list, periods: list, metrics: list,
+                      include_days: bool = True) -> list:
+        """
+        生成宽表列顺序：渠道按优先级 → 指标 → 时段，未列入优先级的渠道追加在后（不含营业天数）
+
+        参数:
+            priority_order: 指标优先级排序
+            periods: 输出的标准时段类型
+            metrics: 输出的指标列表
+            include_days: 是否输出营业天数
+
+        返回:
+            list: [(时段, 渠道, 指标), ...]，指标为'营业天数'时取营业天数数组
+        """
+        layout = []
+        ordered = [c for c in priority_order if c in self.channels]
+        for channel in ordered:
+            channel_metrics = (['营业天数'] if include_days else []) + metrics
+            for metric in channel_metrics:
+                for period in periods:
+                    layout.append((period, channel, metric))
+        for channel in self.channels:
+            if channel in ordered:
+                continue
+            for metric in metrics:
+                for period in periods:
+                    layout.append((period, channel, metric))
+        return layout
+
+    def to_wide(self, layout: list) -> pd.DataFrame:
+        """
+        将立方体还原为现有的宽表列布局（门店编号 + 时段_渠道_指标）
+
+        参数:
+            layout: column_layout 生成的 (时段, 渠道, 指标) 列表
+
+        返回:
+            pd.DataFrame: 宽表
+        """
+        # 营业天数作为第0个指标拼接，统一一次花式索引取列
+        full = np.concatenate([self.operating_days[..., None], self.values], axis=3)
+        metric_slots = ['营业天数'] + self.metrics
+        period_idx = [self.periods.index(p) for p, _, _ in layout]
+        channel_idx = [self.channels.index(c) for _, c, _ in layout]
+        metric_idx = [metric_slots.index(m) for _, _, m in layout]
+        block = full[:, period_idx, channel_idx, metric_idx]
+
+        wide = pd.DataFrame(block, columns=[f"{p}_{c}_{m}" for p, c, m in layout])
+        # 与透视表一致：所有门店在该时段均有记录时营业天数为整数，否则（存在补0）为浮点
+        complete_periods = {p for i, p in enumerate(self.periods) if self.has_rows[:, i].all()}
+        day_columns = [f"{p}_{c}_{m}" for p, c, m in layout if m == '营业天数' and p in complete_periods]
+        if day_columns:
+            wide[day_columns] = wide[day_columns].astype(np.int64)
+        wide.insert(0, '门店编号', self.stores)
+        return wide
+
+    def period_mapping_frame(self) -> pd.DataFrame:
+        """生成时段映射表（原始时段/标准时段）"""
+        return pd.DataFrame(
+            list(self.period_mapping.items()),
+            columns=['原始时段', '标准时段']
+        )
+
+
+@instrumented('同比宽表')
+def build_yoy_analysis(cube: ChannelCube, metrics: list, priority_order: list, kpis: list = None) -> pd.DataFrame:
+    """
+    由渠道立方体生成同比分析宽表（与 process_sales_data 的输出列一致）
+
+    参数:
+        cube: 渠道立方体
+        metrics: 需要统计的核心指标列表
+        priority_order: 指标优先级排序
+        kpis: 派生指标定义列表，默认为 YOY_KPIS
+
+    返回:
+        pd.DataFrame: 同比分析结果
+    """
+    # 同比结果不含环比期
+    yoy_periods = [p for p in cube.periods if p != '环比期']
+    layout = cube.column_layout(priority_order, yoy_periods, metrics)
+    yoy_analysis = cube.to_wide(layout)
+
+    # 计算动销门店、存量状态、同比增长率等派生指标（批量向量化计算）
+    yoy_analysis = evaluate_kpis(yoy_analysis, kpis or YOY_KPIS, {'priority_order': priority_order})
+
+    # 过滤优惠相关列（根据业务需求）
+    return yoy_analysis.drop(columns=[f"{p}_{c}_{m}" for p, c, m in layout if m == '优惠'])
+
+
+def process_sales_data_cube(raw_data: pd.DataFrame, category_config: list,
+                            metrics: list, priority_order: list,
+                            kpis: list = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    基于渠道立方体的 process_sales_data 实现，输出与原函数相同的同比分析结果和时段映射表
+
+    参数:
+        raw_data: 原始销售数据DataFrame
+        category_config: 渠道分类配置（包含新前缀和组成部分）
+        metrics: 需要统计的核心指标列表
+        priority_order: 指标优先级排序
+        kpis: 派生指标定义列表，默认为 YOY_KPIS
+
+    返回:
+        (同比分析结果DataFrame, 时段映射关系DataFrame)
+    """
+    print("开始处理原始数据（立方体引擎）...")
+    cube = ChannelCube.from_daily(raw_data, category_config, metrics)
+    yoy_analysis = build_yoy_analysis(cube, metrics, priority_order, kpis)
+    print("数据处理完成！")
+    return yoy_analysis, cube.period_mapping_frame()
+
+
+def process_sales_data_views(raw_data: pd.DataFrame, category_config: list, metrics: list,
+                             priority_order: list, views: dict, kpis: list = None,
+                             period_mapping: dict = None) -> tuple[dict, pd.DataFrame]:
+    """
+    单次计算多个门店视图的同比分析结果（如全部门店与存量门店）
+
+    参数:
+        raw_data: 原始销售数据DataFrame
+        category_config: 渠道分类配置（包含新前缀和组成部分）
+        metrics: 需要统计的核心指标列表
+        priority_order: 指标优先级排序
+        views: {视图名称: 与行对齐的权重/布尔掩码，None 表示全部行}
+        kpis: 派生指标定义列表，默认为 YOY_KPIS
+        period_mapping: 指定的时段映射，默认自动识别
+
+    返回:
+        ({视图名称: 同比分析结果DataFrame}, 时段映射关系DataFrame)
+    """
+    print("开始处理原始数据（立方体引擎，多视图）...")
+    cubes = ChannelCube.from_daily_views(raw_data, category_config, metrics, views, period_mapping)
+    results = {name: build_yoy_analysis(cube, metrics, priority_order, kpis) for name, cube in cubes.items()}
+    print("数据处理完成！")
+    period_mapping_df = next(iter(cubes.values())).period_mapping_frame()
+    return results, period_mapping_df
@@ -1,56 +1,79 @@
+import numpy as np
 import pandas as pd
 
-def cleaning_sales_data(input_file_path: str, supplemental_data_path: str) -> pd.DataFrame:
+from instrument_module import stage
+from key_module import KeyEncoder, encode_keys
+from memory_module import concat_chunks, downcast_daily_frame
+
+# ---------------------- 导出字段定义（与 SQL 查询列保持一致） ----------------------
+METRICS = ['流水', '实收', '优惠', '订单数']
+MERGE_KEYS = ['查询时段', '门店编号', '日期']
+
+# 多时段详细渠道查询.sql 中的基础渠道（按 SQL 列顺序）
+SALES_CHANNELS = [
+    'pos', '甜啦啦小程序', '美团外卖', '饿了么外卖', '快手团购',
+    '抖音团购', '美团大众点评团购', '美团大众点评小程序', '抖音小程序', '京东外卖'
+]
+# 销售数据补录查询.sql 中的补录渠道（按 SQL 列顺序）
+SUPPLEMENT_CHANNELS = ['线上新增快手团购', '线上新增美团团购', '线上新增抖音团购', '新增汇总']
+
+# 聚合关系（每个主渠道 ← 子渠道）
+AGGREGATION_MAPPING = {
+    '甜啦啦小程序': ['甜啦啦小程序-储值业务'],
+    '美团大众点评团购': ['线上新增美团团购'],
+    '抖音团购': ['线上新增抖音团购'],
+    '快手团购': ['线上新增快手团购'],
+    '汇总': ['新增汇总']
+}
+
+KEY_DTYPES = {'查询时段': str, '门店编号': str, '日期': 'int64'}
+
+
+def sales_columns() -> list:
+    """主销售数据 CSV 的列顺序（指标在外层、渠道在内层，与 SQL 一致）"""
+    columns = list(MERGE_KEYS)
+    for metric in METRICS:
+        columns.extend(f"{channel}_{metric}" for channel in SALES_CHANNELS)
+    columns.extend(f"汇总_{metric}" for metric in METRICS)
+    columns.append('汇总_营业天数')
+    return columns
+
+
+def supplement_columns() -> list:
+    """补录数据 CSV 的列顺序（渠道在外层、指标在内层，与 SQL 一致）"""
+    columns = list(MERGE_KEYS)
+    for channel in SUPPLEMENT_CHANNELS:
+        columns.extend(f"{channel}_{metric}" for metric in METRICS)
+    return columns
+
+
+def build_dtype_schema(columns: list) -> dict:
     """
-    处理销售数据：加载、合并、聚合字段，并清理冗余列。
-    
+    根据列名生成 read_csv 的显式类型，避免 pandas 逐块推断类型
+
     参数:
-        input_file_path (str): 主销售数据 CSV 文件路径
-        supplemental_data_path (str): 补充数据 CSV 文件路径
-    
+        columns (list): CSV 列名列表
+
     返回:
-        pd.DataFrame: 处理后的销售数据
+        dict: {列名: 类型}，关键字段按 KEY_DTYPES，其余数值列统一为 float64
     """
+    return {col: KEY_DTYPES.get(col, 'float64') for col in columns}
 
-    # 1. 加载数据
-    sales_df = pd.read_csv(input_file_path)
-    try:
-        supplement_df = pd.read_csv(supplemental_data_path)
-        print("补录数据加载成功！")
-    except Exception as e:
-        print(f"加载补充数据时出错: {e}")
-        supplement_df = pd.DataFrame(columns=['门店编号','日期','查询时段',
-            '线上新增美团团购_流水','线上新增美团团购_实收','线上新增美团团购_优惠','线上新增美团团购_订单数',
-            '线上新增抖音团购_流水','线上新增抖音团购_实收','线上新增抖音团购_优惠','线上新增抖音团购_订单数',
-            '线上新增快手团购_流水','线上新增快手团购_实收','线上新增快手团购_优惠','线上新增快手团购_订单数',
-            '新增汇总_流水','新增汇总_实收','新增汇总_优惠','新增汇总_订单数'
-            ])  # 如果加载失败，使用空 DataFrame
 
-    # 2. 合并主数据和补充数据
-    merge_keys = ['查询时段', '门店编号', '日期']
-    merged_df = pd.merge(
-        left=sales_df,
-        right=supplement_df,
-        how='outer',
-        on=merge_keys,
-        suffixes=("", "_tg")
-    )
-
-    # 3. 定义聚合关系（每个主渠道 ← 子渠道）
-    aggregation_mapping = {
-        '甜啦啦小程序': ['甜啦啦小程序-储值业务'],
-        '美团大众点评团购': ['线上新增美团团购'],
-        '抖音团购': ['线上新增抖音团购'],
-        '快手团购': ['线上新增快手团购'],
-        '汇总': ['新增汇总']
-    }
-
-    # 4. 循环聚合字段（确保 float 类型 & 填充 NaN）
-    metrics = ['流水', '实收', '优惠', '订单数']
-
-    for main_channel, sub_channels in aggregation_mapping.items():
+def fold_sub_channels(merged_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    将子渠道字段累加到主渠道，并删除子渠道字段及 _tg 后缀字段
+
+    参数:
+        merged_df (pd.DataFrame): 已合并补录字段的销售数据（原地修改）
+
+    返回:
+        pd.DataFrame: 聚合后的销售数据
+    """
+    # 循环聚合字段（确保 float 类型 & 填充 NaN）
+    for main_channel, sub_channels in AGGREGATION_MAPPING.items():
         for sub_channel in sub_channels:
-            for metric in metrics:
+            for metric in METRICS:
                 main_col = f"{main_channel}_{metric}"
                 sub_col = f"{sub_channel}_{metric}"
 
@@ -70,11 +93,11 @@ def cleaning_sales_data(input_file_path: str, supplemental_data_path: str) -> pd
                 # 聚合加法
                 merged_df[main_col] += merged_df[sub_col]
 
-    # 5. 删除所有子渠道字段
+    # 删除所有子渠道字段
     columns_to_drop = []
-    for main_channel, sub_channels in aggregation_mapping.items():
+    for main_channel, sub_channels in AGGREGATION_MAPPING.items():
         for sub_channel in sub_channels:
-            for metric in metrics:
+            for metric in METRICS:
                 columns_to_drop.append(f"{sub_channel}_{metric}")
 
     # 添加所有以 _tg 结尾的列
@@ -83,4 +106,139 @@ def cleaning_sales_data(input_file_path: str, supplemental_data_path: str) -> pd
     # 去重后删除
     merged_df.drop(columns=list(set(columns_to_drop)), inplace=True, errors='ignore')
 
-    return merged_df
\ No newline at end of file
+    return merged_df
+
+
+def load_supplement_data(supplemental_data_path: str, dtype: dict = None) -> pd.DataFrame:
+    """
+    加载补录数据，加载失败时返回带完整列名的空 DataFrame
+
+    参数:
+        supplemental_data_path (str): 补充数据 CSV 文件路径
+        dtype (dict): 可选的显式列类型
+
+    返回:
+        pd.DataFrame: 补录数据
+    """
+    try:
+        supplement_df = pd.read_csv(supplemental_data_path, dtype=dtype)
+        print("补录数据加载成功！")
+    except Exception as e:
+        print(f"加载补充数据时出错: {e}")
+        supplement_df = pd.DataFrame(columns=supplement_columns())  # 如果加载失败，使用空 DataFrame
+    return supplement_df
+
+
+def merge_supplement_chunks(chunks, supplement_df: pd.DataFrame):
+    """
+    逐块将补录数据并入主数据，结果的行集合与 (查询时段, 门店编号, 日期) 上的 outer merge 一致
+
+    补录数据（体量远小于主数据）的三个键由 KeyEncoder 组合为一个 int64 键并建立索引，
+    每块主数据同样编码后按整数键查找对齐补录行（不再对三个字符串键做哈希连接）；
+    未匹配到主数据的补录行在最后一块输出（行顺序按文件顺序，而非按键排序）。
+
+    参数:
+        chunks: 主销售数据块的迭代器
+        supplement_df (pd.DataFrame): 补录数据，每个键至多一行
+
+    生成:
+        pd.DataFrame: 并入补录字段的数据块（与主数据重名的补录列加 _tg 后缀，尚未聚合子渠道）
+    """
+    supplement_df = supplement_df.astype({k: v for k, v in KEY_DTYPES.items() if k in supplement_df.columns})
+    # 字典取自补录数据：主数据中字典外的键编码为 -1，不会匹配到任何补录行
+    encoder = KeyEncoder.from_frames(supplement_df)
+    supplement_index = pd.Index(encoder.encode(supplement_df))
+    if not supplement_index.is_unique:
+        raise ValueError("补录数据中 (查询时段, 门店编号, 日期) 存在重复行，无法与主数据逐行对齐")
+    value_columns = [col for col in supplement_df.columns if col not in MERGE_KEYS]
+    # 末尾追加一行 NaN，未匹配的主数据行取这一行
+    supplement_values = np.vstack([
+        supplement_df[value_columns].to_numpy(dtype=np.float64),
+        np.full((1, len(value_columns)), np.nan)
+    ])
+    matched = np.zeros(len(supplement_df), dtype=bool)
+
+    main_columns = None
+    for chunk in chunks:
+        main_columns = list(chunk.columns)
+        positions = supplement_index.get_indexer(encoder.encode(chunk))
+        matched[positions[positions >= 0]] = True
+        aligned = pd.DataFrame(supplement_values[positions], columns=value_columns, index=chunk.index)
+        # 与主数据重名的补录列按原 merge 规则加 _tg 后缀（随后删除）
+        aligned.columns = [f"{col}_tg" if col in chunk.columns else col for col in value_columns]
+        yield pd.concat([chunk, aligned], axis=1)
+
+    # 仅存在于补录数据中的行
+    remaining = supplement_df[~matched]
+    if len(remaining):
+        if main_columns is None:
+            main_columns = sales_columns()
+        extra_columns = [col for col in value_columns if col not in main_columns]
+        yield remaining.reindex(columns=main_columns + extra_columns).reset_index(drop=True)
+
+
+def iter_cleaned_chunks(input_file_path: str, supplemental_data_path: str, chunksize: int = 200000):
+    """
+    分块读取主销售数据，逐块并入补录数据并聚合子渠道，内存占用只与块大小相关
+
+    参数:
+        input_file_path (str): 主销售数据 CSV 文件路径
+        supplemental_data_path (str): 补充数据 CSV 文件路径
+        chunksize (int): 每块读取的行数
+
+    生成:
+        pd.DataFrame: 清洗后的数据块
+    """
+    supplement_df = load_supplement_data(supplemental_data_path, build_dtype_schema(supplement_columns()))
+    reader = pd.read_csv(input_file_path, dtype=build_dtype_schema(sales_columns()), chunksize=chunksize)
+    for merged in merge_supplement_chunks(reader, supplement_df):
+        yield fold_sub_channels(merged)
+
+
+def cleaning_sales_data(input_file_path: str, supplemental_data_path: str, chunksize: int = None,
+                        low_memory: bool = False) -> pd.DataFrame:
+    """
+    处理销售数据：加载、合并、聚合字段，并清理冗余列。
+
+    返回数据的 查询时段/门店编号 已按字典编码为分类类型（key_module），后续分组、连接和透视直接使用整数编码。
+
+    参数:
+        input_file_path (str): 主销售数据 CSV 文件路径
+        supplemental_data_path (str): 补充数据 CSV 文件路径
+        chunksize (int): 指定时使用分块流式读取（显式类型，逐块并入补录数据、编码键），
+            不必一次解析整个文件的字符串，峰值约为清洗结果加一个块；结果本身仍全部在内存中
+        low_memory (bool): 压缩内存占用（键转为分类/整数、金额 float32、计数 int32），分块时逐块压缩
+
+    返回:
+        pd.DataFrame: 处理后的销售数据
+    """
+    if chunksize:
+        with stage('分块加载与合并补录数据') as st:
+            # 每块读入后立即编码键（低内存模式下同时压缩），保留的块不含字符串对象
+            prepare = downcast_daily_frame if low_memory else encode_keys
+            cleaned = concat_chunks([prepare(chunk) for chunk in iter_cleaned_chunks(
+                input_file_path, supplemental_data_path, chunksize)])
+            st.set_output(cleaned)
+        return cleaned
+
+    # 1. 加载数据
+    with stage('加载数据') as st:
+        sales_df = pd.read_csv(input_file_path)
+        supplement_df = load_supplement_data(supplemental_data_path)
+        st.set_output(sales_df)
+
+    # 2. 合并主数据和补充数据
+    with stage('合并补录数据', sales_df) as st:
+        pieces = list(merge_supplement_chunks([sales_df], supplement_df))
+        merged_df = pieces[0] if len(pieces) == 1 else pd.concat(pieces, ignore_index=True)
+        st.set_output(merged_df)
+
+    # 3. 聚合子渠道字段并清理冗余列
+    with stage('聚合子渠道', merged_df) as st:
+        cleaned = fold_sub_channels(merged_df)
+        del sales_df, supplement_df, pieces, merged_df
+        encode_keys(cleaned)
+        if low_memory:
+            downcast_daily_frame(cleaned)
+        st.set_output(cleaned)
+    return cleaned
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from channel_cube import ChannelCube, build_composition_matrix, identify_base_channels
+from key_module import day_ordinals, key_codes, ordinal_dates
+from memory_module import MONEY_DECIMALS, restore_money
+
+STORE_VERSION = 1
+META_FILE = 'meta.json'
+VALUES_FILES = {'float64': 'values.f8', 'float32': 'values.f4'}  # (日期, 门店槽位, 基础渠道×指标) 指标数组
+PRESENT_FILE = 'present.u1'  # (日期, 门店槽位) uint8，该门店当天是否有记录
+STORE_HEADROOM = 0.1  # 门店槽位余量：容量为已见门店数的 1.1 倍（至少多 16 个槽位）
+
+
+class DailyStore:
+    """
+    清洗后日度数据的本地持久化存储：日期轴连续、门店按编号字典分配槽位，数据文件通过内存映射读取
+
+    目录结构:
+        meta.json   基础渠道、指标、起始日期、天数、门店编号字典、槽位容量及数值类型
+        values.f8   形状为 (天数, 门店容量, 基础渠道×指标) 的 float64 数组（float32 存储时为 values.f4）
+        present.u1  形状为 (天数, 门店容量) 的 uint8 数组
+
+    文件大小约为 天数 × 门店容量 × (基础渠道数 × 指标数 × 4或8 + 1) 字节，门店容量为已见门店数加 10% 余量，
+    例如 11 个基础渠道 × 4 个指标、3000 家门店、两年 730 天：float32 约 426MB，float64 约 850MB。
+
+    低内存模式下的 float32 输入（金额可无损还原到分）按 float32 保存，读取聚合时先还原为 float64 并舍入到分；
+    之后写入的数据无法用 float32 精确表示时整体改为 float64。
+    新日期追加到文件末尾；已有日期的数据原地覆盖（补录/更正）；门店数超过容量、出现早于起始日期的数据
+    或数值类型改变时重建文件。读取返回内存映射切片，不复制数据。
+
+    用法:
+        store = DailyStore.open_or_create(store_dir, raw_sales_data.columns, CHANNEL_CATEGORIES, METRICS)
+        store.append(raw_sales_data)
+        cube = store.query_cube([('本期', 20250901, 20250930), ('同期', 20240901, 20240930)], CHANNEL_CATEGORIES)
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        with open(os.path.join(root, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != STORE_VERSION:
+            raise ValueError(f"日度存储版本 {meta.get('version')} 与当前版本 {STORE_VERSION} 不一致: {root}")
+        self.channels = meta['channels']
+        self.metrics = meta['metrics']
+        self.start_day = meta['start_day']
+        self.n_days = meta['n_days']
+        self.capacity = meta['capacity']
+        self.dtype = np.dtype(meta.get('dtype', 'float64'))
+        self.stores = meta['stores']
+        self.store_index = {store: i for i, store in enumerate(self.stores)}
+        self.width = len(self.channels) * len(self.metrics)
+        self._values = self._present = None
+
+    # ---------------------- 创建与元数据 ----------------------
+    @classmethod
+    def create(cls, root: str, channels: list, metrics: list, capacity: int = 0) -> 'DailyStore':
+        """
+        创建空存储（数据文件在首次写入时按实际门店数和数值类型建立）
+
+        参数:
+            root: 存储目录
+            channels: 基础渠道列表（组合渠道在读取时由组合矩阵计算）
+            metrics: 指标列表
+            capacity: 初始门店槽位容量，默认按首次写入的门店数确定
+
+        返回:
+            DailyStore: 新建的存储
+        """
+        os.makedirs(root, exist_ok=True)
+        for name in (VALUES_FILES['float64'], PRESENT_FILE):
+            open(os.path.join(root, name), 'wb').close()
+        meta = {'version': STORE_VERSION, 'channels': list(channels), 'metrics': list(metrics),
+                'start_day': None, 'n_days': 0, 'capacity': int(capacity), 'dtype': 'float64', 'stores': []}
+        cls._write_meta(root, meta)
+        return cls(root)
+
+    @classmethod
+    def open_or_create(cls, root: str, columns, category_config: list, metrics: list) -> 'DailyStore':
+        """打开已有存储；不存在时按日度数据列名识别基础渠道并创建"""
+        if os.path.exists(os.path.join(root, META_FILE)):
+            return cls(root)
+        return cls.create(root, identify_base_channels(columns, category_config, metrics), metrics)
+
+    @staticmethod
+    def _write_meta(root: str, meta: dict) -> None:
+        # 先写临时文件再替换，中断时元数据仍指向完整的旧数据
+        tmp_path = os.path.join(root, META_FILE + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(root, META_FILE))
+
+    def _save_meta(self) -> None:
+        self._write_meta(self.root, {
+            'version': STORE_VERSION, 'channels': self.channels, 'metrics': self.metrics,
+            'start_day': self.start_day, 'n_days': self.n_days, 'capacity': self.capacity,
+            'dtype': self.dtype.name, 'stores': self.stores,
+        })
+
+    @property
+    def values_path(self) -> str:
+        """指标数据文件路径"""
+        return os.path.join(self.root, VALUES_FILES[self.dtype.name])
+
+    @property
+    def dates(self) -> np.ndarray:
+        """日期轴（YYYYMMDD 整数）"""
+        if self.start_day is None:
+            return np.empty(0, dtype=np.int64)
+        return ordinal_dates(np.arange(self.start_day, self.start_day + self.n_days))
+
+    # ---------------------- 内存映射 ----------------------
+    def _maps(self, mode: str = 'r') -> tuple:
+        """按当前形状打开数据文件的内存映射"""
+        if self.n_days == 0:
+            return (np.zeros((0, self.capacity, self.width), dtype=self.dtype),
+                    np.zeros((0, self.capacity), dtype=np.uint8))
+        if self._values is None or self._values.mode != mode:
+            self._close_maps()
+            self._values = np.memmap(self.values_path, dtype=self.dtype, mode=mode,
+                                     shape=(self.n_days, self.capacity, self.width))
+            self._present = np.memmap(os.path.join(self.root, PRESENT_FILE), dtype=np.uint8, mode=mode,
+                                      shape=(self.n_days, self.capacity))
+        return self._values, self._present
+
+    def _close_maps(self) -> None:
+        if self._values is not None:
+            if self._values.mode == 'r+':
+                self._values.flush()
+                self._present.flush()
+            self._values = self._present = None
+
+    def close(self) -> None:
+        """刷新并释放内存映射（Windows 下替换/删除文件前必须释放）"""
+        self._close_maps()
+
+    def _extend_days(self, end_day: int) -> None:
+        """在文件末尾追加日期（新增部分补0）"""
+        if self.start_day is None:
+            raise ValueError("空存储需先确定起始日期")
+        n_days = end_day - self.start_day + 1
+        if n_days <= self.n_days:
+            return
+        self._close_maps()
+        for path, row_bytes in ((self.values_path, self.capacity * self.width * self.dtype.itemsize),
+                                (os.path.join(self.root, PRESENT_FILE), self.capacity)):
+            with open(path, 'r+b') as f:
+                f.truncate(n_days * row_bytes)
+        self.n_days = n_days
+
+    def _rebuild(self, start_day: int, capacity: int, dtype: np.dtype) -> None:
+        """按新的起始日期/门店容量/数值类型重建数据文件，逐日复制旧数据"""
+        old_start, old_days, old_capacity, old_dtype = self.start_day, self.n_days, self.capacity, self.dtype
+        offset = 0 if old_start is None else old_start - start_day
+        n_days = max(old_days + offset, 1)
+        self._close_maps()
+        old_values_path = self.values_path
+        present_path = os.path.join(self.root, PRESENT_FILE)
+        for old_path, new_path, old_type, new_type, shape in (
+                (old_values_path, os.path.join(self.root, VALUES_FILES[dtype.name]), old_dtype, dtype,
+                 (capacity, self.width)),
+                (present_path, present_path, np.uint8, np.uint8, (capacity,))):
+            tmp_path = new_path + '.tmp'
+            new = np.memmap(tmp_path, dtype=new_type, mode='w+', shape=(n_days,) + shape)
+            if old_days:
+                old = np.memmap(old_path, dtype=old_type, mode='r', shape=(old_days, old_capacity) + shape[1:])
+                for day in range(old_days):
+                    # float32 改为 float64 时按金额精度还原
+                    new[offset + day, :old_capacity] = (np.round(old[day].astype(np.float64), MONEY_DECIMALS)
+                                                        if old_type == np.float32 and new_type == np.float64
+                                                        else old[day])
+                del old
+            new.flush()
+            del new
+            os.replace(tmp_path, new_path)
+            if old_path != new_path and os.path.exists(old_path):
+                os.remove(old_path)
+        self.start_day, self.n_days, self.capacity, self.dtype = start_day, n_days, capacity, np.dtype(dtype)
+
+    # ---------------------- 写入 ----------------------
+    def append(self, daily_data: pd.DataFrame) -> dict:
+        """
+        写入清洗后的日度数据：新日期追加，已有 (门店, 日期) 原地覆盖
+
+        参数:
+            daily_data: 清洗后的日度销售数据（门店编号/日期 + 渠道_指标列，缺失列与 NaN 视为0）
+
+        返回:
+            dict: {'rows', 'new_days', 'new_stores', 'patched'} 统计
+        """
+        if daily_data.empty:
+            return {'rows': 0, 'new_days': 0, 'new_stores': 0, 'patched': 0}
+        days = day_ordinals(daily_data['日期'])
+
+        # 门店编号字典只追加，不重排已有槽位；按载入时的整数编码逐个字典项查找槽位，不逐行查字符串
+        store_codes, stores = key_codes(daily_data['门店编号'])
+        stores = [str(store) for store in stores]
+        new_stores = [s for s in stores if s not in self.store_index]
+        for store in new_stores:
+            self.store_index[store] = len(self.stores)
+            self.stores.append(store)
+
+        columns = [f"{channel}_{metric}" for channel in self.channels for metric in self.metrics]
+        frame = daily_data.reindex(columns=columns)
+        narrowed = any(frame[col].dtype == np.float32 for col in columns)
+        rows = np.nan_to_num(restore_money(frame).to_numpy(dtype=np.float64, na_value=0.0))
+        # 空存储遇到低内存模式的 float32 输入时按 float32 保存；float32 存储只接收可无损还原的数据
+        dtype = np.dtype(np.float32) if (self.start_day is None and narrowed) else self.dtype
+        if dtype == np.float32 and not np.array_equal(
+                np.round(rows.astype(np.float32).astype(np.float64), MONEY_DECIMALS), rows):
+            dtype = np.dtype(np.float64)
+
+        first_day, last_day = int(days.min()), int(days.max())
+        capacity = self.capacity
+        if capacity < len(self.stores):
+            capacity = len(self.stores) + max(int(len(self.stores) * STORE_HEADROOM), 16)
+        old_days = self.n_days
+        if (self.start_day is None or first_day < self.start_day or capacity != self.capacity
+                or dtype != self.dtype):
+            self._rebuild(first_day if self.start_day is None else min(first_day, self.start_day), capacity, dtype)
+        self._extend_days(last_day)
+        new_days = self.n_days - old_days
+
+        values, present = self._maps('r+')
+        day_idx = days - self.start_day
+        slot_idx = np.array([self.store_index[store] for store in stores], dtype=np.int64)[store_codes]
+        patched = int(present[day_idx, slot_idx].sum())
+        values[day_idx, slot_idx] = rows
+        present[day_idx, slot_idx] = 1
+        self._close_maps()
+        self._save_meta()
+        return {'rows': len(daily_data), 'new_days': new_days, 'new_stores': len(new_stores), 'patched': patched}
+
+    # ---------------------- 读取 ----------------------
+    def read(self, start, end) -> tuple[np.ndarray, np.ndarray]:
+        """
+        读取 [start, end]（含两端）区间的内存映射切片（不复制数据，float32 存储时为原始 float32 值，
+        聚合前须经 restore_block 还原）
+
+        返回:
+            (形状为 (天数, 门店数, 基础渠道, 指标) 的指标, 形状为 (天数, 门店数) 的是否有记录)
+        """
+        values, present = self._maps('r')
+        if self.start_day is None:
+            return values[:0].reshape(0, 0, len(self.channels), len(self.metrics)), present[:0, :0]
+        lo = int(np.clip(day_ordinals([start])[0] - self.start_day, 0, self.n_days))
+        hi = int(np.clip(day_ordinals([end])[0] - self.start_day + 1, 0, self.n_days))
+        n_stores = len(self.stores)
+        block = values[lo:hi, :n_stores].reshape(hi - lo, n_stores, len(self.channels), len(self.metrics))
+        return block, present[lo:hi, :n_stores]
+
+    def restore_block(self, block: np.ndarray) -> np.ndarray:
+        """float32 存储的指标还原为 float64 并舍入到分（float64 存储原样返回）"""
+        if block.dtype == np.float32:
+            return np.round(block.astype(np.float64), MONEY_DECIMALS)
+        return block
+
+    def to_daily_frame(self, start, end, period_label: str = None) -> pd.DataFrame:
+        """
+        还原为清洗后的日度数据格式（仅有记录的行），可直接交给现有处理流程
+
+        参数:
+            start / end: 日期区间（含两端）
+            period_label: 查询时段列的取值，默认为 'start~end'
+        """
+        block, present = self.read(start, end)
+        day_idx, slot_idx = np.nonzero(present)
+        lo = int(day_ordinals([start])[0])
+        first_day = max(lo, self.start_day or lo)
+        data = pd.DataFrame(self.restore_block(block[day_idx, slot_idx]).reshape(len(day_idx), -1),
+                            columns=[f"{channel}_{metric}" for channel in self.channels for metric in self.metrics])
+        data.insert(0, '日期', ordinal_dates(first_day + day_idx))
+        data.insert(0, '门店编号', np.asarray(self.stores, dtype=object)[slot_idx])
+        data.insert(0, '查询时段', period_label or f"{start}~{end}")
+        return data
+
+    def query_cube(self, ranges: list, category_config: list) -> ChannelCube:
+        """
+        直接从内存映射数据按命名日期区间聚合为渠道立方体（门店按编号排序，只保留有记录的门店）
+
+        参数:
+            ranges: [(名称, 开始日期, 结束日期), ...]
+            category_config: 渠道分类配置（包含新前缀和组成部分）
+
+        返回:
+            ChannelCube: 时段为各区间名称的渠道立方体
+        """
+        channels, composition = build_composition_matrix(self.channels, category_config)
+        order = np.argsort(np.asarray(self.stores, dtype=str), kind='stable')
+        values, days, has_rows = [], [], []
+        for _, start, end in ranges:
+            block, present = self.read(start, end)
+            block = self.restore_block(block)
+            base_sums = block.sum(axis=0)
+            values.append(np.einsum('sbm,bc->scm', base_sums, composition))
+            if '流水' in self.metrics:
+                revenue = block[:, :, :, self.metrics.index('流水')]
+                days.append((revenue @ composition > 0).sum(axis=0).astype(np.float64))
+            else:
+                days.append(np.zeros((len(self.stores), len(channels))))
+            has_rows.append(present.any(axis=0))
+        values = np.stack(values, axis=1)[order]
+        operating_days = np.stack(days, axis=1)[order]
+        has_rows = np.stack(has_rows, axis=1)[order]
+        present = has_rows.any(axis=1)
+        period_mapping = {f"{start}~{end}": name for name, start, end in ranges}
+        return ChannelCube(np.asarray(self.stores, dtype=object)[order][present], [name for name, _, _ in ranges],
+                           channels, list(self.metrics), values[present], operating_days[present],
+                           period_mapping, has_rows[present])
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from instrument_module import stage
+
+# 各结果表的主键（宽表每个门店一行，时段体现在列名中；期数表每个标准时段一行）
+TABLE_KEYS = {
+    '同比数据': ['门店编号'],
+    '同比数据(存量)': ['门店编号'],
+    '期数': ['标准时段'],
+    '目标数据': ['门店编号'],
+}
+
+WRITE_MODES = ('replace', 'upsert')
+PATCH_KEYS_TABLE = '补丁键'  # patch 时存放待改写主键的临时表
+
+
+def quote_identifier(name: str) -> str:
+    """SQLite 标识符加引号（列名含中文、括号、%等字符）"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _sqlite_type(series: pd.Series) -> str:
+    """按 pandas 类型推断 SQLite 列类型（与 to_sql 的映射一致）"""
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_integer_dtype(series):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(series):
+        return 'REAL'
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return 'TIMESTAMP'
+    return 'TEXT'
+
+
+def to_records(data: pd.DataFrame) -> list:
+    """转换为 executemany 使用的元组列表：numpy 标量转为 Python 类型，缺失值转为 NULL"""
+    columns = []
+    for col in data.columns:
+        series = data[col]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            series = series.dt.strftime('%Y-%m-%d %H:%M:%S')
+        values = series.to_numpy(dtype=object, copy=True)
+        values[pd.isna(series).to_numpy()] = None
+        columns.append(values)
+    return list(zip(*columns)) if columns else []
+
+
+def _same_values(new: pd.Series, old: pd.Series) -> np.ndarray:
+    """逐行比较新旧取值，两侧均为缺失视为相同"""
+    both_missing = new.isna().to_numpy() & old.isna().to_numpy()
+    if pd.api.types.is_numeric_dtype(new) and pd.api.types.is_numeric_dtype(old):
+        equal = new.to_numpy(dtype=np.float64) == old.to_numpy(dtype=np.float64)
+    else:
+        equal = new.astype(str).to_numpy() == old.astype(str).to_numpy()
+    return equal | both_missing
+
+
+class SQLiteWriter:
+    """
+    结果表写入器：整个运行复用一个连接，批量 executemany + 单事务写入，按主键建表，
+    upsert 模式下只改写数值发生变化的门店
+
+    用法:
+        with SQLiteWriter(db_path) as writer:
+            writer.write(yoy_analysis_df, '同比数据', mode='upsert')
+
+    参数:
+        db_path: 数据库文件路径
+        cache_size_mb: SQLite 页缓存大小（MB）
+        synchronous: PRAGMA synchronous 取值，WAL 下 NORMAL 即可保证数据库一致
+    """
+
+    def __init__(self, db_path: str, cache_size_mb: int = 64, synchronous: str = 'NORMAL'):
+        self.db_path = db_path
+        # 自行管理事务（isolation_level=None），避免 sqlite3 模块隐式开启/提交；
+        # 连接可交给流水线的后台数据库线程使用（同一时刻只有一个线程访问）
+        self.conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(f'PRAGMA synchronous={synchronous}')
+        self.conn.execute(f'PRAGMA cache_size={-int(cache_size_mb * 1024)}')  # 负数表示 KB
+        self.conn.execute('PRAGMA temp_store=MEMORY')
+
+    def __enter__(self) -> 'SQLiteWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """合并 WAL 文件后关闭连接，使同步盘上只留下单个数据库文件"""
+        if self.conn is not None:
+            self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            self.conn.close()
+            self.conn = None
+
+    def read_table(self, table_name: str) -> pd.DataFrame:
+        """读取整张表"""
+        return pd.read_sql_query(f'SELECT * FROM {quote_identifier(table_name)}', self.conn)
+
+    def _table_info(self, table_name: str) -> tuple:
+        """返回表的 (列名集合, 按顺序排列的主键列)，表不存在时均为空"""
+        rows = self.conn.execute(f'PRAGMA table_info({quote_identifier(table_name)})').fetchall()
+        columns = {row[1] for row in rows}
+        keys = [row[1] for row in sorted(rows, key=lambda row: row[5]) if row[5] > 0]
+        return columns, keys
+
+    def _create_table(self, data: pd.DataFrame, table_name: str, key_columns: list) -> None:
+        column_defs = [f'{quote_identifier(col)} {_sqlite_type(data[col])}' for col in data.columns]
+        if key_columns:
+            column_defs.append(f"PRIMARY KEY ({', '.join(quote_identifier(col) for col in key_columns)})")
+        self.conn.execute(f'DROP TABLE IF EXISTS {quote_identifier(table_name)}')
+        self.conn.execute(f"CREATE TABLE {quote_identifier(table_name)} ({', '.join(column_defs)})")
+
+    def _insert(self, data: pd.DataFrame, table_name: str, key_columns: list = None) -> None:
+        columns = ', '.join(quote_identifier(col) for col in data.columns)
+        placeholders = ', '.join('?' * len(data.columns))
+        sql = f'INSERT INTO {quote_identifier(table_name)} ({columns}) VALUES ({placeholders})'
+        if key_columns:
+            updates = [f'{quote_identifier(col)}=excluded.{quote_identifier(col)}' for col in data.columns if col not in key_columns]
+            conflict = ', '.join(quote_identifier(col) for col in key_columns)
+            sql += f' ON CONFLICT ({conflict}) DO ' + (f"UPDATE SET {', '.join(updates)}" if updates else 'NOTHING')
+        self.conn.executemany(sql, to_records(data))
+
+    def _replace(self, data: pd.DataFrame, table_name: str, key_columns: list) -> dict:
+        self._create_table(data, table_name, key_columns)
+        self._insert(data, table_name)
+        return {'inserted': len(data), 'updated': 0, 'deleted': 0, 'unchanged': 0}
+
+    def _upsert(self, data: pd.DataFrame, table_name: str, key_columns: list,
+                existing: pd.DataFrame = None) -> dict:
+        """按主键比较后只写入变化的行；existing 为参与比较的已有行，默认整张表"""
+        if existing is None:
+            existing = self.read_table(table_name)
+        new_keyed = data.set_index(key_columns)
+        old_keyed = existing.set_index(key_columns)
+
+        common = new_keyed.index.intersection(old_keyed.index)
+        new_common = new_keyed.loc[common]
+        old_common = old_keyed.loc[common]
+        unchanged = np.ones(len(common), dtype=bool)
+        for col in new_keyed.columns:
+            unchanged &= _same_values(new_common[col], old_common[col])
+
+        added_keys = new_keyed.index.difference(old_keyed.index)
+        changed_keys = common[~unchanged].append(added_keys)
+        removed_keys = old_keyed.index.difference(new_keyed.index)
+
+        rows_to_write = new_keyed.loc[changed_keys].reset_index()[list(data.columns)]
+        self._insert(rows_to_write, table_name, key_columns)
+        if len(removed_keys):
+            conditions = ' AND '.join(f'{quote_identifier(col)}=?' for col in key_columns)
+            removed = removed_keys.to_frame(index=False)
+            self.conn.executemany(f'DELETE FROM {quote_identifier(table_name)} WHERE {conditions}', to_records(removed))
+        return {'inserted': len(added_keys), 'updated': int((~unchanged).sum()),
+                'deleted': len(removed_keys), 'unchanged': int(unchanged.sum())}
+
+    def _read_keys(self, table_name: str, keys: pd.DataFrame) -> pd.DataFrame:
+        """读取主键在 keys 中的已有行（主键先写入临时表再连接，避免逐个拼接条件）"""
+        key_columns = list(keys.columns)
+        columns = ', '.join(quote_identifier(col) for col in key_columns)
+        self.conn.execute(f'DROP TABLE IF EXISTS temp.{quote_identifier(PATCH_KEYS_TABLE)}')
+        self.conn.execute(f'CREATE TEMP TABLE {quote_identifier(PATCH_KEYS_TABLE)} ({columns})')
+        self.conn.executemany(f'INSERT INTO temp.{quote_identifier(PATCH_KEYS_TABLE)} VALUES '
+                              f"({', '.join('?' * len(key_columns))})", to_records(keys))
+        return pd.read_sql_query(f'SELECT t.* FROM {quote_identifier(table_name)} t '
+                                 f'JOIN temp.{quote_identifier(PATCH_KEYS_TABLE)} USING ({columns})', self.conn)
+
+    def patch(self, data: pd.DataFrame, table_name: str, keys: pd.DataFrame) -> dict:
+        """
+        只改写指定主键的行：data 中的行插入/更新，keys 中有而 data 中没有的行删除，其余行不读取、不改动
+
+        参数:
+            data: 受影响主键的新结果（列与已有表一致）
+            table_name: 数据库表名
+            keys: 受影响的主键（列为表的主键列），如重算的门店编号
+
+        返回:
+            dict: {'inserted', 'updated', 'deleted', 'unchanged'} 行数
+
+        异常:
+            ValueError: 表不存在、列或主键与 data 不一致时（需全量写入）
+        """
+        existing_columns, existing_keys = self._table_info(table_name)
+        if not existing_keys or existing_columns != set(data.columns) or existing_keys != list(keys.columns):
+            raise ValueError(f"表 {table_name} 的结构与补丁数据不一致，无法按主键改写")
+        with stage(f'改写数据库:{table_name}', data):
+            self.conn.execute('BEGIN')
+            try:
+                existing = self._read_keys(table_name, keys)
+                stats = self._upsert(data, table_name, existing_keys, existing)
+                self.conn.execute('COMMIT')
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+        return stats
+
+    def write(self, data: pd.DataFrame, table_name: str, key_columns: list = None, mode: str = 'replace') -> dict:
+        """
+        在一个事务中写入整张表
+
+        参数:
+            data: 待保存的 DataFrame
+            table_name: 数据库表名
+            key_columns: 主键列，默认取 TABLE_KEYS；键不唯一时退化为无主键的全量重建
+            mode: 'replace' 全量重建；'upsert' 仅插入/更新/删除发生变化的行（表结构变化时自动全量重建）
+
+        返回:
+            dict: {'inserted', 'updated', 'deleted', 'unchanged'} 行数
+        """
+        if mode not in WRITE_MODES:
+            raise ValueError(f"未知的写入方式 {mode}，可选: {', '.join(WRITE_MODES)}")
+        if key_columns is None:
+            key_columns = TABLE_KEYS.get(table_name, [])
+        key_columns = [col for col in key_columns if col in data.columns]
+        if key_columns and data.duplicated(key_columns).any():
+            print(f"警告：表 {table_name} 的主键 {key_columns} 存在重复值，改为无主键全量写入")
+            key_columns = []
+
+        # 只有表已存在、列集合一致且主键一致时才能增量写入
+        existing_columns, existing_keys = self._table_info(table_name)
+        if mode == 'upsert' and not (key_columns and existing_columns == set(data.columns)
+                                     and existing_keys == key_columns):
+            mode = 'replace'
+
+        with stage(f'写入数据库:{table_name}', data):
+            self.conn.execute('BEGIN')
+            try:
+                if mode == 'upsert':
+                    stats = self._upsert(data, table_name, key_columns)
+                else:
+                    stats = self._replace(data, table_name, key_columns)
+                self.conn.execute('COMMIT')
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+        return stats
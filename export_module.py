@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+import os
+
+import numpy as np
+import pandas as pd
+
+from instrument_module import stage
+from key_module import decode_key_column
+
+EXPORT_FORMATS = ('xlsx', 'csv', 'parquet')
+EXPORT_BATCH_ROWS = 5000       # 每批写出的行数，导出时的额外内存只与批大小有关
+XLSX_MAX_ROWS = 1048576        # Excel 单个工作表的行数上限（含表头）
+
+
+def iter_row_batches(data: pd.DataFrame, batch_rows: int = EXPORT_BATCH_ROWS):
+    """
+    按行切片逐批返回（切片不复制整表），分类键列在每批内还原为原始取值
+
+    参数:
+        data: 结果表
+        batch_rows: 每批行数
+
+    返回:
+        生成器，逐个产出 DataFrame
+    """
+    for start in range(0, max(len(data), 1), batch_rows):
+        batch = data.iloc[start:start + batch_rows]
+        categorical = [col for col in batch.columns if isinstance(batch[col].dtype, pd.CategoricalDtype)]
+        if categorical:
+            batch = batch.assign(**{col: decode_key_column(batch[col]) for col in categorical})
+        yield batch
+
+
+def _cell_rows(batch: pd.DataFrame) -> list:
+    """一批数据转为单元格值的行列表：缺失和无穷转为空单元格，numpy 标量转为 Python 类型"""
+    columns = []
+    for col in batch.columns:
+        values = batch[col].to_numpy(dtype=object, na_value=None)
+        if pd.api.types.is_float_dtype(batch[col].dtype):
+            values[~np.isfinite(batch[col].to_numpy(dtype=np.float64, na_value=np.nan))] = None
+        columns.append(values.tolist())
+    return list(zip(*columns))
+
+
+def export_csv(data: pd.DataFrame, file_path: str, batch_rows: int = EXPORT_BATCH_ROWS) -> int:
+    """
+    逐批追加写出 CSV（utf-8-sig，Excel 可直接打开中文列名）
+
+    参数:
+        data: 结果表
+        file_path: 输出文件路径
+        batch_rows: 每批行数
+
+    返回:
+        int: 写出的行数
+    """
+    with open(file_path, 'w', encoding='utf-8-sig', newline='') as f:
+        for i, batch in enumerate(iter_row_batches(data, batch_rows)):
+            batch.to_csv(f, index=False, header=(i == 0))
+    return len(data)
+
+
+def export_parquet(data: pd.DataFrame, file_path: str, batch_rows: int = EXPORT_BATCH_ROWS) -> int:
+    """
+    逐批写出 Parquet，每批为一个行组（需要 pyarrow）
+
+    参数:
+        data: 结果表
+        file_path: 输出文件路径
+        batch_rows: 每批行数
+
+    返回:
+        int: 写出的行数
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for batch in iter_row_batches(data, batch_rows):
+            if writer is None:
+                table = pa.Table.from_pandas(batch, preserve_index=False)
+                writer = pq.ParquetWriter(file_path, table.schema)
+            else:
+                table = pa.Table.from_pandas(batch, schema=writer.schema, preserve_index=False)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return len(data)
+
+
+class _XlsxWorkbook:
+    """
+    流式写入的 xlsx 工作簿：优先使用 xlsxwriter 的 constant_memory 模式，否则使用 openpyxl 的 write_only 模式，
+    两者都是每写完一行即落盘，内存不随行数增长
+    """
+
+    def __init__(self, file_path: str):
+        try:
+            import xlsxwriter
+        except ImportError:
+            xlsxwriter = None
+        if xlsxwriter is not None:
+            self.engine = 'xlsxwriter'
+            self.book = xlsxwriter.Workbook(file_path, {'constant_memory': True})
+        else:
+            try:
+                from openpyxl import Workbook
+            except ImportError:
+                raise ImportError("导出 xlsx 需要安装 xlsxwriter 或 openpyxl") from None
+            self.engine = 'openpyxl'
+            self.book = Workbook(write_only=True)
+        self.file_path = file_path
+
+    def add_sheet(self, name: str, data: pd.DataFrame, batch_rows: int) -> int:
+        """新建工作表并逐批写入表头和数据行，返回写出的行数"""
+        if len(data) + 1 > XLSX_MAX_ROWS:
+            raise ValueError(f"表 {name} 共 {len(data)} 行，超过 xlsx 单表上限，请改用 csv 或 parquet 导出")
+        if self.engine == 'xlsxwriter':
+            sheet = self.book.add_worksheet(name)
+            sheet.write_row(0, 0, [str(col) for col in data.columns])
+            row = 1
+            for batch in iter_row_batches(data, batch_rows):
+                for values in _cell_rows(batch):
+                    sheet.write_row(row, 0, values)
+                    row += 1
+        else:
+            sheet = self.book.create_sheet(name)
+            sheet.append([str(col) for col in data.columns])
+            for batch in iter_row_batches(data, batch_rows):
+                for values in _cell_rows(batch):
+                    sheet.append(values)
+        return len(data)
+
+    def close(self) -> None:
+        if self.engine == 'xlsxwriter':
+            self.book.close()
+        else:
+            self.book.save(self.file_path)
+
+
+def export_xlsx(tables: dict, file_path: str, batch_rows: int = EXPORT_BATCH_ROWS) -> dict:
+    """
+    多张结果表流式写入一个 xlsx 工作簿，每张表一个工作表（需要 xlsxwriter 或 openpyxl）
+
+    参数:
+        tables: {表名: DataFrame}，表名作为工作表名
+        file_path: 输出文件路径
+        batch_rows: 每批行数
+
+    返回:
+        dict: {表名: 写出的行数}
+    """
+    workbook = _XlsxWorkbook(file_path)
+    try:
+        return {name: workbook.add_sheet(name, data, batch_rows) for name, data in tables.items()}
+    finally:
+        workbook.close()
+
+
+def export_tables(tables: dict, output_dir: str, formats=('xlsx',), batch_rows: int = EXPORT_BATCH_ROWS,
+                  workbook_name: str = '结果数据') -> dict:
+    """
+    将本次运行的结果表直接从内存导出为多种格式（不再从数据库回读）
+
+    xlsx 为一个工作簿 <output_dir>/<workbook_name>.xlsx，每张表一个工作表；
+    csv/parquet 为每张表一个文件 <output_dir>/<表名>.csv|.parquet。
+
+    参数:
+        tables: {表名: DataFrame}
+        output_dir: 输出目录
+        formats: 导出格式，取值见 EXPORT_FORMATS
+        batch_rows: 每批行数
+        workbook_name: xlsx 工作簿文件名（不含扩展名）
+
+    返回:
+        dict: {格式: [输出文件路径, ...]}
+    """
+    unknown = [fmt for fmt in formats if fmt not in EXPORT_FORMATS]
+    if unknown:
+        raise ValueError(f"不支持的导出格式: {unknown}，可选 {list(EXPORT_FORMATS)}")
+    os.makedirs(output_dir, exist_ok=True)
+    outputs = {}
+    for fmt in formats:
+        if fmt == 'xlsx':
+            file_path = os.path.join(output_dir, f"{workbook_name}.xlsx")
+            with stage('导出:xlsx'):
+                export_xlsx(tables, file_path, batch_rows)
+            outputs[fmt] = [file_path]
+            continue
+        export = export_csv if fmt == 'csv' else export_parquet
+        outputs[fmt] = []
+        for table_name, data in tables.items():
+            file_path = os.path.join(output_dir, f"{table_name}.{fmt}")
+            with stage(f'导出:{fmt}:{table_name}', data):
+                export(data, file_path, batch_rows)
+            outputs[fmt].append(file_path)
+    return outputs
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+_active_report = None  # 当前生效的运行报告（未启用时各阶段不做任何记录）
+
+
+# ---------------------- 内存探测 ----------------------
+def _read_proc_status(field: str):
+    """读取 /proc/self/status 中的内存字段（字节），不可用时返回 None"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def _windows_memory_counters():
+    """Windows 下读取进程内存计数器 (当前工作集, 峰值工作集)"""
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    handle = ctypes.windll.kernel32.GetCurrentProcess()
+    ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb)
+    return counters.WorkingSetSize, counters.PeakWorkingSetSize
+
+
+def current_rss() -> int:
+    """当前进程常驻内存（字节），无法获取时返回0"""
+    if sys.platform == 'win32':
+        return _windows_memory_counters()[0]
+    return _read_proc_status('VmRSS') or 0
+
+
+def peak_rss() -> int:
+    """进程峰值常驻内存（字节），无法获取时返回0"""
+    if sys.platform == 'win32':
+        return _windows_memory_counters()[1]
+    peak = _read_proc_status('VmHWM')
+    if peak is not None:
+        return peak
+    try:
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == 'darwin' else usage * 1024
+    except ImportError:
+        return 0
+
+
+RSS_SAMPLE_INTERVAL = 0.02  # 阶段内常驻内存的采样间隔（秒）
+
+
+class _RssSampler:
+    """
+    后台线程按固定间隔采样当前常驻内存，计入所有进行中阶段的峰值
+
+    不依赖操作系统的峰值计数：Windows 的峰值工作集无法重置，Linux 的 clear_refs 会重置整个进程的峰值，
+    流水线中并发的阶段会互相清掉对方的记录。采样得到的是阶段期间整个进程的内存峰值
+    （并发阶段的内存会互相计入），短于采样间隔的尖峰可能漏记。
+    """
+
+    def __init__(self, interval: float = RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self._records = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, record) -> None:
+        """开始为 record 采样，没有采样线程时启动一个"""
+        with self._lock:
+            self._records.add(record)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='rss-sampler', daemon=True)
+                self._thread.start()
+
+    def remove(self, record) -> None:
+        """停止为 record 采样，最后一个阶段结束后采样线程自行退出"""
+        with self._lock:
+            self._records.discard(record)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._records:
+                    self._thread = None
+                    return
+                records = list(self._records)
+            rss = current_rss()
+            for record in records:
+                record._peak_bytes = max(record._peak_bytes, rss)
+            time.sleep(self.interval)
+
+
+_rss_sampler = _RssSampler()
+
+
+# ---------------------- 阶段记录 ----------------------
+def _shape(data):
+    """返回 DataFrame/数组（或其元组/字典中的第一个）的 (行数, 列数)"""
+    if isinstance(data, (pd.DataFrame, pd.Series, np.ndarray)):
+        return data.shape[0], (data.shape[1] if data.ndim >= 2 else 1)
+    if isinstance(data, dict):
+        data = list(data.values())
+    if isinstance(data, (tuple, list)):
+        for item in data:
+            shape = _shape(item)
+            if shape != (None, None):
+                return shape
+    return None, None
+
+
+class StageRecord:
+    """单个处理阶段的计时、数据规模和内存记录"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.wall_s = None
+        self.cpu_s = None
+        self.input_rows = self.input_cols = None
+        self.output_rows = self.output_cols = None
+        self.rss_start_mb = None
+        self.peak_rss_delta_mb = None
+        self.profile_path = None
+        self._peak_bytes = 0
+
+    def set_input(self, data) -> None:
+        """记录输入数据的行列数"""
+        self.input_rows, self.input_cols = _shape(data)
+
+    def set_output(self, data) -> None:
+        """记录输出数据的行列数"""
+        self.output_rows, self.output_cols = _shape(data)
+
+    def to_dict(self) -> dict:
+        return {k: v for k, v in self.__dict__.items() if not k.startswith('_')}
+
+
+class _NullRecord:
+    """未启用运行报告时使用的空记录"""
+
+    def set_input(self, data) -> None:
+        pass
+
+    def set_output(self, data) -> None:
+        pass
+
+
+class RunReport:
+    """
+    一次运行的阶段报告，作为上下文管理器启用后，stage()/instrumented() 记录到本报告
+
+    参数:
+        profile_dir: 指定时每个阶段额外保存 cProfile 结果（<阶段名>.prof）
+    """
+
+    def __init__(self, profile_dir: str = None):
+        self.profile_dir = profile_dir
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.stages = []
+        self.extra = {}
+        self._local = threading.local()  # 各线程（流水线中并发的步骤）分别维护阶段嵌套栈
+        self._profiler_lock = threading.Lock()  # 同一时刻只能有一个分析器生效
+        self._previous = None
+        self._start = time.perf_counter()
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+
+    @property
+    def _stack(self) -> list:
+        """当前线程的阶段栈"""
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def activate(self) -> 'RunReport':
+        """设为当前生效的运行报告"""
+        global _active_report
+        self._previous, _active_report = _active_report, self
+        return self
+
+    def __enter__(self) -> 'RunReport':
+        return self.activate()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        global _active_report
+        _active_report = self._previous
+
+    def to_dict(self) -> dict:
+        return {
+            'started_at': self.started_at,
+            'total_wall_s': round(time.perf_counter() - self._start, 4),
+            'peak_rss_mb': round(peak_rss() / 1024 / 1024, 1),
+            'python': sys.version.split()[0],
+            'pandas': pd.__version__,
+            **self.extra,
+            'stages': [record.to_dict() for record in self.stages],
+        }
+
+    def save(self, path: str) -> None:
+        """保存为 JSON"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        print(f"运行报告已保存到 {path}")
+
+
+@contextmanager
+def stage(name: str, data=None):
+    """
+    记录一个处理阶段：耗时、CPU 时间、输入/输出行列数、峰值内存增量（定时采样，见 _RssSampler），可选 cProfile
+
+    用法:
+        with stage('透视', processed_data) as st:
+            result = ...
+            st.set_output(result)
+
+    参数:
+        name: 阶段名称
+        data: 可选的输入数据，用于记录输入行列数
+    """
+    report = _active_report
+    if report is None:
+        yield _NullRecord()
+        return
+
+    record = StageRecord(name)
+    record.set_input(data)
+    report.stages.append(record)
+    stage_index = len(report.stages)
+    report._stack.append(record)
+    rss_start = current_rss()
+    record.rss_start_mb = round(rss_start / 1024 / 1024, 1)
+    record._peak_bytes = rss_start
+    _rss_sampler.add(record)
+    # 仅对最外层阶段做 cProfile；多个线程同时处于最外层阶段时只分析先开始的一个
+    profiler = None
+    if report.profile_dir and len(report._stack) == 1 and report._profiler_lock.acquire(blocking=False):
+        profiler = cProfile.Profile()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    if profiler:
+        profiler.enable()
+    try:
+        yield record
+    finally:
+        if profiler:
+            profiler.disable()
+            report._profiler_lock.release()
+        record.wall_s = round(time.perf_counter() - wall_start, 4)
+        record.cpu_s = round(time.process_time() - cpu_start, 4)
+        _rss_sampler.remove(record)
+        record._peak_bytes = max(record._peak_bytes, current_rss())
+        record.peak_rss_delta_mb = round(max(record._peak_bytes - rss_start, 0) / 1024 / 1024, 1)
+        report._stack.pop()
+        if profiler:
+            safe_name = ''.join(c if c.isalnum() else '_' for c in name)
+            record.profile_path = os.path.join(report.profile_dir, f"{stage_index:02d}_{safe_name}.prof")
+            profiler.dump_stats(record.profile_path)
+
+
+def instrumented(name: str):
+    """
+    装饰器：将函数调用记录为一个阶段，输入取第一个 DataFrame 参数，输出取返回值
+
+    参数:
+        name: 阶段名称
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            inputs = next((a for a in args if isinstance(a, pd.DataFrame)), None)
+            with stage(name, inputs) as record:
+                result = func(*args, **kwargs)
+                record.set_output(result)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+
+DICTIONARY_KEYS = ['查询时段', '门店编号']  # 按字典编码的字符串键（日期按天数编码）
+
+
+def _as_yyyymmdd(dates) -> np.ndarray:
+    """日期（整数/数字字符串/浮点）转为 YYYYMMDD 整数数组"""
+    values = np.asarray(dates)
+    if values.dtype.kind not in 'iu':
+        values = pd.to_numeric(pd.Series(values.ravel())).to_numpy().reshape(values.shape)
+    return values.astype(np.int64)
+
+
+def day_ordinals(dates) -> np.ndarray:
+    """
+    YYYYMMDD 日期转为自 1970-01-01 起的天数（纯整数运算，不经过字符串或 datetime 解析）
+
+    参数:
+        dates: YYYYMMDD 日期（整数或数字字符串）
+
+    返回:
+        np.ndarray: int64 天数
+    """
+    ymd = _as_yyyymmdd(dates)
+    year, month, day = ymd // 10000, ymd // 100 % 100, ymd % 100
+    # 以3月为一年的开始，闰日落在年末（公历 400 年一循环）
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * np.where(month > 2, month - 3, month + 9) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def ordinal_dates(days) -> np.ndarray:
+    """
+    天数转回 YYYYMMDD 整数（day_ordinals 的逆运算）
+
+    参数:
+        days: 自 1970-01-01 起的天数
+
+    返回:
+        np.ndarray: int64 YYYYMMDD 日期
+    """
+    days = np.asarray(days, dtype=np.int64) + 719468
+    era = days // 146097
+    day_of_era = days - era * 146097
+    year_of_era = (day_of_era - day_of_era // 1460 + day_of_era // 36524 - day_of_era // 146096) // 365
+    day_of_year = day_of_era - (365 * year_of_era + year_of_era // 4 - year_of_era // 100)
+    shifted_month = (5 * day_of_year + 2) // 153
+    day = day_of_year - (153 * shifted_month + 2) // 5 + 1
+    month = np.where(shifted_month < 10, shifted_month + 3, shifted_month - 9)
+    year = year_of_era + era * 400 + (month <= 2)
+    return year * 10000 + month * 100 + day
+
+
+def key_codes(values) -> tuple[np.ndarray, np.ndarray]:
+    """
+    取字符串键的整数编码：已编码（分类类型）的列直接复用编码，否则按排序后的取值分解
+
+    与 pd.factorize(sort=True) 结果一致：字典只保留实际出现的取值（筛选/分片后的数据
+    仍带有完整字典，按出现次数压缩编码，不重新哈希字符串）。
+
+    参数:
+        values: 键列（Series）
+
+    返回:
+        (int64 编码，缺失为 -1, 已排序的取值字典)
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype) and values.cat.categories.is_monotonic_increasing:
+        codes = values.cat.codes.to_numpy(dtype=np.int64)
+        categories = np.asarray(values.cat.categories, dtype=object)
+        used = np.bincount(codes[codes >= 0], minlength=len(categories)) > 0
+        if not used.all():
+            remap = np.cumsum(used) - 1
+            codes = np.where(codes >= 0, remap[codes], -1)
+            categories = categories[used]
+        return codes, categories
+    codes, uniques = pd.factorize(values, sort=True)
+    return codes.astype(np.int64), np.asarray(uniques, dtype=object)
+
+
+def decode_key_column(values: pd.Series) -> pd.Series:
+    """输出前将已编码的键列还原为原始取值类型"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.astype(values.cat.categories.dtype)
+    return values
+
+
+def _dictionary(columns: list) -> pd.Index:
+    """合并多列的去重取值并排序（分类列只取其字典）"""
+    uniques = [col.cat.categories if isinstance(col.dtype, pd.CategoricalDtype) else pd.Index(col.unique())
+               for col in columns]
+    merged = uniques[0].append(uniques[1:]) if len(uniques) > 1 else uniques[0]
+    return merged.dropna().unique().sort_values()
+
+
+def _lookup(dictionary: pd.Index, values) -> np.ndarray:
+    """取值在字典中的下标（不在字典中或缺失为 -1）；分类列只查找其类别表再按编码取出"""
+    if isinstance(getattr(values, 'dtype', None), pd.CategoricalDtype):
+        values = pd.Categorical(values)
+        positions = np.append(dictionary.get_indexer(values.categories), -1).astype(np.int64)
+        return positions[values.codes]  # 缺失的编码 -1 取到末尾追加的 -1
+    return dictionary.get_indexer(values).astype(np.int64)
+
+
+class KeyEncoder:
+    """
+    日度数据行键 (查询时段, 门店编号, 日期) 的整数编码，在载入时建立一次
+
+    查询时段和门店编号按排序后的字典编码为下标（编码顺序与字符串顺序一致），日期编码为相对首日的天数；
+    三者组合为一个 int64 键，连接/查找只比较整数；数据中的键列保存为分类类型（整数编码 + 字典），输出时再解码。
+
+    属性:
+        periods: 查询时段字典（已排序）
+        stores: 门店编号字典（已排序）
+        first_day: 日期轴起点（自 1970-01-01 起的天数）
+        n_days: 日期轴长度
+    """
+
+    def __init__(self, periods: pd.Index, stores: pd.Index, first_day: int, n_days: int):
+        self.periods = periods
+        self.stores = stores
+        self.first_day = first_day
+        self.n_days = n_days
+
+    @classmethod
+    def from_frames(cls, *frames: pd.DataFrame) -> 'KeyEncoder':
+        """
+        由一张或多张日度数据表（如主数据和补录数据）的键列建立字典
+
+        参数:
+            frames: 含 查询时段/门店编号/日期 列的 DataFrame
+
+        返回:
+            KeyEncoder: 编码器
+        """
+        periods, stores = (_dictionary([frame[col] for frame in frames]) for col in DICTIONARY_KEYS)
+        days = [day_ordinals(frame['日期']) for frame in frames if len(frame)]
+        if days:
+            first_day = int(min(d.min() for d in days))
+            n_days = int(max(d.max() for d in days)) - first_day + 1
+        else:
+            first_day, n_days = 0, 0
+        return cls(periods, stores, first_day, n_days)
+
+    def encode_periods(self, values) -> np.ndarray:
+        """查询时段编码（不在字典中为 -1）"""
+        return _lookup(self.periods, values)
+
+    def encode_stores(self, values) -> np.ndarray:
+        """门店编号编码（不在字典中为 -1）"""
+        return _lookup(self.stores, values)
+
+    def encode_days(self, values) -> np.ndarray:
+        """日期编码为相对首日的天数（超出日期轴为 -1）"""
+        days = day_ordinals(values) - self.first_day
+        return np.where((days >= 0) & (days < self.n_days), days, -1)
+
+    def encode(self, frame: pd.DataFrame) -> np.ndarray:
+        """
+        将行键组合为一个 int64 键，整数大小顺序与 (查询时段, 门店编号, 日期) 的排序一致
+
+        参数:
+            frame: 含 查询时段/门店编号/日期 列的 DataFrame
+
+        返回:
+            np.ndarray: 与行对齐的 int64 键，任一部分不在字典中时为 -1
+        """
+        periods = self.encode_periods(frame['查询时段'])
+        stores = self.encode_stores(frame['门店编号'])
+        days = self.encode_days(frame['日期'])
+        keys = (periods * len(self.stores) + stores) * self.n_days + days
+        return np.where((periods >= 0) & (stores >= 0) & (days >= 0), keys, -1)
+
+    def categorize(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """
+        原地将 查询时段/门店编号 转为以编码器字典为类别的分类类型（整数编码 + 一份字典）
+
+        参数:
+            frame: 日度数据（原地修改）
+
+        返回:
+            pd.DataFrame: 同一个 frame
+        """
+        for col, dictionary in zip(DICTIONARY_KEYS, (self.periods, self.stores)):
+            series = frame[col]
+            if not (isinstance(series.dtype, pd.CategoricalDtype) and series.cat.categories.equals(dictionary)):
+                frame[col] = pd.Categorical(series, categories=dictionary)
+        return frame
+
+
+def encode_keys(daily_data: pd.DataFrame) -> pd.DataFrame:
+    """
+    载入时对日度数据的字符串键做一次字典编码（原地），后续分组/连接/透视直接使用整数编码
+
+    参数:
+        daily_data: 清洗后的日度销售数据
+
+    返回:
+        pd.DataFrame: 同一个 daily_data
+    """
+    if daily_data.empty:
+        return daily_data
+    return KeyEncoder.from_frames(daily_data).categorize(daily_data)
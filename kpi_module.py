@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+import ast
+import itertools
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from instrument_module import instrumented
+
+# ---------------------- 派生指标定义 ----------------------
+# name: 输出列名（可含 {变量} 模板）
+# expr: 表达式，列名直接作为变量使用，可含 {变量} 模板
+# var:  可选，供后续表达式引用的变量名（输出列名不是合法标识符时使用）；展开为多个组合时须含 {变量} 模板，按组合分别绑定
+# for:  可选，模板变量取值；字符串表示从上下文中取列表（如 priority_order）
+# 模板展开后的所有列在一次数组运算中完成计算，不逐行、不逐列循环
+YOY_KPIS = [
+    {'name': '{period}_{channel}_动销门店', 'expr': 'int({period}_{channel}_流水 > 0)',
+     'for': {'period': ['本期', '同期'], 'channel': 'priority_order'}},
+    {'name': '汇总_存量', 'expr': "where(本期_汇总_流水 * 同期_汇总_流水 != 0, '是', '否')"},
+    {'name': '同比（%）', 'var': '同比', 'expr': 'ratio(本期_汇总_流水 - 同期_汇总_流水, 同期_汇总_流水)'},
+    {'name': '同比情况', 'expr': "select([同比 > 0, 同比 < 0], ['上升', '下降'], '无变化')"},
+]
+
+
+def _ratio(numerator, denominator):
+    """安全除法：分母为0时返回 NaN"""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator != 0, numerator / denominator, np.nan)
+
+
+FUNCTIONS = {
+    'where': np.where,
+    'select': lambda conditions, choices, default: np.select(
+        np.broadcast_arrays(*conditions), np.broadcast_arrays(*choices), default),
+    'ratio': _ratio,
+    'int': lambda x: np.asarray(x).astype(np.int64),
+    'float': lambda x: np.asarray(x).astype(np.float64),
+    'abs': np.abs,
+}
+
+BINARY_OPS = {
+    ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply,
+    ast.Div: np.divide, ast.BitAnd: np.logical_and, ast.BitOr: np.logical_or,
+}
+COMPARE_OPS = {
+    ast.Gt: np.greater, ast.GtE: np.greater_equal, ast.Lt: np.less,
+    ast.LtE: np.less_equal, ast.Eq: np.equal, ast.NotEq: np.not_equal,
+}
+
+_TEMPLATE_TOKEN = re.compile(r'[\w{}]*\{\w+\}[\w{}]*')
+
+
+def _compile_node(node):
+    """将表达式语法树节点编译为 env -> ndarray 的函数"""
+    if isinstance(node, ast.Expression):
+        return _compile_node(node.body)
+    if isinstance(node, ast.Constant):
+        value = node.value
+        return lambda env: value
+    if isinstance(node, ast.Name):
+        name = node.id
+        return lambda env: env[name]
+    if isinstance(node, ast.List):
+        items = [_compile_node(elt) for elt in node.elts]
+        return lambda env: [item(env) for item in items]
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPS:
+        op, left, right = BINARY_OPS[type(node.op)], _compile_node(node.left), _compile_node(node.right)
+        return lambda env: op(left(env), right(env))
+    if isinstance(node, ast.BoolOp):
+        op = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        values = [_compile_node(v) for v in node.values]
+        return lambda env: op.reduce([v(env) for v in values])
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.Not, ast.Invert)):
+        op = np.negative if isinstance(node.op, ast.USub) else np.logical_not
+        operand = _compile_node(node.operand)
+        return lambda env: op(operand(env))
+    if isinstance(node, ast.Compare) and len(node.ops) == 1 and type(node.ops[0]) in COMPARE_OPS:
+        op, left, right = COMPARE_OPS[type(node.ops[0])], _compile_node(node.left), _compile_node(node.comparators[0])
+        return lambda env: op(left(env), right(env))
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+            and node.func.id in FUNCTIONS and not node.keywords):
+        func = FUNCTIONS[node.func.id]
+        args = [_compile_node(arg) for arg in node.args]
+        return lambda env: func(*[arg(env) for arg in args])
+    raise ValueError(f"派生指标表达式不支持的语法: {ast.dump(node)}")
+
+
+@lru_cache(maxsize=None)
+def compile_expression(expr: str) -> tuple:
+    """
+    编译派生指标表达式（结果缓存，同一表达式只编译一次）
+
+    参数:
+        expr: 表达式字符串，可含 {变量} 模板
+
+    返回:
+        (编译后的函数, 模板占位变量名 → 模板字符串 的元组, 引用的普通列名元组)
+    """
+    templates = {}
+
+    def placeholder(match):
+        key = f"__t{len(templates)}"
+        templates[key] = match.group(0)
+        return key
+
+    tree = ast.parse(_TEMPLATE_TOKEN.sub(placeholder, expr), mode='eval')
+    names = []
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Name) and node.id not in templates
+                and node.id not in FUNCTIONS and node.id not in names):
+            names.append(node.id)
+    return _compile_node(tree), tuple(templates.items()), tuple(names)
+
+
+def _expand(kpi: dict, context: dict) -> list:
+    """展开模板变量的全部取值组合，返回 [{变量: 取值}, ...]"""
+    loops = kpi.get('for', {})
+    names = list(loops)
+    values = [context[v] if isinstance(v, str) else v for v in loops.values()]
+    return [dict(zip(names, combo)) for combo in itertools.product(*values)]
+
+
+@instrumented('派生指标')
+def evaluate_kpis(table: pd.DataFrame, kpis: list, context: dict = None) -> pd.DataFrame:
+    """
+    在聚合宽表上批量计算派生指标，并按定义顺序追加到表尾
+
+    参数:
+        table: 聚合后的宽表（门店编号 + 时段_渠道_指标列）
+        kpis: 派生指标定义列表（见 YOY_KPIS）
+        context: 模板变量取值上下文，如 {'priority_order': [...]}
+
+    返回:
+        pd.DataFrame: 追加派生指标后的宽表
+    """
+    context = context or {}
+    outputs = {}
+    variables = {}
+    n_rows = len(table)
+
+    def lookup(column: str) -> np.ndarray:
+        if column in variables:
+            return variables[column]
+        if column in outputs:
+            return outputs[column]
+        return table[column].to_numpy()
+
+    for kpi in kpis:
+        func, templates, names = compile_expression(kpi['expr'])
+        combos = _expand(kpi, context)
+        # 每个模板变量取出全部组合对应的列，组成 (行数, 组合数) 的矩阵；普通列为 (行数, 1)
+        env = {key: np.column_stack([lookup(template.format(**combo)) for combo in combos])
+               for key, template in templates}
+        env.update({name: lookup(name)[:, None] for name in names})
+
+        result = np.broadcast_to(np.asarray(func(env)), (n_rows, len(combos)))
+        for i, combo in enumerate(combos):
+            outputs[kpi['name'].format(**combo)] = result[:, i]
+        if 'var' in kpi:
+            var_names = [kpi['var'].format(**combo) for combo in combos]
+            if len(set(var_names)) < len(combos):
+                raise ValueError(f"派生指标 {kpi['name']} 展开为 {len(combos)} 个组合，var 须含模板变量以区分各组合"
+                                 f"（如 '{{channel}}_{kpi['var']}'），当前为 {kpi['var']!r}")
+            for i, var_name in enumerate(var_names):
+                variables[var_name] = result[:, i]
+
+    return pd.concat([table, pd.DataFrame(outputs, index=table.index)], axis=1)
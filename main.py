@@ -1,8 +1,16 @@
 import pandas as pd
-import sqlite3
+import os
 import numpy as np
 import sys
+from functools import cached_property
 from cleaning_module import cleaning_sales_data
+from period_module import PERIOD_TYPES, compared_years, identify_period_mapping
+from kpi_module import YOY_KPIS, evaluate_kpis
+from schema_module import ColumnSchema
+from instrument_module import RunReport, instrumented, stage
+from db_module import SQLiteWriter
+from key_module import decode_key_column, key_codes
+from memory_module import restore_money
 import yaml
 
 def read_config(config_file):
@@ -12,7 +20,6 @@ def read_config(config_file):
 
 # ---------------------- 常量定义 ----------------------
 METRICS = ['流水', '实收', '优惠', '订单数']  # 核心统计指标
-PERIOD_TYPES = ['本期', '环比期', '同期']    # 时段类型顺序
 CHANNEL_CATEGORIES = [  # 渠道分类配置
     {'new_prefix': 'pos小程序', 'parts': ['pos', '甜啦啦小程序']},
     {'new_prefix': '美团团购', 'parts': ['美团大众点评团购', '美团大众点评小程序']},
@@ -29,178 +36,199 @@ PRIORITY_ORDER = [  # 指标优先级顺序
 ]
 
 # ---------------------- 核心功能函数 ----------------------
+class SalesDataResult:
+    """
+    process_sales_data 的惰性结果：各输出在首次访问时才计算并缓存，未访问的输出不产生开销；
+    输出之间共用的中间结果（组合渠道后的日度数据、时段映射、日度营业标记、透视表）只计算一次
+
+    用法:
+        result = SalesDataResult(raw_data, CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER)
+        yoy_analysis_df = result.yoy_analysis              # 只做透视和派生指标
+        detail_df = result.current_period_detail           # 复用已计算的组合渠道与营业标记
+
+    属性（惰性）:
+        period_mapping: {原始查询时段: 标准时段类型}
+        period_mapping_df: 时段映射关系DataFrame
+        yoy_analysis: 同比分析结果
+        operating_days: 门店编号 + 各时段各渠道营业天数
+        current_period_detail: 本期日度明细（按日期、门店编号排序）
+    """
+
+    def __init__(self, raw_data: pd.DataFrame, category_config: list, metrics: list,
+                 priority_order: list, kpis: list = None, inplace: bool = False):
+        self.raw_data = raw_data
+        self.category_config = category_config
+        self.metrics = metrics
+        self.priority_order = priority_order
+        self.kpis = kpis
+        self.inplace = inplace
+        self.schema = ColumnSchema.from_config(priority_order, metrics, PERIOD_TYPES, category_config)
+
+    @cached_property
+    def period_mapping(self) -> dict:
+        """自动识别时段类型（本期/环比期/同期）"""
+        period_mapping = identify_period_mapping(self.raw_data)
+        print('查询时段识别成功！')
+        return period_mapping
+
+    @cached_property
+    def period_mapping_df(self) -> pd.DataFrame:
+        """时段映射表"""
+        return pd.DataFrame(
+            list(self.period_mapping.items()),
+            columns=['原始时段', '标准时段']
+        )
+
+    @cached_property
+    def daily_data(self) -> pd.DataFrame:
+        """添加组合渠道列（如pos+小程序合并为pos小程序）、查询时段替换为标准时段类型的日度数据"""
+        period_mapping = self.period_mapping  # 在替换查询时段之前识别
+        processed_data = self.raw_data if self.inplace else self.raw_data.copy()
+        with stage('组合渠道', processed_data):
+            for category in self.category_config:
+                for metric in self.metrics:
+                    source_columns = [f"{part}_{metric}" for part in category['parts']]
+                    processed_data[f"{category['new_prefix']}_{metric}"] = restore_money(
+                        processed_data[source_columns]).sum(axis=1)
+
+        if isinstance(processed_data['查询时段'].dtype, pd.CategoricalDtype):
+            # 载入时已编码为分类类型，只需重命名类别
+            processed_data['查询时段'] = processed_data['查询时段'].cat.rename_categories(period_mapping)
+        else:
+            processed_data['查询时段'] = processed_data['查询时段'].replace(period_mapping)
+        return processed_data
+
+    @cached_property
+    def day_flags(self) -> pd.DataFrame:
+        """各渠道日度营业标记（流水>0），列名为 渠道_营业天数，与日度数据行对齐（不写入日度数据）"""
+        print("计算营业天数...")
+        daily_data = self.daily_data
+        with stage('营业天数', daily_data):
+            flags = {f"{col.split('流水')[0]}营业天数": daily_data[col].to_numpy() > 0
+                     for col in daily_data.columns if '流水' in col}
+            return pd.DataFrame(flags, index=daily_data.index)
+
+    @cached_property
+    def structured_data(self) -> pd.DataFrame:
+        """按门店透视的宽表（此时会丢失日期列，因为日期不是聚合字段）"""
+        # 营业标记只在透视时接入（同名的原始营业天数列被替换），日度数据本身不增加列
+        source = restore_money(self.daily_data).assign(**self.day_flags)
+        with stage('透视', source) as st:
+            pivot_table = source.pivot_table(
+                index=["门店编号"],
+                columns="查询时段",
+                aggfunc="sum"
+            )
+            pivot_table.columns = pivot_table.columns.reorder_levels([1, 0]).map('_'.join)
+            structured_data = pivot_table.reset_index()
+            structured_data['门店编号'] = decode_key_column(structured_data['门店编号'])  # 输出时解码
+            st.set_output(structured_data)
+        return structured_data
+
+    @cached_property
+    def ordered_data(self) -> pd.DataFrame:
+        """按优先级排序列的宽表（通过列名注册表查找，不做子串匹配），缺失值补0"""
+        structured_data = self.structured_data
+        with stage('排序', structured_data) as st:
+            sorted_columns = ['门店编号'] + self.schema.ordered(
+                structured_data.columns, self.priority_order, ['营业天数', '流水', '实收', '优惠', '订单数'], PERIOD_TYPES
+            )
+            # 添加未匹配的其他列（按列名最后一段排除营业天数和日期）
+            sorted_set = set(sorted_columns)
+            sorted_columns += [col for col in structured_data.columns
+                               if col not in sorted_set
+                               and col.rpartition('_')[2] not in ('营业天数', '日期')]
+            ordered_data = structured_data[sorted_columns].fillna(0)
+            st.set_output(ordered_data)
+        return ordered_data
+
+    @cached_property
+    def yoy_analysis(self) -> pd.DataFrame:
+        """同比分析结果（基于聚合后的透视表数据，不含环比期）"""
+        ordered_data = self.ordered_data
+        yoy_columns = [col for col in ordered_data.columns if col.partition('_')[0] != '环比期']
+        yoy_analysis = ordered_data[yoy_columns]
+
+        # 计算动销门店、存量状态、同比增长率等派生指标（批量向量化计算）
+        yoy_analysis = evaluate_kpis(yoy_analysis, self.kpis or YOY_KPIS, {'priority_order': self.priority_order})
+
+        # 过滤优惠相关列（根据业务需求）
+        yoy_analysis = yoy_analysis.drop(columns=self.schema.select(yoy_analysis.columns, metric='优惠'))
+        return yoy_analysis.reset_index(drop=True)
+
+    @cached_property
+    def operating_days(self) -> pd.DataFrame:
+        """各门店各时段各渠道的营业天数"""
+        ordered_data = self.ordered_data
+        return ordered_data[['门店编号'] + self.schema.select(ordered_data.columns, metric='营业天数')]
+
+    @cached_property
+    def current_period_detail(self) -> pd.DataFrame:
+        """本期日度明细：门店编号、日期、按优先级排序的指标列和各渠道营业标记，按日期、门店编号排序"""
+        daily_data = self.daily_data
+        is_current = (daily_data['查询时段'] == '本期').to_numpy()
+        current_period_data = daily_data[is_current].assign(**self.day_flags[is_current].astype(int))
+
+        # 当前时段有效指标（排除营业天数，因为明细数据中营业天数是每行计算的，非聚合结果）
+        current_metrics = [m for m in self.metrics if m != '营业天数']
+        basic_cols = [col for col in ['门店编号', '日期'] if col in current_period_data.columns]
+        metric_cols = self.schema.ordered(current_period_data.columns, self.priority_order, current_metrics, [None])
+        known_cols = set(basic_cols + metric_cols + ['查询时段'])
+        current_sorted_cols = basic_cols + metric_cols + [col for col in current_period_data.columns
+                                                          if col not in known_cols]
+        current_period_ordered = current_period_data[current_sorted_cols].fillna(0)
+        return current_period_ordered.sort_values(
+            by=['日期', '门店编号'],
+            ascending=[True, True]
+        )
+
+
 def process_sales_data(raw_data: pd.DataFrame, category_config: list, 
-                      metrics: list, priority_order: list) -> tuple[pd.DataFrame, pd.DataFrame]:
-    #global processed_data
+                      metrics: list, priority_order: list,
+                      kpis: list = None, inplace: bool = False) -> tuple[pd.DataFrame, pd.DataFrame]:
     """
-    处理原始销售数据，生成同比分析结果和时段映射表
+    处理原始销售数据，生成同比分析结果和时段映射表（只计算这两项输出，本期日度明细等见 SalesDataResult）
     
     参数:
         raw_data: 原始销售数据DataFrame
         category_config: 渠道分类配置（包含新前缀和组成部分）
         metrics: 需要统计的核心指标列表
         priority_order: 指标优先级排序
+        kpis: 派生指标定义列表，默认为 YOY_KPIS
+        inplace: 直接在 raw_data 上添加组合渠道列（调用方不再使用 raw_data 时可省去整表复制）
     
     返回:
         (同比分析结果DataFrame, 时段映射关系DataFrame)
     """
     print("开始处理原始数据...")
-    processed_data = raw_data.copy()
-
-    # 步骤1：创建组合指标（如pos+小程序合并为pos小程序）
-    for category in category_config:
-        for metric in metrics:
-            source_columns = [f"{part}_{metric}" for part in category['parts']]
-            processed_data[f"{category['new_prefix']}_{metric}"] = processed_data[source_columns].sum(axis=1)
+    result = SalesDataResult(raw_data, category_config, metrics, priority_order, kpis, inplace)
+    yoy_analysis = result.yoy_analysis
+    print("数据处理完成！")
+    return yoy_analysis, result.period_mapping_df
 
-    # 步骤2：计算各渠道营业天数（流水>0的天数）
-    def calculate_operating_days(data: pd.DataFrame) -> None:
-        """计算每个渠道的营业天数"""
-        print("计算营业天数...")
-        for col in data.columns:
-            if '流水' in col:
-                channel = col.split('流水')[0]
-                operating_days_col = f"{channel}营业天数"
-                data[operating_days_col] = (data[col] > 0).astype(int)
-    calculate_operating_days(processed_data)
-
-    # 步骤3：自动识别时段类型（本期/环比期/同期）
-    def identify_period_mapping(data: pd.DataFrame) -> dict:
-       
-        """识别查询时段与标准时段类型的映射关系"""
-        print("自动识别查询时段...")
-        unique_periods = data['查询时段'].unique()
-        period_list = []
-        for period in unique_periods:
-            start, end = period.split('~')
-            period_list.append((period, int(start), int(end)))
-        
-        # 按开始日期倒序排序（最新为本期）
-        period_list.sort(key=lambda x: x[1], reverse=True)
-        
-        if len(period_list) == 3:
-            return {
-                period_list[0][0]: '本期',
-                period_list[1][0]: '环比期',
-                period_list[2][0]: '同期'
-            }
-        return {  # 兼容2个时段的情况
-            period_list[0][0]: '本期',
-            period_list[1][0]: '同期'
-        }
-
-    period_mapping = identify_period_mapping(processed_data)
-    print('查询时段识别成功！')
-    processed_data['查询时段'] = processed_data['查询时段'].replace(period_mapping)
-
-    # 步骤4：创建透视表并整理列名（此时会丢失日期列，因为日期不是聚合字段）
-    pivot_table = processed_data.pivot_table(
-        index=["门店编号"],
-        columns="查询时段",
-        aggfunc="sum"
-    )
-    pivot_table.columns = pivot_table.columns.reorder_levels([1, 0]).map('_'.join)
-    structured_data = pivot_table.reset_index()
-
-    # 步骤5：按优先级排序列
-    def sort_columns(data: pd.DataFrame, priority: list, periods: list, metrics: list) -> list:
-        """根据优先级规则生成排序后的列名列表"""
-        sorted_cols = []
-        for p in priority:
-            for m in metrics:
-                for period in periods:
-                    col_pattern = f"{period}_{p}_{m}"
-                    sorted_cols.extend([col for col in data.columns if col_pattern in col])
-        
-        # 过滤无效列并调整顺序
-        sorted_cols = [col for col in sorted_cols if "日期" not in col]
-        if '门店编号' in data.columns:
-            sorted_cols.insert(0, '门店编号')
-        
-        # 添加未匹配的其他列
-        other_cols = [col for col in data.columns 
-                     if col not in sorted_cols 
-                     and "营业天数" not in col 
-                     and "日期" not in col]
-        sorted_cols.extend(other_cols)
-        return sorted_cols
-
-    sorted_columns = sort_columns(structured_data, priority_order, PERIOD_TYPES, ['营业天数', '流水', '实收', '优惠', '订单数'])
-    ordered_data = structured_data[sorted_columns].fillna(0)
-
-    # 步骤6：处理本期数据子集（关键修复：从透视表前的原始处理数据获取，保留日期列）
-    current_period_data = processed_data[processed_data['查询时段'] == '本期']  # 这里包含原始日期列
-    
-    def get_current_period_sorted_columns(data: pd.DataFrame, priority_order: list, metrics: list) -> list:
-        """获取当前时段（本期）排序后的列名（处理明细数据，包含日期列）"""
-        sorted_cols = []
-        # 基础列（确保日期和门店编号在前列）
-        basic_cols = []
-        if '日期' in data.columns:
-            basic_cols.append('日期')
-        if '门店编号' in data.columns:
-            basic_cols.insert(0, '门店编号')
-        
-        # 按优先级添加业务指标（排除营业天数，因为当前是明细数据非聚合结果）
-        for priority in priority_order:
-            for metric in metrics:
-                if metric == '营业天数':
-                    continue  # 营业天数在透视表中计算，明细数据不需要
-                column_pattern = f"{priority}_{metric}"
-                matching_columns = [col for col in data.columns if column_pattern in col]
-                sorted_cols.extend(matching_columns)
-        
-        # 组合所有列（基础列+业务指标+其他列）
-        other_columns = [col for col in data.columns 
-                       if col not in basic_cols + sorted_cols 
-                       and col != '查询时段']  # 排除已处理的查询时段列
-        return basic_cols + sorted_cols + other_columns
-
-    # 当前时段有效指标（排除营业天数，因为明细数据中营业天数是每行计算的，非聚合结果）
-    current_metrics = [m for m in metrics if m != '营业天数']
-    current_sorted_cols = get_current_period_sorted_columns(current_period_data, priority_order, current_metrics)
-    current_period_ordered = current_period_data[current_sorted_cols].fillna(0)
-    current_period_ordered = current_period_ordered.sort_values(
-        by=['日期', '门店编号'], 
-        ascending=[True, True]
-    )
-
-    # 步骤7：生成同比分析结果（基于聚合后的透视表数据）
-    yoy_columns = [col for col in ordered_data.columns if "环比期" not in col]
-    yoy_analysis = ordered_data[yoy_columns].copy()
-
-    # 计算动销门店和存量状态
-    for period in ['本期', '同期']:
-        for channel in priority_order:
-            yoy_analysis[f'{period}_{channel}_动销门店'] = yoy_analysis[f'{period}_{channel}_流水'].apply(lambda x: 1 if x > 0 else 0)
-
-    yoy_analysis["汇总_存量"] = yoy_analysis.apply(
-        lambda row: "是" if row["本期_汇总_流水"] * row["同期_汇总_流水"] != 0 else "否", axis=1
-    )
-
-    # 计算同比增长率
-    yoy_analysis["同比（%）"] = np.where(
-        yoy_analysis["同期_汇总_流水"] != 0,
-        (yoy_analysis["本期_汇总_流水"] - yoy_analysis["同期_汇总_流水"]) / yoy_analysis["同期_汇总_流水"],
-        np.nan
-    )
-    yoy_analysis["同比情况"] = yoy_analysis["同比（%）"].apply(
-        lambda x: "上升" if x > 0 else ("下降" if x < 0 else "无变化")
-    )
-
-    # 过滤优惠相关列（根据业务需求）
-    yoy_analysis = yoy_analysis.loc[:, ~yoy_analysis.columns.str.contains('优惠')]
-
-    # 生成时段映射表
-    period_mapping_df = pd.DataFrame(
-        list(period_mapping.items()), 
-        columns=['原始时段', '标准时段']
-    )
+def result_tables(yoy_result, period_mapping_df: pd.DataFrame, name: str = None,
+                  drop_columns: list = None) -> dict:
+    """
+    将同比计算的返回值整理为 {结果表名: DataFrame}（流水线中各步骤按表名交接结果）
 
-    print("数据处理完成！")
-    return yoy_analysis.reset_index(drop=True), period_mapping_df
+    参数:
+        yoy_result: 各引擎返回的 {视图名称: 同比结果}，或单个视图的同比结果（此时需指定 name）
+        period_mapping_df: 时段映射表，作为"期数"表
+        name: yoy_result 为单个 DataFrame 时的表名
+        drop_columns: 需去掉的辅助列（不存在时忽略）
 
-def save_to_sqlite_db(data: pd.DataFrame, table_name: str, db_path: str) -> None:
+    返回:
+        dict: {表名: DataFrame}
+    """
+    views = yoy_result if name is None else {name: yoy_result}
+    if drop_columns:
+        views = {view: data.drop(columns=drop_columns, errors='ignore') for view, data in views.items()}
+    for view in views:
+        print(f"完成{view}分析...")
+    return {**views, '期数': period_mapping_df}
+
+def save_to_sqlite_db(data: pd.DataFrame, table_name: str, db_path: str,
+                      writer: SQLiteWriter = None, mode: str = 'replace') -> None:
     """
     将数据保存到SQLite数据库
     
@@ -208,15 +236,56 @@ def save_to_sqlite_db(data: pd.DataFrame, table_name: str, db_path: str) -> None
         data: 待保存的DataFrame
         table_name: 数据库表名
         db_path: 数据库文件路径
+        writer: 复用的写入器（多张表共用一个连接），未指定时临时打开
+        mode: 'replace' 全量重建 / 'upsert' 仅改写数值变化的门店
     """
     print(f"开始保存数据到数据库表 {table_name}...")
-    with sqlite3.connect(db_path) as conn: 
-        data.to_sql(table_name, conn, if_exists='replace', index=False)
-    print(f"数据已成功保存到数据库表 {table_name}.")
+    if writer is None:
+        with SQLiteWriter(db_path) as temp_writer:
+            stats = temp_writer.write(data, table_name, mode=mode)
+    else:
+        stats = writer.write(data, table_name, mode=mode)
+    print(f"数据已成功保存到数据库表 {table_name}（新增 {stats['inserted']}，更新 {stats['updated']}，"
+          f"删除 {stats['deleted']}，未变 {stats['unchanged']}）.")
+
+@instrumented('存量掩码')
+def monthly_valid_store_mask(daily_data: pd.DataFrame, years: tuple = None) -> np.ndarray:
+    """
+    判断每行日度数据是否属于在同期年份和本期年份同月均有有效营业额的门店-月份
 
+    参数:
+        daily_data: 原始日度销售数据
+        years: (同期年份, 本期年份)，默认从查询时段映射中识别
+
+    返回:
+        与 daily_data 行对齐的布尔数组（True 表示存量门店-月份）
+    """
+    if years is None:
+        years = compared_years(identify_period_mapping(daily_data))
+    base_year, current_year = years
+
+    # 日期按 YYYYMMDD 整数拆分年月，门店编号取载入时的整数编码
+    dates = pd.to_numeric(daily_data['日期']).to_numpy(dtype=np.int64)
+    year = dates // 10000
+    month = dates // 100 % 100
+    store_codes, stores = key_codes(daily_data['门店编号'])
+    revenue = np.nan_to_num(daily_data['汇总_流水'].to_numpy(dtype=np.float64))
+
+    # 门店 × 月份 × 年份（同期/本期）月总流水矩阵
+    year_index = np.where(year == base_year, 0, np.where(year == current_year, 1, -1))
+    in_scope = (year_index >= 0) & (store_codes >= 0)
+    cells = (store_codes[in_scope] * 12 + (month[in_scope] - 1)) * 2 + year_index[in_scope]
+    monthly_revenue = np.bincount(cells, weights=revenue[in_scope], minlength=len(stores) * 24)
+    monthly_revenue = monthly_revenue.reshape(len(stores), 12, 2)
+
+    # 两年同月流水均大于0的门店-月份为存量，再按行取值
+    valid = (monthly_revenue > 0).all(axis=2)
+    return (store_codes >= 0) & valid[store_codes, month - 1]
+
+@instrumented('存量筛选')
 def filter_monthly_valid_stores(daily_data: pd.DataFrame) -> pd.DataFrame:
     """
-    筛选出在2024和2025年各月均有有效营业额的门店
+    筛选出在同期年份和本期年份各月均有有效营业额的门店
     
     参数:
         daily_data: 原始日度销售数据
@@ -225,43 +294,14 @@ def filter_monthly_valid_stores(daily_data: pd.DataFrame) -> pd.DataFrame:
         筛选后的日度数据（仅包含符合条件的门店记录）
     """
     print("开始处理月度数据...")
-    processed_daily = daily_data.copy()
-    
-    # 日期格式转换与年月提取
-    processed_daily['日期'] = pd.to_datetime(processed_daily['日期'], format='%Y%m%d')
-    processed_daily['年份'] = processed_daily['日期'].dt.year
-    processed_daily['月份'] = processed_daily['日期'].dt.month
-
-    # 计算门店-年月的月总流水
-    monthly_revenue = processed_daily.groupby(['门店编号', '年份', '月份'])['汇总_流水'].sum().reset_index()
-
-    # 筛选2024和2025年均有有效流水的门店-月份组合
-    def is_valid_monthly_store(group: pd.DataFrame) -> bool:
-        """判断门店-月份组合是否在两年均有有效流水"""
-        has_2024 = (group['年份'] == 2024).any()
-        has_2025 = (group['年份'] == 2025).any()
-        if not (has_2024 and has_2025):
-            return False
-        revenue_2024 = group.loc[group['年份'] == 2024, '汇总_流水'].iloc[0] > 0
-        revenue_2025 = group.loc[group['年份'] == 2025, '汇总_流水'].iloc[0] > 0
-        return revenue_2024 and revenue_2025
-
-    valid_monthly_groups = monthly_revenue.groupby(['门店编号', '月份']).filter(is_valid_monthly_store)
-    valid_monthly_groups['是否存量'] = '是'
-
-    # 创建辅助映射列并合并结果
-    valid_monthly_groups['门店_月份'] = valid_monthly_groups['门店编号'] + '_' + valid_monthly_groups['月份'].astype(str)
-    processed_daily['门店_月份'] = processed_daily['门店编号'] + '_' + processed_daily['月份'].astype(str)
-
-    # 左连接保留有效记录
-    mapping = valid_monthly_groups[['门店_月份', '是否存量']].drop_duplicates()
-    processed_daily = processed_daily.merge(mapping, on='门店_月份', how='left')
-    processed_daily['是否存量'] = processed_daily['是否存量'].fillna('否')
-
-    # 筛选并清理数据
-    filtered_daily = processed_daily[processed_daily['是否存量'] == '是']
-    filtered_daily = filtered_daily.drop(columns=['门店_月份', '是否存量'])
-    filtered_daily['日期'] = filtered_daily['日期'].dt.strftime('%Y%m%d')  # 恢复日期格式
+    # take 返回独立的新表，后续添加列不影响 daily_data，无需再复制
+    filtered_daily = daily_data.take(np.flatnonzero(monthly_valid_store_mask(daily_data)))
+
+    # 补充年月列（日期保持 YYYYMMDD 整数，不再转换为字符串）
+    dates = pd.to_numeric(filtered_daily['日期']).astype(np.int64)
+    filtered_daily['年份'] = (dates // 10000).astype(np.int32)
+    filtered_daily['月份'] = (dates // 100 % 100).astype(np.int32)
+    filtered_daily['日期'] = dates
     print("月度数据处理完成！")
     return filtered_daily
 
@@ -271,40 +311,175 @@ if __name__ == "__main__":
     
     config = read_config('config.yaml')
     db_path = config['db_path']
+    # 运行报告：各阶段耗时/行列数/内存保存为数据库旁的 JSON，profile 为真时额外保存每阶段 cProfile
+    report_prefix = os.path.splitext(db_path)[0]
+    run_report = RunReport(f"{report_prefix}_profiles" if config.get('profile') else None).activate()
+    engine = config.get('engine', 'pandas')
+    run_report.extra['engine'] = engine
+    run_report.extra['workers'] = config.get('workers', 1)
     sales_data = config['sales_data_path']
     # 补充链接
     supplemental_data = config['supplemental_data_path']
-    raw_sales_data = cleaning_sales_data(sales_data,supplemental_data)
-    raw_sales_data_copy = raw_sales_data.copy()  # 保留原始数据副本用于月度处理
-
-    # 执行核心处理逻辑
+    # 内存预算：设置后启用低内存模式（键转为分类/整数、金额 float32、计数 int32，按预算分块读取）
+    memory_budget_mb = config.get('memory_budget_mb')
+    low_memory = bool(memory_budget_mb)
+    chunksize = config.get('chunksize')
+    if low_memory and not chunksize:
+        from cleaning_module import sales_columns
+        from memory_module import chunksize_for_budget
+        chunksize = chunksize_for_budget(memory_budget_mb, len(sales_columns()))
+    # 整个运行复用一个数据库连接（SQL 引擎暂存表 + 读取目标表 + 写入四张结果表）
+    writer = SQLiteWriter(db_path, cache_size_mb=config.get('sqlite_cache_mb', 64))
+    query_service = None
+    if config.get('query_service'):
+        # 本地查询服务：先加载数据库中上一次的结果，本次运行结束后整体切换到新结果
+        from query_service import QueryService
+        query_service = QueryService(CHANNEL_CATEGORIES)
+        query_service.start(config.get('query_host', '127.0.0.1'), config.get('query_port', 8765))
+        query_service.publish_from_db(writer)
+    if config.get('watch'):
+        # 监视模式：常驻轮询输入文件，变化后只重算受影响门店并按门店改写结果表（Ctrl+C 退出）
+        from addition import GoalMatrix
+        from watch_module import SalesWatcher
+        watcher = SalesWatcher(
+            writer, sales_data, supplemental_data, CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER,
+            {'同比数据': None, '同比数据(存量)': monthly_valid_store_mask},
+            YOY_KPIS + config.get('extra_kpis', []),
+            GoalMatrix.cached(writer.read_table('goal'), config.get('cache_dir')),
+            ColumnSchema.from_config(PRIORITY_ORDER, METRICS, PERIOD_TYPES, CHANNEL_CATEGORIES),
+            prorate=config.get('goal_prorate', False), write_mode=config.get('write_mode', 'replace'),
+            on_refresh=(lambda: query_service.publish_from_db(writer)) if query_service else None,
+            goal_table='goal', cache_dir=config.get('cache_dir')
+        )
+        watcher.run(config.get('watch_interval', 2))
+        if query_service:
+            query_service.stop()
+        writer.close()
+        run_report.save(f"{report_prefix}_run_report.json")
+        sys.exit(0)
+    if engine == 'sql':
+        raw_sales_data = None  # SQL 引擎分块载入数据库暂存表，不在内存中保留完整日度数据
+    elif config.get('cache_dir'):
+        from cache_module import cached_cleaning_sales_data
+        raw_sales_data = cached_cleaning_sales_data(
+            sales_data, supplemental_data, config['cache_dir'],
+            max_cache_mb=config.get('cache_max_mb', 2048), chunksize=chunksize
+        )
+        if low_memory:
+            from memory_module import downcast_daily_frame
+            downcast_daily_frame(raw_sales_data)
+    else:
+        raw_sales_data = cleaning_sales_data(sales_data,supplemental_data, chunksize=chunksize,
+                                             low_memory=low_memory)
+    if low_memory and engine == 'cube' and raw_sales_data is not None:
+        from memory_module import estimate_cube_bytes, frame_nbytes
+        run_report.extra['daily_data_mb'] = round(frame_nbytes(raw_sales_data) / 1024 / 1024, 1)
+        if estimate_cube_bytes(raw_sales_data) > memory_budget_mb * 1024 * 1024:
+            print(f"预计立方体引擎内存超出预算 {memory_budget_mb}MB，改用 SQL 引擎分块聚合")
+            engine = 'sql'
+    if config.get('daily_store_dir') and raw_sales_data is not None:
+        # 清洗后的日度数据写入本地持久化存储（新日期追加，已有日期原地更正），供历史时段直接读取
+        from daily_store import DailyStore
+        with stage('写入日度存储', raw_sales_data):
+            daily_store = DailyStore.open_or_create(config['daily_store_dir'], raw_sales_data.columns,
+                                                    CHANNEL_CATEGORIES, METRICS)
+            store_stats = daily_store.append(raw_sales_data)
+            daily_store.close()
+        print(f"日度存储已更新：新增 {store_stats['new_days']} 天、{store_stats['new_stores']} 家门店，"
+              f"覆盖已有 {store_stats['patched']} 行")
+    # 派生指标：默认同比指标 + 配置文件中追加的指标
+    kpis = YOY_KPIS + config.get('extra_kpis', [])
+
+    # 执行核心处理逻辑：各步骤按依赖关系组成流水线，互不依赖的步骤并发执行，
+    # 每张结果表一算完就交给后台数据库线程写入（读目标表、写库、SQL 引擎都在该线程上串行执行）
     print("开始执行数据处理...")
-    yoy_analysis_df, period_mapping_df = process_sales_data(
-        raw_sales_data, CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER
-    )
-    print("完成同比数据分析...")
-
-    monthly_filtered_data = filter_monthly_valid_stores(raw_sales_data_copy)
-    print("完成月度数据分析...")
-
-    yoy_cunliang_df, _ = process_sales_data(
-        monthly_filtered_data, CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER
-    )
-    try:
-        columns_to_drop = ['本期_年份','本期_月份','同期_年份','同期_月份']
-        yoy_cunliang_df.drop(columns=list(set(columns_to_drop)), inplace=True)
-    except:
-        pass
-    print("完成同比数据(存量)分析...")
-
-    from addition import calculate_goals
-    with sqlite3.connect(db_path) as conn: 
-        goal_df = pd.read_sql_query("SELECT * FROM goal", conn)
-    additional_goals_df = calculate_goals(yoy_analysis_df, goal_df, period_mapping_df)
-
-    # 保存结果到数据库
-    save_to_sqlite_db(yoy_analysis_df, '同比数据', db_path)
-    save_to_sqlite_db(yoy_cunliang_df, '同比数据(存量)', db_path)
-    save_to_sqlite_db(period_mapping_df, '期数', db_path)   
-    save_to_sqlite_db(additional_goals_df, '目标数据', db_path)   
-    print("所有数据已同步至数据库")
\ No newline at end of file
+    from addition import GoalMatrix, calculate_goals
+    from pipeline_module import Pipeline
+    workers = config.get('workers', 1)
+    write_mode = config.get('write_mode', 'replace')
+    pipeline = Pipeline(config.get('pipeline_workers', 2))
+    pipeline.add('读取目标表', lambda: GoalMatrix.cached(writer.read_table('goal'), config.get('cache_dir')),
+                 io=True)
+    if engine == 'sql':
+        # SQL 下推引擎：透视、组合渠道、营业天数与存量筛选均由 SQLite 的 GROUP BY 完成
+        from cleaning_module import iter_cleaned_chunks
+        from sql_module import monthly_valid_join, process_sales_data_sql
+        if raw_sales_data is None:
+            daily_chunks = iter_cleaned_chunks(sales_data, supplemental_data, chunksize or 200000)
+        else:
+            daily_chunks = (raw_sales_data.iloc[i:i + (chunksize or 200000)]
+                            for i in range(0, len(raw_sales_data), chunksize or 200000))
+        pipeline.add('同比计算', lambda: result_tables(*process_sales_data_sql(
+            writer.conn, daily_chunks,
+            CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER,
+            {'同比数据': None, '同比数据(存量)': monthly_valid_join}, kpis
+        )), io=True)
+        table_sources = dict.fromkeys(['同比数据', '同比数据(存量)', '期数'], '同比计算')
+    elif engine == 'cube' and workers > 1:
+        # 并行模式：按门店编号分片，在进程池中分别计算全部门店与存量门店视图
+        from functools import partial
+        from parallel_module import process_sales_data_parallel
+        period_mapping = identify_period_mapping(raw_sales_data)
+        cunliang_mask = partial(monthly_valid_store_mask, years=compared_years(period_mapping))
+        pipeline.add('同比计算', lambda: result_tables(*process_sales_data_parallel(
+            raw_sales_data, CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER,
+            {'同比数据': None, '同比数据(存量)': cunliang_mask}, kpis,
+            workers=workers, period_mapping=period_mapping
+        )))
+        table_sources = dict.fromkeys(['同比数据', '同比数据(存量)', '期数'], '同比计算')
+    elif engine == 'cube':
+        # 立方体引擎：全部门店与存量门店共用一次组合/聚合，存量以门店-月份掩码作为行权重
+        from channel_cube import process_sales_data_views
+        pipeline.add('同比计算', lambda: result_tables(*process_sales_data_views(
+            raw_sales_data, CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER,
+            {'同比数据': None, '同比数据(存量)': monthly_valid_store_mask(raw_sales_data)}, kpis
+        )))
+        table_sources = dict.fromkeys(['同比数据', '同比数据(存量)', '期数'], '同比计算')
+    else:
+        # 先做月度筛选（结果为独立新表），之后两次处理分别在两张表上原地添加列，可以并发执行
+        pipeline.add('月度筛选', lambda: filter_monthly_valid_stores(raw_sales_data))
+        pipeline.add('同比计算', lambda _: result_tables(*process_sales_data(
+            raw_sales_data, CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER, kpis, inplace=True
+        ), name='同比数据'), deps=['月度筛选'])
+        pipeline.add('存量计算', lambda monthly_filtered_data: result_tables(*process_sales_data(
+            monthly_filtered_data, CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER, kpis, inplace=True
+        ), name='同比数据(存量)', drop_columns=['本期_年份', '本期_月份', '同期_年份', '同期_月份']),
+            deps=['月度筛选'])
+        table_sources = {'同比数据': '同比计算', '同比数据(存量)': '存量计算', '期数': '同比计算'}
+
+    schema = ColumnSchema.from_config(PRIORITY_ORDER, METRICS, PERIOD_TYPES, CHANNEL_CATEGORIES)
+    pipeline.add('目标计算', lambda tables, goals: {'目标数据': calculate_goals(
+        tables['同比数据'], goals, tables['期数'], schema, prorate=config.get('goal_prorate', False)
+    )}, deps=[table_sources['同比数据'], '读取目标表'])
+    table_sources['目标数据'] = '目标计算'
+
+    # 保存结果到数据库（后台数据库线程按结果就绪的先后写入）
+    for table_name, source in table_sources.items():
+        pipeline.add(f'写入:{table_name}',
+                     lambda tables, table_name=table_name: save_to_sqlite_db(
+                         tables[table_name], table_name, db_path, writer, write_mode),
+                     deps=[source], io=True)
+    results = pipeline.run()
+    run_report.extra['pipeline'] = pipeline.timeline()
+    yoy_analysis_df, yoy_cunliang_df, period_mapping_df, additional_goals_df = (
+        results[table_sources[name]][name] for name in ['同比数据', '同比数据(存量)', '期数', '目标数据'])
+    writer.close()
+    print("所有数据已同步至数据库")
+    if query_service:
+        query_service.publish_frames(yoy_analysis_df, additional_goals_df)
+
+    export_formats = config.get('export_formats') or []
+    if export_formats:
+        # 直接从内存中的结果表逐批导出，不再从数据库回读
+        from export_module import EXPORT_BATCH_ROWS, export_tables
+        outputs = export_tables(
+            {'同比数据': yoy_analysis_df, '同比数据(存量)': yoy_cunliang_df,
+             '期数': period_mapping_df, '目标数据': additional_goals_df},
+            config.get('export_dir', 'export'), export_formats,
+            batch_rows=config.get('export_batch_rows', EXPORT_BATCH_ROWS)
+        )
+        for fmt, paths in outputs.items():
+            print(f"已导出 {fmt}: {', '.join(paths)}")
+    run_report.save(f"{report_prefix}_run_report.json")
+    if query_service:
+        query_service.serve_until_interrupted()
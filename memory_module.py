@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+CATEGORY_KEYS = ['查询时段', '门店编号']   # 低基数字符串键，转为分类类型（整数编码 + 一份类别表）
+MONEY_METRICS = ['流水', '实收', '优惠']   # 金额指标，降为 float32 后舍入到分能无损还原时才降精度
+COUNT_METRICS = ['订单数', '营业天数']     # 计数指标，全部为整数时降为 int32（缺失视为0）
+MONEY_DECIMALS = 2  # 金额精确到分
+INT32_MAX = np.iinfo(np.int32).max
+
+
+def frame_nbytes(data: pd.DataFrame) -> int:
+    """DataFrame 实际占用的内存（字节，含字符串对象）"""
+    return int(data.memory_usage(index=True, deep=True).sum())
+
+
+def downcast_daily_frame(daily_data: pd.DataFrame) -> pd.DataFrame:
+    """
+    原地压缩日度数据的内存占用：键转为分类/整数，金额在安全时降为 float32，计数降为 int32
+
+    逐列替换，峰值只多出一列的临时空间；已压缩的列保持不变（可重复调用）。
+
+    参数:
+        daily_data (pd.DataFrame): 清洗后的日度销售数据（原地修改）
+
+    返回:
+        pd.DataFrame: 同一个 daily_data
+    """
+    for col in daily_data.columns:
+        series = daily_data[col]
+        metric = str(col).rpartition('_')[2]
+        if col in CATEGORY_KEYS:
+            if not isinstance(series.dtype, pd.CategoricalDtype):
+                daily_data[col] = series.astype('category')
+        elif col == '日期':
+            # YYYYMMDD 整数编码
+            if series.dtype != np.int32 and series.notna().all():
+                dates = pd.to_numeric(series)
+                if dates.max() <= INT32_MAX:
+                    daily_data[col] = dates.astype(np.int32)
+        elif not pd.api.types.is_numeric_dtype(series) or series.dtype in (np.float32, np.int32):
+            continue
+        elif metric in COUNT_METRICS:
+            values = series.fillna(0)
+            if (values % 1 == 0).all() and values.abs().max() <= INT32_MAX:
+                daily_data[col] = values.astype(np.int32)
+        elif metric in MONEY_METRICS:
+            values = series.to_numpy(dtype=np.float64)
+            narrowed = values.astype(np.float32)
+            # float32 本身不能精确表示到分（如 32689.12 存为 32689.12109375），聚合前须经 restore_money 还原
+            restored = np.round(narrowed.astype(np.float64), MONEY_DECIMALS)
+            if np.array_equal(restored, values, equal_nan=True):
+                daily_data[col] = narrowed
+    return daily_data
+
+
+def restore_money(data: pd.DataFrame, columns: list = None) -> pd.DataFrame:
+    """
+    将降为 float32 的金额列还原为 float64 并舍入到分（降精度时已保证可无损还原），供求和等聚合使用；
+    没有 float32 列时原样返回，不复制
+
+    参数:
+        data (pd.DataFrame): 日度数据或其部分列
+        columns (list): 只还原其中的这些列，默认全部列
+
+    返回:
+        pd.DataFrame: 金额列为 float64 的数据（其余列与原数据共用）
+    """
+    narrowed = [col for col in (data.columns if columns is None else columns) if data[col].dtype == np.float32]
+    if not narrowed:
+        return data
+    return data.assign(**{col: np.round(data[col].to_numpy(dtype=np.float64), MONEY_DECIMALS) for col in narrowed})
+
+
+def concat_chunks(chunks: list) -> pd.DataFrame:
+    """
+    拼接数据块并逐块释放：结果各列按总行数预先分配（np.empty 写入前不占物理内存），每复制完一块即释放该块，
+    常驻内存峰值约为结果大小加一个块（pd.concat 时全部块与结果同时存在，峰值翻倍）
+
+    分类键合并类别表并按字典序排列（类别顺序决定门店编号排序，须与字符串排序一致）；
+    同一金额列只在部分块中降为 float32 时，按 restore_money 还原后再写入 float64 结果列。
+
+    参数:
+        chunks (list): 数据块（键列为分类类型或字符串），拼接过程中逐个置为 None
+
+    返回:
+        pd.DataFrame: 拼接结果
+    """
+    columns = list(dict.fromkeys(col for chunk in chunks for col in chunk.columns))
+    n_rows = sum(len(chunk) for chunk in chunks)
+    keys = {col: union_categoricals([chunk[col].astype('category') for chunk in chunks], sort_categories=True)
+            for col in CATEGORY_KEYS if col in columns}
+    numeric, others = {}, {}
+    for col in columns:
+        if col in keys:
+            continue
+        dtypes = [chunk[col].dtype if col in chunk.columns else np.dtype(np.float64) for chunk in chunks]
+        if all(isinstance(dtype, np.dtype) and dtype.kind in 'iuf' for dtype in dtypes):
+            numeric[col] = np.empty(n_rows, dtype=np.result_type(*dtypes))
+        else:
+            others[col] = []
+    start = 0
+    for i, chunk in enumerate(chunks):
+        stop = start + len(chunk)
+        for col, values in numeric.items():
+            if col not in chunk.columns:
+                values[start:stop] = np.nan
+                continue
+            piece = chunk[col].to_numpy()
+            if piece.dtype == np.float32 and values.dtype == np.float64:
+                piece = np.round(piece.astype(np.float64), MONEY_DECIMALS)
+            values[start:stop] = piece
+        for col, pieces in others.items():
+            piece = chunk[col] if col in chunk.columns else pd.Series(np.nan, index=chunk.index)
+            pieces.append(piece.reset_index(drop=True))
+        chunks[i] = None
+        start = stop
+    body = {**numeric, **{col: pd.concat(pieces, ignore_index=True) for col, pieces in others.items()}, **keys}
+    return pd.DataFrame({col: body[col] for col in columns}, copy=False)
+
+
+def chunksize_for_budget(budget_mb: float, n_columns: int, share: float = 0.1) -> int:
+    """
+    按内存预算确定分块读取的行数：单块解析（float64 + 字符串键）不超过预算的 share
+
+    参数:
+        budget_mb (float): 内存预算（MB）
+        n_columns (int): CSV 列数
+        share (float): 单块可占预算的比例
+
+    返回:
+        int: 每块行数
+    """
+    row_bytes = n_columns * 8 + 3 * 64  # 数值列 + 三个字符串键对象
+    return max(int(budget_mb * 1024 * 1024 * share / row_bytes), 10000)
+
+
+def estimate_cube_bytes(daily_data: pd.DataFrame, n_views: int = 2) -> int:
+    """
+    估算立方体引擎处理 daily_data 时的峰值内存：原数据 + float64 日度数组 + 排序副本 + 每个视图一份加权副本
+
+    参数:
+        daily_data (pd.DataFrame): 日度数据
+        n_views (int): 视图个数
+
+    返回:
+        int: 估算字节数
+    """
+    n_numeric = sum(pd.api.types.is_numeric_dtype(dtype) for dtype in daily_data.dtypes)
+    working = len(daily_data) * n_numeric * 8 * (2 + min(n_views, 1))
+    return frame_nbytes(daily_data) + working
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from channel_cube import process_sales_data_views
+from instrument_module import instrumented
+from period_module import identify_period_mapping
+
+
+def partition_by_store(daily_data: pd.DataFrame, n_shards: int) -> list:
+    """
+    按门店编号分片（同一门店的所有行落在同一分片，分片结果与进程无关）；
+    载入时已编码的门店编号直接按整数编码取模，否则按字符串哈希
+
+    参数:
+        daily_data: 清洗后的日度销售数据
+        n_shards: 分片数
+
+    返回:
+        list: 非空分片 DataFrame 列表
+    """
+    stores = daily_data['门店编号']
+    if isinstance(stores.dtype, pd.CategoricalDtype):
+        shard_ids = stores.cat.codes.to_numpy(dtype=np.int64) % n_shards
+    else:
+        store_hash = pd.util.hash_pandas_object(stores, index=False).to_numpy()
+        shard_ids = (store_hash % np.uint64(n_shards)).astype(np.int64)
+    order = np.argsort(shard_ids, kind='stable')
+    bounds = np.searchsorted(shard_ids[order], np.arange(n_shards + 1))
+    return [daily_data.iloc[order[bounds[i]:bounds[i + 1]]]
+            for i in range(n_shards) if bounds[i + 1] > bounds[i]]
+
+
+def _process_shard(shard: pd.DataFrame, category_config: list, metrics: list, priority_order: list,
+                   views: dict, kpis: list, period_mapping: dict) -> dict:
+    """
+    子进程中处理单个分片：按视图函数生成行掩码后计算同比结果
+
+    参数:
+        shard: 分片日度数据
+        category_config: 渠道分类配置
+        metrics: 核心统计指标
+        priority_order: 指标优先级排序
+        views: {视图名称: None 或 掩码函数(分片数据) -> 布尔数组}
+        kpis: 派生指标定义列表
+        period_mapping: 全量数据识别的时段映射
+
+    返回:
+        dict: {视图名称: 分片同比分析结果}
+    """
+    shard_views = {name: None if mask_func is None else mask_func(shard) for name, mask_func in views.items()}
+    results, _ = process_sales_data_views(shard, category_config, metrics, priority_order,
+                                          shard_views, kpis, period_mapping)
+    return results
+
+
+@instrumented('并行同比计算')
+def process_sales_data_parallel(raw_data: pd.DataFrame, category_config: list, metrics: list,
+                                priority_order: list, views: dict, kpis: list = None,
+                                workers: int = None, n_shards: int = None,
+                                period_mapping: dict = None) -> tuple[dict, pd.DataFrame]:
+    """
+    按门店编号分片并在进程池中并行计算各视图的同比结果，输出与串行立方体引擎一致
+
+    时段映射在全量数据上识别一次后传给各分片，保证所有分片输出相同的列；
+    合并时按门店编号排序，结果与进程调度顺序无关。
+
+    参数:
+        raw_data: 清洗后的日度销售数据
+        category_config: 渠道分类配置（包含新前缀和组成部分）
+        metrics: 需要统计的核心指标列表
+        priority_order: 指标优先级排序
+        views: {视图名称: None 或 可序列化的掩码函数(日度数据) -> 布尔数组}
+        kpis: 派生指标定义列表，默认为 YOY_KPIS
+        workers: 进程数，默认为 CPU 核数
+        n_shards: 分片数，默认为进程数的4倍
+        period_mapping: 时段映射，默认在全量数据上识别
+
+    返回:
+        ({视图名称: 同比分析结果DataFrame}, 时段映射关系DataFrame)
+    """
+    workers = workers or os.cpu_count() or 1
+    n_shards = n_shards or workers * 4
+    if period_mapping is None:
+        period_mapping = identify_period_mapping(raw_data)
+        print('查询时段识别成功！')
+
+    shards = partition_by_store(raw_data, n_shards)
+    print(f"数据已按门店分为 {len(shards)} 片，使用 {workers} 个进程并行处理...")
+    args = (category_config, metrics, priority_order, views, kpis, period_mapping)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_process_shard, shard, *args) for shard in shards]
+        shard_results = [future.result() for future in futures]
+
+    results = {}
+    for name in views:
+        # 跳过无门店的分片结果，避免空表参与合并改变列类型
+        frames = [result[name] for result in shard_results if len(result[name])]
+        merged = pd.concat(frames or [shard_results[0][name]], ignore_index=True)
+        results[name] = merged.sort_values('门店编号', kind='stable').reset_index(drop=True)
+
+    period_mapping_df = pd.DataFrame(
+        list(period_mapping.items()),
+        columns=['原始时段', '标准时段']
+    )
+    return results, period_mapping_df
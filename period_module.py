@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+
+PERIOD_TYPES = ['本期', '环比期', '同期']    # 时段类型顺序
+
+
+def identify_period_mapping(data: pd.DataFrame) -> dict:
+    """
+    识别查询时段与标准时段类型的映射关系
+
+    参数:
+        data: 包含"查询时段"列的销售数据
+
+    返回:
+        dict: {原始查询时段: 标准时段类型}
+    """
+    print("自动识别查询时段...")
+    unique_periods = data['查询时段'].unique()
+    period_list = []
+    for period in unique_periods:
+        start, end = period.split('~')
+        period_list.append((period, int(start), int(end)))
+
+    # 按开始日期倒序排序（最新为本期）
+    period_list.sort(key=lambda x: x[1], reverse=True)
+
+    if len(period_list) == 3:
+        return {
+            period_list[0][0]: '本期',
+            period_list[1][0]: '环比期',
+            period_list[2][0]: '同期'
+        }
+    return {  # 兼容2个时段的情况
+        period_list[0][0]: '本期',
+        period_list[1][0]: '同期'
+    }
+
+
+def compared_years(period_mapping: dict) -> tuple[int, int]:
+    """
+    从时段映射中取出同比比较的年份
+
+    参数:
+        period_mapping: {原始查询时段: 标准时段类型}
+
+    返回:
+        (同期年份, 本期年份)，按各时段开始日期的年份
+    """
+    start_years = {std: int(raw.split('~')[0][:4]) for raw, std in period_mapping.items()}
+    return start_years['同期'], start_years['本期']
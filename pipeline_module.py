@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from instrument_module import stage
+
+
+class PipelineTask:
+    """流水线中的一个步骤：函数、依赖的步骤名，以及是否在数据库线程上执行"""
+
+    def __init__(self, name: str, func, deps: list, io: bool):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.io = io
+        self.start_s = None
+        self.end_s = None
+
+
+class Pipeline:
+    """
+    按依赖图调度的流水线：依赖全部完成的步骤立即提交执行，互不依赖的步骤并发运行
+
+    计算步骤在线程池中执行（numpy/pandas 的大块运算和 SQLite 读写都会释放 GIL）；
+    io=True 的步骤（读目标表、写结果表、SQL 引擎）统一交给一个后台数据库线程按就绪顺序串行执行，
+    数据库连接同一时刻只有一个线程使用，某张结果表一算完就开始写库，不必等其他表。
+
+    用法:
+        pipeline = Pipeline(workers=2)
+        pipeline.add('目标', read_goals, io=True)
+        pipeline.add('同比', compute_yoy)
+        pipeline.add('目标数据', calculate_goals, deps=['同比', '目标'])
+        pipeline.add('写入:目标数据', write_goals, deps=['目标数据'], io=True)
+        results = pipeline.run()
+
+    参数:
+        workers: 计算线程数
+    """
+
+    def __init__(self, workers: int = 2):
+        self.workers = max(int(workers), 1)
+        self.tasks = {}
+
+    def add(self, name: str, func, deps: list = (), io: bool = False) -> str:
+        """
+        添加步骤，func 以各依赖步骤的结果（按 deps 顺序）作为位置参数
+
+        参数:
+            name: 步骤名称（唯一）
+            func: 步骤函数
+            deps: 依赖的步骤名称（须已添加）
+            io: 是否在数据库线程上执行
+
+        返回:
+            str: 步骤名称
+        """
+        if name in self.tasks:
+            raise ValueError(f"流水线步骤重复: {name}")
+        missing = [dep for dep in deps if dep not in self.tasks]
+        if missing:
+            raise ValueError(f"步骤 {name} 依赖的步骤尚未添加: {missing}")
+        self.tasks[name] = PipelineTask(name, func, deps, io)
+        return name
+
+    def _execute(self, task: PipelineTask, args: list):
+        task.start_s = time.perf_counter() - self._start
+        try:
+            with stage(f'流水线:{task.name}'):
+                return task.func(*args)
+        finally:
+            task.end_s = time.perf_counter() - self._start
+
+    def run(self) -> dict:
+        """
+        执行全部步骤，任一步骤出错时不再提交新步骤，等待已开始的步骤结束后抛出该异常
+
+        返回:
+            dict: {步骤名称: 结果}
+        """
+        results = {}
+        pending = dict(self.tasks)
+        running = {}
+        self._start = time.perf_counter()
+        error = None
+        with ThreadPoolExecutor(self.workers, thread_name_prefix='pipeline') as compute_pool, \
+                ThreadPoolExecutor(1, thread_name_prefix='pipeline-db') as io_pool:
+            while pending or running:
+                if error is None:
+                    # 按添加顺序提交依赖已满足的步骤（步骤只能依赖先添加的步骤，不会成环）
+                    for name, task in list(pending.items()):
+                        if all(dep in results for dep in task.deps):
+                            pool = io_pool if task.io else compute_pool
+                            future = pool.submit(self._execute, task, [results[dep] for dep in task.deps])
+                            running[future] = name
+                            del pending[name]
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    if future.exception() is not None:
+                        error = error or future.exception()
+                    else:
+                        results[name] = future.result()
+        if error is not None:
+            raise error
+        return results
+
+    def timeline(self) -> dict:
+        """
+        各步骤的开始/结束时间，以及关键路径（依赖链上耗时之和最长的一条）
+
+        返回:
+            dict: {'total_s', 'critical_path_s', 'critical_path', 'tasks': {步骤: {'start_s', 'end_s', 'io'}}}
+        """
+        longest = {}
+        for name, task in self.tasks.items():  # 添加顺序即拓扑顺序
+            duration = (task.end_s or 0.0) - (task.start_s or 0.0)
+            best = max((longest[dep] for dep in task.deps), key=lambda item: item[0], default=(0.0, []))
+            longest[name] = (best[0] + duration, best[1] + [name])
+        critical_s, critical_path = max(longest.values(), key=lambda item: item[0], default=(0.0, []))
+        ends = [task.end_s for task in self.tasks.values() if task.end_s is not None]
+        return {
+            'total_s': round(max(ends, default=0.0), 4),
+            'critical_path_s': round(critical_s, 4),
+            'critical_path': critical_path,
+            'tasks': {name: {'start_s': round(task.start_s or 0.0, 4), 'end_s': round(task.end_s or 0.0, 4),
+                             'io': task.io}
+                      for name, task in self.tasks.items()},
+        }
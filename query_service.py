@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+YOY_TABLE = '同比数据'
+GOAL_TABLE = '目标数据'
+YOY_COLUMN = '同比（%）'
+TOTAL_CHANNEL = '汇总'
+ADDITIVE_METRICS = ('流水', '实收', '订单数')  # 可跨门店直接相加的指标
+STORE_PREFIX_PATTERN = r'^([A-Za-z]*)'  # 门店编号开头的字母部分，如 TLL / ZYD
+
+
+def _column_channel(column: str):
+    """宽表列 "时段_渠道_指标" / "池_渠道_指标" 的渠道部分，非三段式列返回 None"""
+    parts = str(column).split('_')
+    return parts[1] if len(parts) == 3 else None
+
+
+def _json_value(value):
+    """numpy 标量转为 JSON 值，缺失和无穷转为 null"""
+    if isinstance(value, (float, np.floating)):
+        return float(value) if np.isfinite(value) else None
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+def _int_param(params: dict, name: str):
+    """读取整数查询参数，未提供时为 None"""
+    if name not in params:
+        return None
+    try:
+        return int(params[name])
+    except ValueError:
+        raise ValueError(f"参数 {name} 应为整数: {params[name]}") from None
+
+
+class ResultSnapshot:
+    """
+    一次运行结果（同比数据 + 目标数据）的只读列式快照，构造时预先建立查询索引
+
+    数值列保存在一个按列连续的二维数组中，每列为其中的视图；文本列为对象数组。
+    预建索引：门店前缀 → 行号，渠道组 → 列名，每个前缀按 同比（%） 排序的行号，每个前缀的可加指标合计。
+    快照建立后不再修改，发布新快照只替换引用，读取方无需加锁。
+
+    属性:
+        stores: 门店编号
+        columns: {列名: 一维数组}
+        prefix_rows: {门店前缀: 行号数组}（None 为全部门店）
+        yoy_order: {门店前缀: 同比（%） 升序的行号数组（不含缺失）}
+        group_columns: {渠道组: 该组渠道的列名}
+        base_columns: 不属于任何渠道组时返回的列（门店编号、派生指标、汇总渠道、目标）
+        totals: {门店前缀: {可加指标列: 合计}}
+        generation: 快照序号
+        built_at: 建立时间（时间戳）
+    """
+
+    def __init__(self, yoy_df: pd.DataFrame, goal_df: pd.DataFrame, category_config: list,
+                 generation: int = 0):
+        stores = np.asarray(yoy_df['门店编号'], dtype=object)
+        frames = [yoy_df.drop(columns=['门店编号'])]
+        if goal_df is not None and len(goal_df.columns):
+            # 目标数据按门店编号对齐到同比数据的行顺序（没有目标的门店为缺失）
+            goal_values = (goal_df.set_index(pd.Index(np.asarray(goal_df['门店编号'], dtype=object)))
+                           .drop(columns=['门店编号']).reindex(stores))
+            frames.append(goal_values.drop(columns=[col for col in goal_values.columns if col in frames[0]]))
+        data = pd.concat([frame.reset_index(drop=True) for frame in frames], axis=1)
+
+        numeric = [col for col in data.columns if pd.api.types.is_numeric_dtype(data[col].dtype)]
+        values = np.asfortranarray(data[numeric].to_numpy(dtype=np.float64, na_value=np.nan))
+        self.stores = stores
+        numeric_positions = {col: j for j, col in enumerate(numeric)}
+        self.columns = {'门店编号': stores}
+        for col in data.columns:
+            self.columns[col] = (values[:, numeric_positions[col]] if col in numeric_positions
+                                 else np.asarray(data[col], dtype=object))
+        self.generation = generation
+        self.built_at = time.time()
+
+        # 门店前缀索引（如 TLL / ZYD）
+        prefixes = pd.Series(stores, dtype=object).str.extract(STORE_PREFIX_PATTERN, expand=False).fillna('')
+        self.prefix_rows = {None: np.arange(len(stores))}
+        for prefix, rows in pd.Series(np.arange(len(stores))).groupby(prefixes.to_numpy()).groups.items():
+            if prefix:
+                self.prefix_rows[prefix] = np.asarray(rows, dtype=np.int64)
+
+        # 渠道组：组合渠道及其组成渠道的列
+        self.group_columns = {}
+        for category in category_config:
+            channels = {category['new_prefix'], *category['parts']}
+            self.group_columns[category['new_prefix']] = [col for col in self.columns
+                                                          if _column_channel(col) in channels]
+        self.base_columns = [col for col in self.columns if _column_channel(col) in (None, TOTAL_CHANNEL)]
+
+        # 每个前缀按 同比（%） 排序的行号，top-N 只需切片
+        yoy = self.columns.get(YOY_COLUMN)
+        self.yoy_order = {}
+        for prefix, rows in self.prefix_rows.items():
+            if yoy is None:
+                self.yoy_order[prefix] = rows[:0]
+                continue
+            rows = rows[~np.isnan(yoy[rows])]
+            self.yoy_order[prefix] = rows[np.argsort(yoy[rows], kind='stable')]
+
+        # 每个前缀的可加指标合计
+        additive = [j for j, col in enumerate(numeric) if str(col).rpartition('_')[2] in ADDITIVE_METRICS
+                    or str(col).endswith('目标')]
+        self.totals = {prefix: dict(zip([numeric[j] for j in additive],
+                                        np.nansum(values[rows][:, additive], axis=0).tolist()))
+                       for prefix, rows in self.prefix_rows.items()}
+
+    def _check(self, prefix, group) -> None:
+        if prefix not in self.prefix_rows:
+            raise ValueError(f"未知的门店前缀: {prefix}，可选 {[p for p in self.prefix_rows if p]}")
+        if group is not None and group not in self.group_columns:
+            raise ValueError(f"未知的渠道组: {group}，可选 {list(self.group_columns)}")
+
+    def stores_query(self, prefix: str = None, group: str = None, top: int = None,
+                     ascending: bool = False, limit: int = None) -> dict:
+        """
+        按门店前缀/渠道组筛选门店明细，可按 同比（%） 取前 N 名
+
+        参数:
+            prefix: 门店前缀（如 TLL / ZYD），None 为全部门店
+            group: 渠道组（CHANNEL_CATEGORIES 的 new_prefix），None 只返回汇总列
+            top: 按 同比（%） 取前 N 名（不含同比缺失的门店）
+            ascending: 为真时取同比最低的 N 名
+            limit: 不排序时最多返回的行数
+
+        返回:
+            dict: {'generation', 'columns', 'rows'}
+        """
+        self._check(prefix, group)
+        if (top is not None and top < 0) or (limit is not None and limit < 0):
+            raise ValueError("top/limit 不能为负数")
+        if top is not None:
+            order = self.yoy_order[prefix]
+            rows = order[:top] if ascending else order[::-1][:top]
+        else:
+            rows = self.prefix_rows[prefix][:limit]
+        columns = self.base_columns + (self.group_columns[group] if group else [])
+        data = [[_json_value(v) for v in self.columns[col][rows].tolist()] for col in columns]
+        return {'generation': self.generation, 'columns': columns, 'rows': [list(row) for row in zip(*data)]}
+
+    def summary_query(self, prefix: str = None, group: str = None) -> dict:
+        """
+        按门店前缀汇总可加指标（流水/实收/订单数/目标），并由合计重新计算 同比（%）
+
+        参数:
+            prefix: 门店前缀，None 为全部门店
+            group: 渠道组，None 只返回汇总渠道和目标
+
+        返回:
+            dict: {'generation', 'stores', 'totals', '同比（%）'}
+        """
+        self._check(prefix, group)
+        wanted = set(self.base_columns + (self.group_columns[group] if group else []))
+        totals = {col: value for col, value in self.totals[prefix].items() if col in wanted}
+        current, previous = totals.get(f'本期_{TOTAL_CHANNEL}_流水'), totals.get(f'同期_{TOTAL_CHANNEL}_流水')
+        yoy = (current - previous) / previous if current is not None and previous else None
+        return {'generation': self.generation, 'stores': int(len(self.prefix_rows[prefix])),
+                'totals': totals, YOY_COLUMN: yoy}
+
+    def status(self) -> dict:
+        """快照概况"""
+        return {'generation': self.generation, 'built_at': self.built_at, 'stores': int(len(self.stores)),
+                'columns': len(self.columns), 'prefixes': [p for p in self.prefix_rows if p],
+                'groups': list(self.group_columns)}
+
+
+class QueryService:
+    """
+    本地 HTTP/JSON 查询服务，读取内存中最新的结果快照
+
+    写入方在一次运行结束后调用 publish 整体替换快照（只替换一个引用，原子操作）；
+    每个请求开始时取一次当前快照并只读访问，不与写入方争用锁，也不会读到写了一半的结果。
+
+    接口（GET，返回 JSON）:
+        /status                                   快照概况
+        /stores?prefix=TLL&group=线上外卖&top=20   门店明细，top 为按 同比（%） 的前 N 名（order=asc 取后 N 名），
+                                                  不排序时可用 limit 限制行数
+        /summary?prefix=ZYD&group=美团团购          可加指标合计与合计同比
+
+    用法:
+        service = QueryService(CHANNEL_CATEGORIES)
+        service.start('127.0.0.1', 8765)
+        service.publish_frames(yoy_analysis_df, additional_goals_df)
+    """
+
+    def __init__(self, category_config: list):
+        self.category_config = category_config
+        self.snapshot = None
+        self.server = None
+        self._generation = 0
+        self._publish_lock = threading.Lock()  # 只在多个写入方之间串行，读取方不使用
+
+    def publish_frames(self, yoy_df: pd.DataFrame, goal_df: pd.DataFrame = None) -> ResultSnapshot:
+        """由结果表建立新快照并发布（建立期间读取方继续使用旧快照）"""
+        with self._publish_lock:
+            self._generation += 1
+            snapshot = ResultSnapshot(yoy_df, goal_df, self.category_config, self._generation)
+            self.snapshot = snapshot
+        print(f"查询服务已切换到第 {snapshot.generation} 版结果（{len(snapshot.stores)} 家门店）")
+        return snapshot
+
+    def publish_from_db(self, writer) -> ResultSnapshot:
+        """
+        从数据库读取已提交的 同比数据/目标数据 并发布（表不存在时不发布）
+
+        参数:
+            writer: SQLiteWriter
+
+        返回:
+            ResultSnapshot | None: 新快照
+        """
+        try:
+            yoy_df = writer.read_table(YOY_TABLE)
+        except pd.errors.DatabaseError:
+            return None
+        try:
+            goal_df = writer.read_table(GOAL_TABLE)
+        except pd.errors.DatabaseError:
+            goal_df = None
+        return self.publish_frames(yoy_df, goal_df)
+
+    def handle(self, path: str, params: dict) -> tuple[int, dict]:
+        """
+        处理一个查询请求
+
+        参数:
+            path: 请求路径
+            params: 查询参数 {名称: 取值}
+
+        返回:
+            (HTTP 状态码, JSON 对象)
+        """
+        snapshot = self.snapshot
+        if snapshot is None:
+            return 503, {'error': '结果尚未就绪'}
+        try:
+            prefix, group = params.get('prefix'), params.get('group')
+            if path == '/status':
+                return 200, snapshot.status()
+            if path == '/stores':
+                top, limit = _int_param(params, 'top'), _int_param(params, 'limit')
+                return 200, snapshot.stores_query(prefix, group, top, params.get('order') == 'asc', limit)
+            if path == '/summary':
+                return 200, snapshot.summary_query(prefix, group)
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        return 404, {'error': f'未知的接口: {path}'}
+
+    def start(self, host: str = '127.0.0.1', port: int = 8765) -> None:
+        """在后台线程启动 HTTP 服务"""
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+                status, payload = service.handle(url.path, params)
+                body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='query-service', daemon=True).start()
+        print(f"查询服务已启动: http://{host}:{self.server.server_address[1]}")
+
+    def serve_until_interrupted(self) -> None:
+        """阻塞主线程直到 Ctrl+C，随后关闭服务"""
+        print("查询服务运行中（Ctrl+C 退出）")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+        self.stop()
+
+    def stop(self) -> None:
+        """关闭 HTTP 服务"""
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
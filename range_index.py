@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+
+from channel_cube import ChannelCube, build_composition_matrix, identify_base_channels
+from key_module import key_codes
+from kpi_module import evaluate_kpis
+from memory_module import restore_money
+
+RANGE_DECIMALS = 6  # 前缀和相减的浮点误差在此精度下舍去（金额到分、订单数为整数）
+
+
+def _to_yyyymmdd(value) -> int:
+    """日期（'YYYYMMDD'/'YYYY-MM-DD'/Timestamp/整数）转为 YYYYMMDD 整数"""
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return int(pd.Timestamp(value).strftime('%Y%m%d'))
+
+
+def ranges_from_period_mapping(period_mapping: dict) -> list:
+    """
+    将时段映射转换为命名日期区间
+
+    参数:
+        period_mapping: {原始查询时段 'YYYYMMDD~YYYYMMDD': 标准时段类型}
+
+    返回:
+        list: [(标准时段类型, 开始日期, 结束日期), ...]
+    """
+    ranges = []
+    for raw, std in period_mapping.items():
+        start, end = raw.split('~')
+        ranges.append((std, int(start), int(end)))
+    return ranges
+
+
+def rolling_ranges(end_date, windows=(7, 28), prefix: str = '近') -> list:
+    """
+    生成截止到 end_date 的滚动窗口，如 [('近7天', ...), ('近28天', ...)]
+
+    参数:
+        end_date: 窗口结束日期（含）
+        windows: 窗口天数列表
+        prefix: 区间名称前缀
+
+    返回:
+        list: [(名称, 开始日期, 结束日期), ...]
+    """
+    end = pd.Timestamp(str(_to_yyyymmdd(end_date)))
+    return [(f"{prefix}{days}天", _to_yyyymmdd(end - pd.Timedelta(days=days - 1)), _to_yyyymmdd(end))
+            for days in windows]
+
+
+def month_to_date_range(end_date, name: str = '月初至今') -> tuple:
+    """截止到 end_date 的本月累计区间"""
+    end = _to_yyyymmdd(end_date)
+    return name, end // 100 * 100 + 1, end
+
+
+class DailyPrefixIndex:
+    """
+    按门店的日度前缀和索引：任意日期区间的合计只需每个门店两次查找（区间端点前缀和相减）
+
+    基础渠道的指标做前缀和，组合渠道在相减后由组合矩阵得到；营业天数需按日判断组合后的流水>0，
+    因此对全部渠道的日度营业标记做整数前缀和。日期轴只包含数据中出现过的日期。
+
+    属性:
+        stores: 门店编号（已排序）
+        dates: 日期轴（YYYYMMDD 整数，已排序）
+        base_channels / channels / composition: 基础渠道、全部渠道及组合矩阵
+        metrics: 指标列表
+        value_prefix: 形状为 (门店, 日期+1, 基础渠道×指标) 的指标前缀和
+        day_prefix: 形状为 (门店, 日期+1, 渠道) 的营业天数前缀和
+        row_prefix: 形状为 (门店, 日期+1) 的日度记录数前缀和
+    """
+
+    def __init__(self, stores, dates, base_channels, channels, composition, metrics,
+                 value_prefix, day_prefix, row_prefix):
+        self.stores = stores
+        self.dates = dates
+        self.base_channels = base_channels
+        self.channels = channels
+        self.composition = composition
+        self.metrics = metrics
+        self.value_prefix = value_prefix
+        self.day_prefix = day_prefix
+        self.row_prefix = row_prefix
+
+    @classmethod
+    def from_daily(cls, daily_data: pd.DataFrame, category_config: list, metrics: list) -> 'DailyPrefixIndex':
+        """
+        由清洗后的日度数据建立前缀和索引
+
+        不同查询时段导出中重复出现的 (门店编号, 日期) 只保留第一条，避免重叠区间重复累计。
+
+        参数:
+            daily_data: 清洗后的日度销售数据（查询时段/门店编号/日期 + 渠道_指标列）
+            category_config: 渠道分类配置（包含新前缀和组成部分）
+            metrics: 需要统计的核心指标列表
+
+        返回:
+            DailyPrefixIndex: 前缀和索引
+        """
+        daily_data = daily_data.drop_duplicates(subset=['门店编号', '日期'], keep='first')
+        base_channels = identify_base_channels(daily_data.columns, category_config, metrics)
+        channels, composition = build_composition_matrix(base_channels, category_config)
+
+        store_codes, stores = key_codes(daily_data['门店编号'])
+        date_codes, dates = pd.factorize(pd.to_numeric(daily_data['日期']).astype(np.int64), sort=True)
+        n_stores, n_dates = len(stores), len(dates)
+
+        base_columns = [f"{channel}_{metric}" for channel in base_channels for metric in metrics]
+        daily_values = (restore_money(daily_data.reindex(columns=base_columns))
+                        .to_numpy(dtype=np.float64, na_value=0.0))
+        np.nan_to_num(daily_values, copy=False)
+        if '流水' in metrics:
+            revenue = daily_values.reshape(len(daily_data), len(base_channels), len(metrics))[:, :, metrics.index('流水')]
+            daily_flags = (revenue @ composition > 0).astype(np.int64)
+        else:
+            daily_flags = np.zeros((len(daily_data), len(channels)), dtype=np.int64)
+
+        # 第0个日期位置留空，前缀和[:, i] 表示前 i 个日期的合计
+        value_prefix = np.zeros((n_stores, n_dates + 1, len(base_columns)), dtype=np.float64)
+        day_prefix = np.zeros((n_stores, n_dates + 1, len(channels)), dtype=np.int64)
+        row_prefix = np.zeros((n_stores, n_dates + 1), dtype=np.int64)
+        value_prefix[store_codes, date_codes + 1] = daily_values
+        day_prefix[store_codes, date_codes + 1] = daily_flags
+        row_prefix[store_codes, date_codes + 1] = 1
+        np.cumsum(value_prefix, axis=1, out=value_prefix)
+        np.cumsum(day_prefix, axis=1, out=day_prefix)
+        np.cumsum(row_prefix, axis=1, out=row_prefix)
+
+        return cls(np.asarray(stores), np.asarray(dates), base_channels, channels, composition, list(metrics),
+                   value_prefix, day_prefix, row_prefix)
+
+    def range_sums(self, start, end) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        计算 [start, end]（含两端）区间内每个门店的合计
+
+        参数:
+            start: 开始日期
+            end: 结束日期
+
+        返回:
+            (形状为 (门店, 渠道, 指标) 的指标合计, 形状为 (门店, 渠道) 的营业天数, 每个门店是否有记录)
+        """
+        lo = np.searchsorted(self.dates, _to_yyyymmdd(start), side='left')
+        hi = np.searchsorted(self.dates, _to_yyyymmdd(end), side='right')
+        base = (self.value_prefix[:, hi] - self.value_prefix[:, lo]).round(RANGE_DECIMALS)
+        base = base.reshape(len(self.stores), len(self.base_channels), len(self.metrics))
+        values = np.einsum('sbm,bc->scm', base, self.composition)
+        operating_days = self.day_prefix[:, hi] - self.day_prefix[:, lo]
+        has_rows = self.row_prefix[:, hi] > self.row_prefix[:, lo]
+        return values, operating_days, has_rows
+
+    def query_cube(self, ranges: list) -> ChannelCube:
+        """
+        按命名日期区间生成渠道立方体，区间名称作为时段（只保留在任一区间内有记录的门店）
+
+        参数:
+            ranges: [(名称, 开始日期, 结束日期), ...]
+
+        返回:
+            ChannelCube: 时段为各区间名称的渠道立方体
+        """
+        names = [name for name, _, _ in ranges]
+        if len(set(names)) != len(names):
+            raise ValueError(f"日期区间名称重复: {names}")
+        sums = [self.range_sums(start, end) for _, start, end in ranges]
+        values = np.stack([s[0] for s in sums], axis=1)
+        operating_days = np.stack([s[1] for s in sums], axis=1).astype(np.float64)
+        has_rows = np.stack([s[2] for s in sums], axis=1)
+        present = has_rows.any(axis=1)
+        period_mapping = {f"{_to_yyyymmdd(start)}~{_to_yyyymmdd(end)}": name for name, start, end in ranges}
+        return ChannelCube(self.stores[present], names, self.channels, self.metrics,
+                           values[present], operating_days[present], period_mapping, has_rows[present])
+
+    def query_wide(self, ranges: list, priority_order: list, metrics: list = None,
+                   kpis: list = None) -> pd.DataFrame:
+        """
+        按命名日期区间返回与 process_sales_data 相同布局的宽表（门店编号 + 区间名_渠道_指标）
+
+        参数:
+            ranges: [(名称, 开始日期, 结束日期), ...]，如 rolling_ranges/month_to_date_range 的结果
+            priority_order: 指标优先级排序
+            metrics: 输出的指标列表，默认为全部指标
+            kpis: 追加的派生指标定义（模板中的 {period} 可取区间名称）
+
+        返回:
+            pd.DataFrame: 宽表
+        """
+        cube = self.query_cube(ranges)
+        layout = cube.column_layout(priority_order, cube.periods, metrics or self.metrics)
+        wide = cube.to_wide(layout)
+        if kpis:
+            wide = evaluate_kpis(wide, kpis, {'priority_order': priority_order,
+                                              'ranges': [name for name, _, _ in ranges]})
+        return wide
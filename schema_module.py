@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import itertools
+
+from period_module import PERIOD_TYPES
+
+DERIVED_METRICS = ['营业天数', '动销门店']  # 由程序计算的指标（非 SQL 导出字段）
+
+
+class ColumnSchema:
+    """
+    宽表列名注册表：(时段, 渠道, 指标) ⇄ 列名
+
+    列名格式为 "时段_渠道_指标"（聚合宽表）或 "渠道_指标"（日度明细，时段为 None）。
+    所有列名在构造时一次生成，排序、筛选和取列都通过字典查找完成，
+    不再对列名做子串匹配（避免"抖音"误匹配"抖音团购"等情况）。
+    """
+
+    def __init__(self, channels: list, metrics: list, periods: list = None):
+        self.channels = list(channels)
+        self.metrics = list(metrics)
+        self.periods = list(PERIOD_TYPES if periods is None else periods)
+        self._keys = {}
+        for period, channel, metric in itertools.product([None] + self.periods, self.channels, self.metrics):
+            self._keys[self.name(period, channel, metric)] = (period, channel, metric)
+
+    @classmethod
+    def from_config(cls, priority_order: list, metrics: list, period_types: list = None,
+                    category_config: list = None) -> 'ColumnSchema':
+        """
+        由渠道/指标配置生成注册表
+
+        参数:
+            priority_order: 指标优先级排序（决定渠道顺序）
+            metrics: 核心统计指标
+            period_types: 时段类型，默认 PERIOD_TYPES
+            category_config: 渠道分类配置，其组成渠道追加在优先级渠道之后
+
+        返回:
+            ColumnSchema: 列名注册表
+        """
+        channels = list(priority_order)
+        for category in category_config or []:
+            for channel in [category['new_prefix']] + category['parts']:
+                if channel not in channels:
+                    channels.append(channel)
+        all_metrics = [DERIVED_METRICS[0]] + [m for m in metrics if m not in DERIVED_METRICS] + DERIVED_METRICS[1:]
+        return cls(channels, all_metrics, period_types)
+
+    @classmethod
+    def from_columns(cls, columns, period_types: list = None) -> 'ColumnSchema':
+        """
+        从现有宽表列名推断注册表（无渠道配置时使用，每个列名只按"_"切分一次）
+
+        参数:
+            columns: 宽表列名
+            period_types: 时段类型，默认 PERIOD_TYPES
+
+        返回:
+            ColumnSchema: 列名注册表
+        """
+        periods = list(PERIOD_TYPES if period_types is None else period_types)
+        channels, metrics = [], []
+        for col in columns:
+            period, _, rest = str(col).partition('_')
+            channel, _, metric = rest.rpartition('_')
+            if period in periods and channel and metric:
+                if channel not in channels:
+                    channels.append(channel)
+                if metric not in metrics:
+                    metrics.append(metric)
+        return cls(channels, metrics, periods)
+
+    @staticmethod
+    def name(period, channel: str, metric: str) -> str:
+        """生成列名，period 为 None 时生成日度明细列名"""
+        return f"{period}_{channel}_{metric}" if period else f"{channel}_{metric}"
+
+    def key(self, column: str):
+        """解析列名为 (时段, 渠道, 指标)，不属于注册表时返回 None"""
+        return self._keys.get(column)
+
+    def positions(self, columns) -> dict:
+        """
+        绑定具体表的列，返回 {(时段, 渠道, 指标): 列位置}
+
+        参数:
+            columns: 表的列名
+
+        返回:
+            dict: 注册表内列的位置索引
+        """
+        positions = {}
+        for pos, col in enumerate(columns):
+            key = self._keys.get(col)
+            if key is not None:
+                positions[key] = pos
+        return positions
+
+    def ordered(self, columns, channels: list, metrics: list, periods: list) -> list:
+        """
+        按 渠道 → 指标 → 时段 的顺序返回表中存在的列名
+
+        参数:
+            columns: 表的列名
+            channels: 渠道顺序（通常为优先级顺序）
+            metrics: 指标顺序
+            periods: 时段顺序，日度明细传 [None]
+
+        返回:
+            list: 排序后的列名
+        """
+        present = self.positions(columns)
+        return [self.name(period, channel, metric)
+                for channel, metric, period in itertools.product(channels, metrics, periods)
+                if (period, channel, metric) in present]
+
+    def select(self, columns, period=..., channel=..., metric=...) -> list:
+        """
+        按时段/渠道/指标筛选表中的列（未指定的维度不限），保持表内原有顺序
+
+        参数:
+            columns: 表的列名
+            period: 时段（None 表示日度明细列）
+            channel: 渠道
+            metric: 指标
+
+        返回:
+            list: 符合条件的列名
+        """
+        selected = []
+        for col in columns:
+            key = self._keys.get(col)
+            if key is None:
+                continue
+            if ((period is ... or key[0] == period) and (channel is ... or key[1] == channel)
+                    and (metric is ... or key[2] == metric)):
+                selected.append(col)
+        return selected
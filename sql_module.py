@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+import os
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from channel_cube import ChannelCube, build_composition_matrix, build_yoy_analysis, identify_base_channels
+from db_module import quote_identifier, to_records
+from instrument_module import stage
+from memory_module import restore_money
+from period_module import PERIOD_TYPES, compared_years, identify_period_mapping
+
+STAGING_TABLE = '日度明细暂存'  # 日度明细暂存表（建在附加的暂存库中，不写入结果库）
+STAGING_SCHEMA = 'staging'  # 暂存库附加到连接上的名称
+VALID_MONTHS_TABLE = '存量门店月份'  # 存量门店-月份临时表
+KEY_SQL_TYPES = {'查询时段': 'TEXT', '门店编号': 'TEXT', '日期': 'INTEGER'}
+
+
+def _literal(value: str) -> str:
+    """SQL 字符串字面量"""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _staged(table: str) -> str:
+    """暂存库中表的限定名（结果库中的同名表不会被误用）"""
+    return f'{STAGING_SCHEMA}.{quote_identifier(table)}'
+
+
+@contextmanager
+def staging_database(conn: sqlite3.Connection, directory: str = None):
+    """
+    在临时目录新建一个数据库文件并以 STAGING_SCHEMA 附加到连接上，退出时分离并删除，
+    暂存的日度明细不进入结果库（结果库可能位于同步盘，不应留下大表和空闲页）；
+    暂存库在磁盘上，内存占用不随行数增长（连接的 temp_store=MEMORY，不能用 TEMP 表）
+
+    参数:
+        conn: 数据库连接（不能处于事务中）
+        directory: 暂存库文件所在目录，默认为系统临时目录
+
+    生成:
+        str: 暂存库文件路径
+    """
+    fd, path = tempfile.mkstemp(prefix='staging_', suffix='.db', dir=directory)
+    os.close(fd)
+    conn.execute(f'ATTACH DATABASE ? AS {STAGING_SCHEMA}', (path,))
+    try:
+        yield path
+    finally:
+        conn.execute(f'DETACH DATABASE {STAGING_SCHEMA}')
+        for leftover in (path, path + '-journal'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+
+def drop_legacy_staging_table(conn: sqlite3.Connection, table: str = STAGING_TABLE) -> bool:
+    """
+    删除旧版本留在结果库中的暂存表并 VACUUM 回收空间（只在该表存在时执行一次）
+
+    返回:
+        bool: 是否删除了旧表
+    """
+    exists = conn.execute("SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    if not exists:
+        return False
+    conn.execute(f'DROP TABLE main.{quote_identifier(table)}')
+    conn.execute('VACUUM')
+    print(f"已删除结果库中遗留的暂存表 {table} 并回收空间")
+    return True
+
+
+def load_staging_table(conn: sqlite3.Connection, daily_chunks, table: str = STAGING_TABLE) -> int:
+    """
+    将清洗后的日度数据块逐块写入暂存表，并在载入完成后建立 (门店编号, 查询时段) 索引
+
+    参数:
+        conn: 数据库连接（isolation_level=None，事务由本函数管理；须已附加暂存库，见 staging_database）
+        daily_chunks: 清洗后的日度数据块迭代器（如 iter_cleaned_chunks），列以第一块为准
+        table: 暂存表名
+
+    返回:
+        int: 载入的行数
+    """
+    columns = None
+    total_rows = 0
+    conn.execute('BEGIN')
+    try:
+        for chunk in daily_chunks:
+            if columns is None:
+                columns = list(chunk.columns)
+                column_defs = [f"{quote_identifier(col)} {KEY_SQL_TYPES.get(col, 'REAL')}" for col in columns]
+                conn.execute(f'DROP TABLE IF EXISTS {_staged(table)}')
+                conn.execute(f"CREATE TABLE {_staged(table)} ({', '.join(column_defs)})")
+                insert_sql = (f"INSERT INTO {_staged(table)} VALUES "
+                              f"({', '.join('?' * len(columns))})")
+            conn.executemany(insert_sql, to_records(restore_money(chunk.reindex(columns=columns))))
+            total_rows += len(chunk)
+        if columns is None:
+            raise ValueError("没有可载入暂存表的日度数据")
+        conn.execute(f'CREATE INDEX {_staged(f"idx_{table}_门店时段")} '
+                     f'ON {quote_identifier(table)} ("门店编号", "查询时段")')
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    return total_rows
+
+
+def staged_period_mapping(conn: sqlite3.Connection, table: str = STAGING_TABLE) -> dict:
+    """从暂存表的去重查询时段识别时段映射"""
+    periods = [row[0] for row in conn.execute(f'SELECT DISTINCT "查询时段" FROM {_staged(table)}')]
+    return identify_period_mapping(pd.DataFrame({'查询时段': periods}))
+
+
+def monthly_valid_join(conn: sqlite3.Connection, table: str, period_mapping: dict) -> str:
+    """
+    在临时表中计算存量门店-月份（同期年份与本期年份同月流水均大于0），返回供视图使用的 JOIN 子句
+
+    与 monthly_valid_store_mask 一致：按行所在月份判断，行本身的年份不限。
+
+    参数:
+        conn: 数据库连接
+        table: 暂存表名
+        period_mapping: {原始查询时段: 标准时段类型}
+
+    返回:
+        str: JOIN 子句（暂存表别名为 s）
+    """
+    base_year, current_year = compared_years(period_mapping)
+    conn.execute(f'DROP TABLE IF EXISTS temp.{quote_identifier(VALID_MONTHS_TABLE)}')
+    conn.execute(f'''
+        CREATE TEMP TABLE {quote_identifier(VALID_MONTHS_TABLE)} AS
+        SELECT "门店编号", CAST("日期" AS INTEGER) / 100 % 100 AS "月份"
+        FROM {_staged(table)}
+        WHERE CAST("日期" AS INTEGER) / 10000 IN ({base_year}, {current_year})
+        GROUP BY "门店编号", "月份"
+        HAVING TOTAL(CASE WHEN CAST("日期" AS INTEGER) / 10000 = {base_year} THEN "汇总_流水" END) > 0
+           AND TOTAL(CASE WHEN CAST("日期" AS INTEGER) / 10000 = {current_year} THEN "汇总_流水" END) > 0
+    ''')
+    conn.execute(f'CREATE UNIQUE INDEX temp.{quote_identifier(f"idx_{VALID_MONTHS_TABLE}")} '
+                 f'ON {quote_identifier(VALID_MONTHS_TABLE)} ("门店编号", "月份")')
+    return (f'JOIN temp.{quote_identifier(VALID_MONTHS_TABLE)} v '
+            f'ON v."门店编号" = s."门店编号" AND v."月份" = CAST(s."日期" AS INTEGER) / 100 % 100')
+
+
+def build_pivot_sql(table: str, base_channels: list, category_config: list, metrics: list,
+                    period_mapping: dict, join: str = '') -> tuple[str, list]:
+    """
+    生成按门店 GROUP BY 的透视 SQL：每个 时段 × 渠道 × 指标 一列，组合渠道为组成部分之和，
+    营业天数为组合后流水>0的天数，另输出各时段的行数用于判断门店在该时段是否有记录
+
+    参数:
+        table: 暂存表名
+        base_channels: 基础渠道列表
+        category_config: 渠道分类配置（包含新前缀和组成部分）
+        metrics: 需要统计的核心指标列表
+        period_mapping: {原始查询时段: 标准时段类型}
+        join: 视图的 JOIN 子句（暂存表别名为 s），为空表示全部行
+
+    返回:
+        (SQL 语句, 渠道列表)
+    """
+    channels, composition = build_composition_matrix(base_channels, category_config)
+    channel_parts = {channel: [base_channels[i] for i in np.flatnonzero(composition[:, j])]
+                     for j, channel in enumerate(channels)}
+
+    def channel_expr(channel: str, metric: str) -> str:
+        return ' + '.join(f'COALESCE(s.{quote_identifier(f"{part}_{metric}")}, 0)'
+                          for part in channel_parts[channel])
+
+    select = ['s."门店编号"']
+    raw_by_std = {std: raw for raw, std in period_mapping.items()}
+    for period in [p for p in PERIOD_TYPES if p in raw_by_std]:
+        condition = f's."查询时段" = {_literal(raw_by_std[period])}'
+        select.append(f'COUNT(CASE WHEN {condition} THEN 1 END) AS {quote_identifier(f"{period}__行数")}')
+        for channel in channels:
+            for metric in metrics:
+                select.append(f'TOTAL(CASE WHEN {condition} THEN {channel_expr(channel, metric)} END) '
+                              f'AS {quote_identifier(f"{period}_{channel}_{metric}")}')
+            days = (f'TOTAL(CASE WHEN {condition} AND ({channel_expr(channel, "流水")}) > 0 THEN 1 END)'
+                    if '流水' in metrics else '0.0')
+            select.append(f'{days} AS {quote_identifier(f"{period}_{channel}_营业天数")}')
+
+    sql = (f"SELECT {', '.join(select)} FROM {_staged(table)} s {join} "
+           f'GROUP BY s."门店编号" ORDER BY s."门店编号"')
+    return sql, channels
+
+
+def query_channel_cube(conn: sqlite3.Connection, table: str, category_config: list, metrics: list,
+                       period_mapping: dict, join: str = '') -> ChannelCube:
+    """
+    执行透视 SQL，将按门店聚合的结果装入渠道立方体（内存只与门店数相关）
+
+    参数:
+        conn: 数据库连接
+        table: 暂存表名
+        category_config: 渠道分类配置（包含新前缀和组成部分）
+        metrics: 需要统计的核心指标列表
+        period_mapping: {原始查询时段: 标准时段类型}
+        join: 视图的 JOIN 子句，为空表示全部行
+
+    返回:
+        ChannelCube: 聚合后的渠道立方体
+    """
+    table_info = conn.execute(f'PRAGMA {STAGING_SCHEMA}.table_info({quote_identifier(table)})')
+    staged_columns = [row[1] for row in table_info]
+    base_channels = identify_base_channels(staged_columns, category_config, metrics)
+    sql, channels = build_pivot_sql(table, base_channels, category_config, metrics, period_mapping, join)
+    wide = pd.read_sql_query(sql, conn)
+
+    periods = [p for p in PERIOD_TYPES if p in period_mapping.values()]
+    n_stores = len(wide)
+    value_columns = [f"{p}_{c}_{m}" for p in periods for c in channels for m in metrics]
+    day_columns = [f"{p}_{c}_营业天数" for p in periods for c in channels]
+    values = wide[value_columns].to_numpy(dtype=np.float64).reshape(n_stores, len(periods), len(channels), len(metrics))
+    operating_days = wide[day_columns].to_numpy(dtype=np.float64).reshape(n_stores, len(periods), len(channels))
+    has_rows = wide[[f"{p}__行数" for p in periods]].to_numpy() > 0
+    return ChannelCube(wide['门店编号'].to_numpy(dtype=object), periods, channels, list(metrics),
+                       values, operating_days, period_mapping, has_rows)
+
+
+def process_sales_data_sql(conn: sqlite3.Connection, daily_chunks, category_config: list, metrics: list,
+                           priority_order: list, views: dict, kpis: list = None,
+                           table: str = STAGING_TABLE, staging_dir: str = None) -> tuple[dict, pd.DataFrame]:
+    """
+    SQL 下推引擎：日度数据分块载入附加暂存库中的暂存表（结束后删除），透视、组合渠道、营业天数和存量筛选均在 SQLite 中完成，
+    输出与 process_sales_data 相同的同比分析结果和时段映射表
+
+    参数:
+        conn: 数据库连接（通常为 SQLiteWriter.conn）
+        daily_chunks: 清洗后的日度数据块迭代器（如 iter_cleaned_chunks）
+        category_config: 渠道分类配置（包含新前缀和组成部分）
+        metrics: 需要统计的核心指标列表
+        priority_order: 指标优先级排序
+        views: {视图名称: None 表示全部行，或 join_func(conn, table, period_mapping) 返回 JOIN 子句}
+        kpis: 派生指标定义列表，默认为 YOY_KPIS
+        table: 暂存表名
+        staging_dir: 暂存库文件所在目录，默认为系统临时目录
+
+    返回:
+        ({视图名称: 同比分析结果DataFrame}, 时段映射关系DataFrame)
+    """
+    print("开始处理原始数据（SQL 引擎）...")
+    drop_legacy_staging_table(conn, table)
+    results = {}
+    with staging_database(conn, staging_dir):
+        with stage('载入暂存表') as st:
+            rows = load_staging_table(conn, daily_chunks, table)
+            st.output_rows = rows
+        print(f"已载入 {rows} 行日度数据到暂存表 {table}")
+        period_mapping = staged_period_mapping(conn, table)
+        print('查询时段识别成功！')
+
+        for name, join_func in views.items():
+            with stage(f'SQL透视:{name}') as st:
+                join = join_func(conn, table, period_mapping) if join_func is not None else ''
+                cube = query_channel_cube(conn, table, category_config, metrics, period_mapping, join)
+                st.output_rows = len(cube.stores)
+            results[name] = build_yoy_analysis(cube, metrics, priority_order, kpis)
+        conn.execute(f'DROP TABLE IF EXISTS temp.{quote_identifier(VALID_MONTHS_TABLE)}')
+    print("数据处理完成！")
+    period_mapping_df = pd.DataFrame(list(period_mapping.items()), columns=['原始时段', '标准时段'])
+    return results, period_mapping_df
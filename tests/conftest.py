@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # load_config 在导入时读取当前目录下的 config.yaml
+
+from benchmarks.synthetic_data import write_synthetic_csv  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def synthetic_csv(tmp_path_factory):
+    """小规模合成数据（主数据 CSV, 补录数据 CSV），与两条 SQL 导出的列布局一致"""
+    return write_synthetic_csv(str(tmp_path_factory.mktemp('synthetic')), n_stores=60, n_days=12, n_periods=3)
+
+
+@pytest.fixture(scope='session')
+def daily(synthetic_csv):
+    """清洗后的日度数据（各测试只读，需要修改时自行复制）"""
+    from cleaning_module import cleaning_sales_data
+    return cleaning_sales_data(*synthetic_csv)
+
+
+@pytest.fixture(scope='session')
+def pandas_tables(daily):
+    """pandas 引擎（SalesDataResult）的 同比数据/同比数据(存量)/期数，作为其他引擎的对照"""
+    from main import (CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER, filter_monthly_valid_stores,
+                      process_sales_data, result_tables)
+    tables = result_tables(*process_sales_data(daily.copy(), CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER),
+                           name='同比数据')
+    cunliang = result_tables(*process_sales_data(filter_monthly_valid_stores(daily), CHANNEL_CATEGORIES, METRICS,
+                                                 PRIORITY_ORDER),
+                             name='同比数据(存量)', drop_columns=['本期_年份', '本期_月份', '同期_年份', '同期_月份'])
+    tables['同比数据(存量)'] = cunliang['同比数据(存量)']
+    return tables
+
+
+@pytest.fixture(scope='session')
+def reference_detail(daily):
+    """
+    按重构前 process_sales_data 的步骤1-6（逐列子串匹配）计算 本期日度明细 和 营业天数，作为 SalesDataResult 惰性输出的对照
+    """
+    from main import CHANNEL_CATEGORIES, METRICS, PERIOD_TYPES, PRIORITY_ORDER
+    from memory_module import restore_money
+    from period_module import identify_period_mapping
+    processed = restore_money(daily).copy()
+    processed['查询时段'] = processed['查询时段'].astype(str)
+    processed['门店编号'] = processed['门店编号'].astype(str)
+    for category in CHANNEL_CATEGORIES:
+        for metric in METRICS:
+            source_columns = [f"{part}_{metric}" for part in category['parts']]
+            processed[f"{category['new_prefix']}_{metric}"] = processed[source_columns].sum(axis=1)
+    for col in list(processed.columns):
+        if '流水' in col:
+            processed[f"{col.split('流水')[0]}营业天数"] = (processed[col] > 0).astype(int)
+    processed['查询时段'] = processed['查询时段'].replace(identify_period_mapping(processed))
+
+    pivot_table = processed.pivot_table(index=['门店编号'], columns='查询时段', aggfunc='sum')
+    pivot_table.columns = pivot_table.columns.reorder_levels([1, 0]).map('_'.join)
+    structured = pivot_table.reset_index()
+    sorted_cols = ['门店编号'] + [col for p in PRIORITY_ORDER for m in ['营业天数', '流水', '实收', '优惠', '订单数']
+                                for period in PERIOD_TYPES for col in structured.columns
+                                if f"{period}_{p}_{m}" in col and '日期' not in col]
+    operating_days = structured[[col for col in sorted_cols if col == '门店编号' or '营业天数' in col]].fillna(0)
+
+    current = processed[processed['查询时段'] == '本期']
+    basic_cols = ['门店编号', '日期']
+    metric_cols = [col for p in PRIORITY_ORDER for m in METRICS if m != '营业天数'
+                   for col in current.columns if f"{p}_{m}" in col]
+    other_cols = [col for col in current.columns if col not in basic_cols + metric_cols and col != '查询时段']
+    detail = current[basic_cols + metric_cols + other_cols].fillna(0).sort_values(by=['日期', '门店编号'])
+    return {'本期明细': detail, '营业天数': operating_days}
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+import cache_module
+from cache_module import cache_key, cached_cleaning_sales_data, evict_cache
+
+
+@pytest.fixture
+def inputs(synthetic_csv, tmp_path):
+    sales_path, supplement_path = str(tmp_path / 'main.csv'), str(tmp_path / 'sup.csv')
+    shutil.copy(synthetic_csv[0], sales_path)
+    shutil.copy(synthetic_csv[1], supplement_path)
+    return sales_path, supplement_path
+
+
+def test_cache_hit_returns_equal_frame(inputs, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / 'cache')
+    cleaned = cached_cleaning_sales_data(*inputs, cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+
+    def not_called(*args, **kwargs):
+        raise AssertionError('命中缓存时不应解析 CSV')
+
+    monkeypatch.setattr(cache_module, 'cleaning_sales_data', not_called)
+    cached = cached_cleaning_sales_data(*inputs, cache_dir)
+    pd.testing.assert_frame_equal(cached, cleaned)
+
+
+def test_key_changes_with_mtime_or_size(inputs):
+    sales_path, supplement_path = inputs
+    key = cache_key(sales_path, supplement_path)
+    assert cache_key(sales_path, supplement_path) == key
+
+    stat = os.stat(supplement_path)
+    os.utime(supplement_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    touched = cache_key(sales_path, supplement_path)
+    assert touched != key
+
+    with open(sales_path, 'a', encoding='utf-8') as f:
+        f.write('\n')
+    assert cache_key(sales_path, supplement_path) not in (key, touched)
+
+
+def test_changed_input_misses_cache(inputs, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    cached_cleaning_sales_data(*inputs, cache_dir)
+    stat = os.stat(inputs[0])
+    os.utime(inputs[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    cached_cleaning_sales_data(*inputs, cache_dir)
+    assert len(os.listdir(cache_dir)) == 2
+
+
+def test_evict_removes_oldest_down_to_budget(tmp_path):
+    paths = []
+    for i in range(4):
+        path = tmp_path / f'cleaned_{i}.npz'
+        path.write_bytes(b'x' * 1000)
+        os.utime(path, (1_000_000 + i, 1_000_000 + i))  # 访问时间依次变新
+        paths.append(str(path))
+    (tmp_path / 'notes.txt').write_bytes(b'x' * 5000)  # 非缓存文件不参与淘汰
+
+    evict_cache(str(tmp_path), max_bytes=2500, keep=paths[0])
+    assert [os.path.exists(path) for path in paths] == [True, False, False, True]
+    assert (tmp_path / 'notes.txt').exists()
+
+    evict_cache(str(tmp_path), max_bytes=1000)
+    assert [os.path.exists(path) for path in paths] == [False, False, False, True]
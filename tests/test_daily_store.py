@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from channel_cube import build_yoy_analysis
+from cleaning_module import cleaning_sales_data
+from daily_store import DailyStore
+from main import CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER, process_sales_data
+from memory_module import downcast_daily_frame
+from period_module import PERIOD_TYPES, identify_period_mapping
+from range_index import ranges_from_period_mapping
+
+
+def _store_matches(store: DailyStore, expected: pd.DataFrame, period_mapping: dict) -> None:
+    ranges = sorted(ranges_from_period_mapping(period_mapping), key=lambda r: PERIOD_TYPES.index(r[0]))
+    cube = store.query_cube(ranges, CHANNEL_CATEGORIES)
+    pd.testing.assert_frame_equal(build_yoy_analysis(cube, METRICS, PRIORITY_ORDER), expected)
+
+
+def _cents_data(synthetic_csv) -> pd.DataFrame:
+    """金额均精确到分的日度数据（子渠道累加后的浮点误差舍去），低内存模式下可全部降为 float32"""
+    raw = cleaning_sales_data(*synthetic_csv)
+    money = [col for col in raw.columns if col.rpartition('_')[2] in ('流水', '实收', '优惠')]
+    return raw.assign(**{col: raw[col].round(2) for col in money})
+
+
+@pytest.mark.parametrize('low_memory', [False, True])
+def test_store_matches_pandas(synthetic_csv, tmp_path, low_memory):
+    data = _cents_data(synthetic_csv)
+    expected, _ = process_sales_data(data.copy(), CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER)
+    raw = downcast_daily_frame(data.copy()) if low_memory else data
+    store = DailyStore.open_or_create(str(tmp_path), raw.columns, CHANNEL_CATEGORIES, METRICS)
+    middle = int(raw['日期'].median())
+    late, early = raw[raw['日期'] >= middle], raw[raw['日期'] < middle]
+    store.append(late.iloc[:50])   # 先写入少量门店，之后新增门店时扩容
+    store.append(late.iloc[50:])
+    store.append(early)            # 早于起始日期，重建
+    stats = store.append(raw.iloc[:10])
+    assert stats['patched'] == 10
+    store.close()
+
+    store = DailyStore(str(tmp_path))
+    assert store.dtype == (np.float32 if low_memory else np.float64)
+    assert os.path.exists(store.values_path)
+    assert len(store.stores) <= store.capacity <= len(store.stores) + max(len(store.stores) // 10, 16)
+    _store_matches(store, expected, identify_period_mapping(raw))
+
+
+def test_float32_store_widens_for_inexact_values(synthetic_csv, tmp_path):
+    raw = downcast_daily_frame(_cents_data(synthetic_csv))
+    store = DailyStore.open_or_create(str(tmp_path), raw.columns, CHANNEL_CATEGORIES, METRICS)
+    store.append(raw)
+    assert store.dtype == np.float32
+    inexact = cleaning_sales_data(*synthetic_csv).iloc[:5]
+    inexact['pos_流水'] = inexact['pos_流水'] + 1e-3
+    store.append(inexact)
+    assert store.dtype == np.float64
+    assert not os.path.exists(os.path.join(str(tmp_path), 'values.f4'))
+    block, present = store.read(int(inexact['日期'].min()), int(inexact['日期'].max()))
+    assert present.any()
+    store.close()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+import pytest
+
+from db_module import SQLiteWriter
+
+
+@pytest.fixture
+def writer(tmp_path):
+    with SQLiteWriter(str(tmp_path / 'result.db')) as writer:
+        yield writer
+
+
+def test_upsert_writes_only_changed_rows(writer, pandas_tables):
+    yoy = pandas_tables['同比数据']
+    stats = writer.write(yoy, '同比数据', mode='upsert')
+    assert stats == {'inserted': len(yoy), 'updated': 0, 'deleted': 0, 'unchanged': 0}
+    assert writer.write(yoy, '同比数据', mode='upsert')['unchanged'] == len(yoy)
+
+    changed = yoy.copy()
+    changed.loc[changed.index[:3], '本期_汇总_流水'] += 1.0
+    changed = pd.concat([changed.iloc[:-2], changed.iloc[[0]].assign(门店编号='NEW001')], ignore_index=True)
+    stats = writer.write(changed, '同比数据', mode='upsert')
+    assert stats == {'inserted': 1, 'updated': 3, 'deleted': 2, 'unchanged': len(yoy) - 5}
+
+    stored = writer.read_table('同比数据').sort_values('门店编号').reset_index(drop=True)
+    expected = changed.sort_values('门店编号').reset_index(drop=True)
+    pd.testing.assert_frame_equal(stored, expected, check_dtype=False)
+
+
+def test_upsert_rebuilds_when_columns_change(writer, pandas_tables):
+    yoy = pandas_tables['同比数据']
+    writer.write(yoy, '同比数据', mode='upsert')
+    stats = writer.write(yoy.drop(columns=['同比情况']), '同比数据', mode='upsert')
+    assert stats == {'inserted': len(yoy), 'updated': 0, 'deleted': 0, 'unchanged': 0}
+    assert '同比情况' not in writer.read_table('同比数据').columns
+
+
+def test_patch_touches_only_given_keys(writer, pandas_tables):
+    yoy = pandas_tables['同比数据']
+    writer.write(yoy, '同比数据')
+    stores = yoy['门店编号']
+
+    # 改写 4 家门店：1 家更新、1 家不变、1 家删除（在 keys 中但不在 data 中）、1 家新增
+    data = pd.concat([yoy.iloc[[0]].assign(本期_汇总_流水=yoy['本期_汇总_流水'].iloc[0] + 1.0),
+                      yoy.iloc[[1]], yoy.iloc[[0]].assign(门店编号='NEW001')], ignore_index=True)
+    keys = pd.DataFrame({'门店编号': [stores.iloc[0], stores.iloc[1], stores.iloc[2], 'NEW001']})
+    stats = writer.patch(data, '同比数据', keys)
+    assert stats == {'inserted': 1, 'updated': 1, 'deleted': 1, 'unchanged': 1}
+
+    expected = pd.concat([data, yoy.iloc[3:]], ignore_index=True).sort_values('门店编号').reset_index(drop=True)
+    stored = writer.read_table('同比数据').sort_values('门店编号').reset_index(drop=True)
+    pd.testing.assert_frame_equal(stored, expected, check_dtype=False)
+
+
+def test_patch_rejects_schema_mismatch(writer, pandas_tables):
+    yoy = pandas_tables['同比数据']
+    keys = yoy[['门店编号']].head(1)
+    with pytest.raises(ValueError):
+        writer.patch(yoy.head(1), '同比数据', keys)  # 表不存在
+    writer.write(yoy, '同比数据')
+    with pytest.raises(ValueError):
+        writer.patch(yoy.head(1).drop(columns=['同比情况']), '同比数据', keys)
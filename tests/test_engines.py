@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import os
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from channel_cube import build_yoy_analysis, process_sales_data_cube, process_sales_data_views
+from db_module import SQLiteWriter
+from main import CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER, monthly_valid_store_mask
+from parallel_module import process_sales_data_parallel
+from period_module import PERIOD_TYPES, compared_years, identify_period_mapping
+from range_index import DailyPrefixIndex, month_to_date_range, ranges_from_period_mapping, rolling_ranges
+from sql_module import STAGING_TABLE, monthly_valid_join, process_sales_data_sql
+
+VIEWS = ['同比数据', '同比数据(存量)']
+
+
+def assert_tables_equal(tables: dict, expected: dict, names=VIEWS + ['期数']) -> None:
+    for name in names:
+        pd.testing.assert_frame_equal(tables[name], expected[name], obj=name)
+
+
+def test_cube_matches_pandas(daily, pandas_tables):
+    yoy, period_mapping_df = process_sales_data_cube(daily, CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER)
+    pd.testing.assert_frame_equal(yoy, pandas_tables['同比数据'])
+    pd.testing.assert_frame_equal(period_mapping_df, pandas_tables['期数'])
+
+
+def test_views_match_pandas(daily, pandas_tables):
+    tables, period_mapping_df = process_sales_data_views(
+        daily, CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER,
+        {'同比数据': None, '同比数据(存量)': monthly_valid_store_mask(daily)})
+    assert_tables_equal({**tables, '期数': period_mapping_df}, pandas_tables)
+
+
+@pytest.mark.parametrize('n_shards', [3, 200])
+def test_parallel_matches_pandas(daily, pandas_tables, n_shards):
+    period_mapping = identify_period_mapping(daily)
+    mask = partial(monthly_valid_store_mask, years=compared_years(period_mapping))
+    tables, period_mapping_df = process_sales_data_parallel(
+        daily, CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER, {'同比数据': None, '同比数据(存量)': mask},
+        workers=2, n_shards=n_shards, period_mapping=period_mapping)
+    assert_tables_equal({**tables, '期数': period_mapping_df}, pandas_tables)
+
+
+def test_sql_matches_pandas(daily, pandas_tables, tmp_path):
+    staging_dir = tmp_path / 'staging'
+    staging_dir.mkdir()
+    chunks = (daily.iloc[i:i + 250] for i in range(0, len(daily), 250))
+    with SQLiteWriter(str(tmp_path / 'result.db')) as writer:
+        tables, period_mapping_df = process_sales_data_sql(
+            writer.conn, chunks, CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER,
+            {'同比数据': None, '同比数据(存量)': monthly_valid_join}, staging_dir=str(staging_dir))
+        names = [row[0] for row in writer.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    assert STAGING_TABLE not in names
+    assert os.listdir(staging_dir) == []
+    assert_tables_equal({**tables, '期数': period_mapping_df}, pandas_tables)
+
+
+def test_range_index_matches_pandas(daily, pandas_tables):
+    index = DailyPrefixIndex.from_daily(daily, CHANNEL_CATEGORIES, METRICS)
+    period_mapping = identify_period_mapping(daily)
+    ranges = sorted(ranges_from_period_mapping(period_mapping), key=lambda r: PERIOD_TYPES.index(r[0]))
+    cube = index.query_cube(ranges)
+    pd.testing.assert_frame_equal(build_yoy_analysis(cube, METRICS, PRIORITY_ORDER), pandas_tables['同比数据'])
+    pd.testing.assert_frame_equal(cube.period_mapping_frame(), pandas_tables['期数'])
+
+    end = int(daily['日期'].max())
+    wide = index.query_wide(rolling_ranges(end, (3,)) + [month_to_date_range(end)], PRIORITY_ORDER)
+    _, start, stop = rolling_ranges(end, (3,))[0]
+    in_range = daily[(daily['日期'] >= start) & (daily['日期'] <= stop)]
+    expected = in_range.groupby('门店编号', observed=True)['汇总_流水'].sum()
+    got = wide.set_index('门店编号')['近3天_汇总_流水'].reindex(expected.index.astype(str))
+    np.testing.assert_allclose(got.to_numpy(), expected.to_numpy())
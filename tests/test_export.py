@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import export_module
+from export_module import export_tables
+
+BATCH_ROWS = 3  # 7 行数据跨越两个批次边界
+
+
+@pytest.fixture
+def tables():
+    yoy = pd.DataFrame({
+        '门店编号': pd.Categorical(['TLL1', 'ZYD2', 'TLL3', 'ZYD4', 'TLL5', 'ZYD6', 'TLL7']),
+        '本期_汇总_流水': [1.5, np.nan, 3.25, np.inf, -np.inf, 6.0, 7.75],
+        '本期_汇总_订单数': [1, 2, 3, 4, 5, 6, 7],
+        '同比情况': ['增长', '下降', None, '增长', '持平', '下降', '增长'],
+    })
+    periods = pd.DataFrame({'标准时段': ['本期', '同期'], '原始时段': ['20250901~20250907', '20240901~20240907']})
+    return {'同比数据': yoy, '期数': periods}
+
+
+def _expected(data: pd.DataFrame, inf_as_missing: bool) -> pd.DataFrame:
+    expected = data.assign(**{col: data[col].astype(str) for col in data.columns
+                              if isinstance(data[col].dtype, pd.CategoricalDtype)})
+    if inf_as_missing:
+        expected = expected.replace([np.inf, -np.inf], np.nan)
+    return expected
+
+
+@pytest.mark.parametrize('engine', ['xlsxwriter', 'openpyxl'])
+def test_xlsx_round_trip(tables, tmp_path, monkeypatch, engine):
+    if engine == 'openpyxl':
+        monkeypatch.setitem(sys.modules, 'xlsxwriter', None)  # 使 import xlsxwriter 失败，走 openpyxl 分支
+    engines = []
+    close = export_module._XlsxWorkbook.close
+    monkeypatch.setattr(export_module._XlsxWorkbook, 'close', lambda self: (engines.append(self.engine), close(self)))
+    outputs = export_tables(tables, str(tmp_path), formats=('xlsx',), batch_rows=BATCH_ROWS)
+    assert engines == [engine]
+    sheets = pd.read_excel(outputs['xlsx'][0], sheet_name=None)
+    assert list(sheets) == list(tables)
+    for name, data in tables.items():
+        pd.testing.assert_frame_equal(sheets[name], _expected(data, inf_as_missing=True), check_dtype=False)
+
+
+def test_csv_round_trip(tables, tmp_path):
+    outputs = export_tables(tables, str(tmp_path), formats=('csv',), batch_rows=BATCH_ROWS)
+    assert [path.rsplit('/', 1)[1] for path in outputs['csv']] == ['同比数据.csv', '期数.csv']
+    for path, (name, data) in zip(outputs['csv'], tables.items()):
+        with open(path, encoding='utf-8') as f:
+            assert f.read(1) == '\ufeff'
+        pd.testing.assert_frame_equal(pd.read_csv(path, encoding='utf-8-sig'), _expected(data, inf_as_missing=False),
+                                      check_dtype=False)
+
+
+def test_parquet_round_trip(tables, tmp_path):
+    outputs = export_tables(tables, str(tmp_path), formats=('parquet',), batch_rows=BATCH_ROWS)
+    for path, (name, data) in zip(outputs['parquet'], tables.items()):
+        pd.testing.assert_frame_equal(pd.read_parquet(path), _expected(data, inf_as_missing=False),
+                                      check_dtype=False)
+
+
+def test_unknown_format_is_rejected(tables, tmp_path):
+    with pytest.raises(ValueError):
+        export_tables(tables, str(tmp_path), formats=('json',))
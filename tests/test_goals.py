@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+
+import addition
+from addition import COMPLETION_METRICS, GOAL_MEMO_SIZE, GOAL_TYPES, GoalMatrix, calculate_goals, period_month_weights
+
+PERIODS = pd.DataFrame({'标准时段': ['本期'], '原始时段': ['20250901~20250930']})
+
+
+def _sales(stores: list) -> pd.DataFrame:
+    columns = {f'本期_{channel}_{metric}': [100.0] * len(stores)
+               for _, _, channels in GOAL_TYPES.values() for channel in channels for metric in COMPLETION_METRICS}
+    return pd.DataFrame({'门店编号': stores, **columns})
+
+
+def test_null_pool_counts_as_zero():
+    goal = pd.DataFrame({'门店编号': ['S1', 'S2'], '全渠道池': [None, '1'], '外卖池': ['1', None],
+                         '全渠道202509': ['1000', '2000'], '外卖渠道202509': ['300', '400']})
+    result = calculate_goals(_sales(['S1', 'S2']), goal, PERIODS).set_index('门店编号')
+    assert result.loc['S1', '全渠道池_抖音_流水'] == 0.0
+    assert result.loc['S1', '外卖池_线上外卖_流水'] == 100.0
+    assert result.loc['S2', '全渠道池_抖音_流水'] == 100.0
+    assert result.loc['S2', '外卖池_线上外卖_流水'] == 0.0
+    assert not result.isna().any().any()
+
+
+def test_goal_memo_keeps_recent_entries():
+    frames = [pd.DataFrame({'门店编号': ['S1'], '全渠道池': ['1'], '外卖池': ['1'], '全渠道202509': [str(i)]})
+              for i in range(GOAL_MEMO_SIZE + 2)]
+    first = GoalMatrix.cached(frames[0])
+    for frame in frames[1:]:
+        GoalMatrix.cached(frame)
+        GoalMatrix.cached(frames[0])  # 最近使用过的不淘汰
+    assert len(addition._goal_memo) == GOAL_MEMO_SIZE
+    assert GoalMatrix.cached(frames[0]) is first
+    assert GoalMatrix.cached(frames[-1]) is GoalMatrix.cached(frames[-1])
+
+
+def test_month_weights_across_two_months():
+    months = ['202507', '202508', '202509']
+    prorated = period_month_weights('20250825', '20250905', months, prorate=True)
+    np.testing.assert_allclose(prorated, [0.0, 7 / 31, 5 / 30])
+    np.testing.assert_array_equal(period_month_weights('20250825', '20250905', months), [0.0, 1.0, 1.0])
+
+
+def test_calculate_goals_leaves_goal_df_unchanged():
+    goal = pd.DataFrame({'门店编号': ['S1', 'S2'], '全渠道池': ['1', '1'], '外卖池': ['1', '0'],
+                         '全渠道202508': ['3100', '6200'], '全渠道202509': ['3000', None],
+                         '外卖渠道202508': ['310', '620'], '外卖渠道202509': ['300', 'x']})
+    before = goal.copy()
+    periods = pd.DataFrame({'标准时段': ['本期'], '原始时段': ['20250825~20250905']})
+    full = calculate_goals(_sales(['S1', 'S2']), goal, periods).set_index('门店编号')
+    prorated = calculate_goals(_sales(['S1', 'S2']), goal, periods, prorate=True).set_index('门店编号')
+    pd.testing.assert_frame_equal(goal, before)
+    assert full['全渠道目标'].tolist() == [6100.0, 6200.0]
+    assert full['外卖目标'].tolist() == [610.0, 620.0]
+    np.testing.assert_allclose(prorated['全渠道目标'], [3100 * 7 / 31 + 3000 * 5 / 30, 6200 * 7 / 31])
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from instrument_module import RunReport, instrumented, stage
+
+ALLOC_MB = 80
+
+
+@instrumented('加工')
+def _work(data: pd.DataFrame, factor: int) -> pd.DataFrame:
+    buffer = np.ones(ALLOC_MB * 1024 * 1024 // 8)  # 写满，常驻内存实际增长
+    time.sleep(0.1)  # 长于采样间隔，确保采样到峰值
+    del buffer
+    return pd.concat([data] * factor, ignore_index=True).assign(extra=1)
+
+
+def test_stage_is_noop_without_report():
+    with stage('无报告', pd.DataFrame({'a': [1]})) as record:
+        record.set_output(None)
+    assert _work(pd.DataFrame({'a': [1, 2]}), 2).shape == (4, 2)
+
+
+def test_instrumented_stage_records_shape_time_and_memory(tmp_path):
+    data = pd.DataFrame({'a': range(10), 'b': range(10)})
+    with RunReport() as report:
+        with stage('外层', data) as outer:
+            result = _work(data, 3)
+            outer.set_output(result)
+    assert [record.name for record in report.stages] == ['外层', '加工']
+    record = report.stages[1]
+    assert (record.input_rows, record.input_cols) == (10, 2)
+    assert (record.output_rows, record.output_cols) == (30, 3)
+    assert record.wall_s >= 0.1 and record.cpu_s >= 0
+    if sys.platform.startswith('linux'):
+        assert record.peak_rss_delta_mb >= ALLOC_MB * 0.75
+        assert report.stages[0].peak_rss_delta_mb >= ALLOC_MB * 0.75  # 外层阶段同样计入内层的峰值
+
+    path = str(tmp_path / 'report.json')
+    report.extra['engine'] = 'pandas'
+    report.save(path)
+    with open(path, encoding='utf-8') as f:
+        saved = json.load(f)
+    assert saved['engine'] == 'pandas' and saved['total_wall_s'] >= 0.1
+    stages = {item['name']: item for item in saved['stages']}
+    assert stages['加工']['output_rows'] == 30 and stages['加工']['output_cols'] == 3
+    assert stages['加工']['wall_s'] == record.wall_s
+    assert stages['加工']['peak_rss_delta_mb'] == record.peak_rss_delta_mb
+    assert not any(key.startswith('_') for key in stages['加工'])
+
+
+def test_profile_dir_saves_outer_stage(tmp_path):
+    profile_dir = str(tmp_path / 'prof')
+    with RunReport(profile_dir=profile_dir) as report:
+        with stage('外层'):
+            with stage('内层'):
+                pass
+    assert report.stages[1].profile_path is None
+    assert os.path.exists(report.stages[0].profile_path)
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from key_module import KeyEncoder, day_ordinals, ordinal_dates
+
+
+def test_day_ordinals_round_trip():
+    days = pd.date_range('1999-12-25', '2030-03-05', freq='D')
+    dates = days.strftime('%Y%m%d').astype(int).to_numpy()
+    ordinals = day_ordinals(dates)
+    np.testing.assert_array_equal(ordinals, (days - pd.Timestamp('1970-01-01')).days)
+    np.testing.assert_array_equal(ordinal_dates(ordinals), dates)
+    np.testing.assert_array_equal(day_ordinals(['20240229', '20250301']), day_ordinals([20240229, 20250301]))
+
+
+FRAME = pd.DataFrame({'查询时段': ['本期', '同期', '本期'], '门店编号': ['TLL1', 'ZYD2', 'TLL1'],
+                      '日期': [20250901, 20240901, 20250903]})
+
+
+@pytest.mark.parametrize('categorical', [False, True])
+def test_encode_misses_are_minus_one(categorical):
+    encoder = KeyEncoder.from_frames(FRAME)
+    frame = pd.DataFrame({'查询时段': ['本期', '其他', '同期', '本期'], '门店编号': ['TLL1', 'TLL1', 'XXX9', 'ZYD2'],
+                          '日期': [20250901, 20250901, 20240901, 20260101]})
+    if categorical:
+        frame = frame.astype({'查询时段': 'category', '门店编号': 'category'})
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        keys = encoder.encode(frame)
+        np.testing.assert_array_equal(encoder.encode_stores(frame['门店编号']), [0, 0, -1, 1])
+    assert keys[0] >= 0
+    np.testing.assert_array_equal(keys[1:], [-1, -1, -1])
+
+
+def test_encode_orders_like_sorted_keys():
+    encoder = KeyEncoder.from_frames(FRAME)
+    keys = encoder.encode(FRAME)
+    order = FRAME.sort_values(['查询时段', '门店编号', '日期']).index.to_numpy()
+    np.testing.assert_array_equal(np.argsort(keys, kind='stable'), order)
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+import pytest
+
+from kpi_module import evaluate_kpis
+
+TABLE = pd.DataFrame({'本期_A_流水': [1.0, 0.0], '本期_B_流水': [0.0, 2.0]})
+
+
+def test_var_binds_per_combo():
+    kpis = [{'name': '{channel}_有流水', 'var': '{channel}_有', 'expr': '本期_{channel}_流水 > 0',
+             'for': {'channel': ['A', 'B']}},
+            {'name': '{channel}_标记', 'expr': "where({channel}_有, '是', '否')", 'for': {'channel': ['A', 'B']}}]
+    result = evaluate_kpis(TABLE, kpis)
+    assert result['A_标记'].tolist() == ['是', '否']
+    assert result['B_标记'].tolist() == ['否', '是']
+
+
+def test_var_without_template_on_multiple_combos_raises():
+    kpis = [{'name': '{channel}_流水', 'var': '流水', 'expr': '本期_{channel}_流水', 'for': {'channel': ['A', 'B']}}]
+    with pytest.raises(ValueError, match='var'):
+        evaluate_kpis(TABLE, kpis)
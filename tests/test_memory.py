@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+
+from channel_cube import process_sales_data_views
+from cleaning_module import cleaning_sales_data
+from main import CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER, monthly_valid_store_mask, process_sales_data
+from memory_module import concat_chunks, downcast_daily_frame, restore_money
+
+
+def test_downcast_money_restores_exact_cents():
+    data = pd.DataFrame({'pos_流水': [32689.12, 0.01, np.nan], 'pos_实收': [1.005, 2.0, 3.0]})
+    downcast_daily_frame(data)
+    assert data['pos_流水'].dtype == np.float32
+    assert data['pos_实收'].dtype == np.float64  # 不止两位小数，不能无损还原，保持 float64
+    restored = restore_money(data)
+    np.testing.assert_array_equal(restored['pos_流水'].to_numpy(), [32689.12, 0.01, np.nan])
+
+
+def test_low_memory_matches_default(synthetic_csv):
+    default = cleaning_sales_data(*synthetic_csv)
+    low = cleaning_sales_data(*synthetic_csv, chunksize=300, low_memory=True)
+    assert (low.dtypes == np.float32).any()
+
+    expected, _ = process_sales_data(default.copy(), CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER)
+    result, _ = process_sales_data(low.copy(), CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False, rtol=1e-12)
+
+    views, _ = process_sales_data_views(low, CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER,
+                                        {'同比数据': None, '同比数据(存量)': monthly_valid_store_mask(low)})
+    pd.testing.assert_frame_equal(views['同比数据'], expected, check_dtype=False, rtol=1e-12)
+
+
+def test_chunked_matches_single_read(synthetic_csv):
+    expected = cleaning_sales_data(*synthetic_csv)
+    result = cleaning_sales_data(*synthetic_csv, chunksize=250)
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_concat_chunks_releases_chunks():
+    chunks = [pd.DataFrame({'门店编号': ['B', 'A'], 'pos_流水': np.array([1.25, 2.5], dtype=np.float32)}),
+              pd.DataFrame({'门店编号': ['C'], 'pos_流水': [0.1]})]
+    result = concat_chunks(chunks)
+    assert chunks == [None, None]
+    assert list(result['门店编号'].cat.categories) == ['A', 'B', 'C']
+    np.testing.assert_array_equal(result['pos_流水'].to_numpy(), [1.25, 2.5, 0.1])
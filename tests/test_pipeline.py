@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+import pytest
+
+from pipeline_module import Pipeline
+
+
+def test_dependencies_run_first_and_receive_results():
+    finished = []
+
+    def step(name, value):
+        def run(*args):
+            time.sleep(0.01)
+            finished.append(name)
+            return value + sum(args)
+        return run
+
+    pipeline = Pipeline(workers=3)
+    pipeline.add('a', step('a', 1))
+    pipeline.add('b', step('b', 10))
+    pipeline.add('c', step('c', 100), deps=['a', 'b'])
+    pipeline.add('d', step('d', 1000), deps=['c'])
+    results = pipeline.run()
+    assert results == {'a': 1, 'b': 10, 'c': 111, 'd': 1111}
+    assert set(finished[:2]) == {'a', 'b'} and finished[2:] == ['c', 'd']
+    tasks = pipeline.timeline()['tasks']
+    assert tasks['c']['start_s'] >= max(tasks['a']['end_s'], tasks['b']['end_s'])
+
+
+def test_unknown_or_duplicate_steps_are_rejected():
+    pipeline = Pipeline()
+    pipeline.add('a', lambda: 1)
+    with pytest.raises(ValueError):
+        pipeline.add('a', lambda: 2)
+    with pytest.raises(ValueError):
+        pipeline.add('b', lambda x: x, deps=['missing'])
+
+
+def test_io_steps_share_one_thread():
+    threads = {}
+    active, overlap = [0], [False]
+    lock = threading.Lock()
+
+    def io_step(name):
+        def run(*args):
+            with lock:
+                active[0] += 1
+                overlap[0] |= active[0] > 1
+            time.sleep(0.01)
+            with lock:
+                active[0] -= 1
+            threads[name] = threading.current_thread().name
+        return run
+
+    pipeline = Pipeline(workers=4)
+    for i in range(4):
+        pipeline.add(f'io{i}', io_step(f'io{i}'), io=True)
+    pipeline.add('compute', lambda: threads.setdefault('compute', threading.current_thread().name))
+    pipeline.run()
+    io_threads = {threads[f'io{i}'] for i in range(4)}
+    assert len(io_threads) == 1 and next(iter(io_threads)).startswith('pipeline-db')
+    assert threads['compute'].startswith('pipeline_') and not overlap[0]
+
+
+def test_failure_stops_new_steps_and_reraises():
+    started = []
+
+    def fail():
+        started.append('fail')
+        raise RuntimeError('boom')
+
+    def slow():
+        started.append('slow')
+        time.sleep(0.05)
+        return 1
+
+    pipeline = Pipeline(workers=2)
+    pipeline.add('fail', fail)
+    pipeline.add('slow', slow)
+    pipeline.add('after_fail', lambda x: started.append('after_fail'), deps=['fail'])
+    pipeline.add('after_slow', lambda x: started.append('after_slow'), deps=['slow'])
+    with pytest.raises(RuntimeError, match='boom'):
+        pipeline.run()
+    assert sorted(started) == ['fail', 'slow']
+    assert pipeline.tasks['slow'].end_s is not None  # 已开始的步骤等到结束
+
+
+def test_timeline_critical_path():
+    def sleeper(seconds):
+        return lambda *args: time.sleep(seconds)
+
+    pipeline = Pipeline(workers=2)
+    pipeline.add('short', sleeper(0.01))
+    pipeline.add('long', sleeper(0.08))
+    pipeline.add('write', sleeper(0.01), deps=['short', 'long'], io=True)
+    pipeline.run()
+    timeline = pipeline.timeline()
+    assert timeline['critical_path'] == ['long', 'write']
+    assert timeline['critical_path_s'] >= 0.09
+    assert timeline['total_s'] >= timeline['critical_path_s'] - 0.001
+    assert timeline['tasks']['write']['io'] and not timeline['tasks']['long']['io']
+    assert set(timeline['tasks']) == {'short', 'long', 'write'}
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+
+from addition import calculate_goals
+from benchmarks.synthetic_data import generate_goal_data
+from db_module import SQLiteWriter
+from main import CHANNEL_CATEGORIES
+from query_service import QueryService
+
+
+@pytest.fixture(scope='module')
+def frames(pandas_tables):
+    yoy = pandas_tables['同比数据']
+    goals = calculate_goals(yoy, generate_goal_data(yoy['门店编号'].unique(), ['202509']), pandas_tables['期数'])
+    return yoy, goals
+
+
+@pytest.fixture
+def service(frames):
+    service = QueryService(CHANNEL_CATEGORIES)
+    assert service.handle('/status', {}) == (503, {'error': '结果尚未就绪'})
+    service.publish_frames(*frames)
+    return service
+
+
+def _prefix(stores: pd.Series) -> pd.Series:
+    return stores.str.extract(r'^([A-Za-z]*)', expand=False)
+
+
+def test_status(service, frames):
+    status, body = service.handle('/status', {})
+    assert status == 200
+    assert body['generation'] == 1 and body['stores'] == len(frames[0])
+    assert sorted(body['prefixes']) == ['TLL', 'ZYD']
+    assert body['groups'] == [category['new_prefix'] for category in CHANNEL_CATEGORIES]
+
+
+@pytest.mark.parametrize('order', ['desc', 'asc'])
+def test_stores_top_matches_pandas(service, frames, order):
+    yoy = frames[0]
+    status, body = service.handle('/stores', {'prefix': 'TLL', 'top': '5', 'order': order})
+    assert status == 200
+    tll = yoy[_prefix(yoy['门店编号']) == 'TLL'].dropna(subset=['同比（%）'])
+    expected = tll.sort_values('同比（%）', ascending=(order == 'asc'))['门店编号'].head(5).tolist()
+    rows = pd.DataFrame(body['rows'], columns=body['columns'])
+    assert rows['门店编号'].tolist() == expected
+    assert rows['同比（%）'].tolist() == pytest.approx(
+        yoy.set_index('门店编号').loc[expected, '同比（%）'].tolist())
+
+
+def test_stores_group_columns(service, frames):
+    group = CHANNEL_CATEGORIES[0]
+    status, body = service.handle('/stores', {'group': group['new_prefix'], 'limit': '3'})
+    assert status == 200
+    assert len(body['rows']) == 3
+    channels = {group['new_prefix'], *group['parts']}
+    assert {col.split('_')[1] for col in body['columns'] if col.count('_') == 2} == channels | {'汇总'}
+    assert '全渠道目标' in body['columns']
+
+
+def test_summary_matches_pandas(service, frames):
+    yoy, goals = frames
+    status, body = service.handle('/summary', {'prefix': 'ZYD'})
+    assert status == 200
+    zyd = _prefix(yoy['门店编号']) == 'ZYD'
+    assert body['stores'] == int(zyd.sum())
+    for col in ['本期_汇总_流水', '同期_汇总_流水', '本期_汇总_订单数']:
+        assert body['totals'][col] == pytest.approx(yoy.loc[zyd, col].sum())
+    goal_zyd = goals[_prefix(goals['门店编号']) == 'ZYD']
+    assert body['totals']['全渠道目标'] == pytest.approx(np.nansum(goal_zyd['全渠道目标']))
+    current, previous = yoy.loc[zyd, '本期_汇总_流水'].sum(), yoy.loc[zyd, '同期_汇总_流水'].sum()
+    assert body['同比（%）'] == pytest.approx((current - previous) / previous)
+
+
+@pytest.mark.parametrize('path, params, status', [
+    ('/stores', {'prefix': 'XYZ'}, 400),
+    ('/stores', {'group': '不存在'}, 400),
+    ('/stores', {'top': 'abc'}, 400),
+    ('/stores', {'top': '-1'}, 400),
+    ('/unknown', {}, 404),
+])
+def test_bad_requests(service, path, params, status):
+    code, body = service.handle(path, params)
+    assert code == status and 'error' in body
+
+
+def test_publish_from_db(frames, tmp_path):
+    service = QueryService(CHANNEL_CATEGORIES)
+    with SQLiteWriter(str(tmp_path / 'result.db')) as writer:
+        assert service.publish_from_db(writer) is None
+        writer.write(frames[0], '同比数据')
+        writer.write(frames[1], '目标数据')
+        service.publish_from_db(writer)
+    expected = QueryService(CHANNEL_CATEGORIES)
+    expected.publish_frames(*frames)
+    assert service.handle('/summary', {'prefix': 'TLL'}) == expected.handle('/summary', {'prefix': 'TLL'})
+    assert service.handle('/stores', {'top': '10'}) == expected.handle('/stores', {'top': '10'})
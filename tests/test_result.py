@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+
+from main import CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER, SalesDataResult
+
+
+def test_lazy_outputs_match_reference(daily, reference_detail):
+    result = SalesDataResult(daily.copy(), CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER)
+    detail = result.current_period_detail
+    expected = reference_detail['本期明细']
+    assert list(detail.columns) == list(expected.columns) and len(detail) == len(expected)
+    pd.testing.assert_frame_equal(detail.reset_index(drop=True), expected.reset_index(drop=True),
+                                  check_dtype=False, check_categorical=False)
+    pd.testing.assert_frame_equal(result.operating_days.reset_index(drop=True),
+                                  reference_detail['营业天数'].reset_index(drop=True), check_dtype=False)
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from main import CHANNEL_CATEGORIES, METRICS, PERIOD_TYPES, PRIORITY_ORDER
+from schema_module import ColumnSchema
+
+COLUMNS = ['门店编号', '本期_抖音团购_流水', '本期_抖音_流水', '同期_抖音团购_流水', '同期_抖音_流水',
+           '本期_抖音小程序_流水', '本期_抖音_订单数', '抖音团购_流水', '抖音_流水']
+
+
+@pytest.fixture(scope='module')
+def schema():
+    return ColumnSchema.from_config(PRIORITY_ORDER, METRICS, PERIOD_TYPES, CHANNEL_CATEGORIES)
+
+
+def test_douyin_and_douyin_tuangou_are_separate_channels(schema):
+    assert schema.key('本期_抖音团购_流水') == ('本期', '抖音团购', '流水')
+    assert schema.key('本期_抖音_流水') == ('本期', '抖音', '流水')
+    assert schema.ordered(COLUMNS, ['抖音'], ['流水', '订单数'], ['本期', '同期']) == [
+        '本期_抖音_流水', '同期_抖音_流水', '本期_抖音_订单数']
+    assert schema.ordered(COLUMNS, ['抖音'], ['流水'], [None]) == ['抖音_流水']
+    assert schema.select(COLUMNS, channel='抖音') == ['本期_抖音_流水', '同期_抖音_流水', '本期_抖音_订单数', '抖音_流水']
+    assert schema.select(COLUMNS, period='本期', channel='抖音团购') == ['本期_抖音团购_流水']
+
+
+def test_process_sales_data_keeps_douyin_channels_apart(daily, pandas_tables):
+    yoy = pandas_tables['同比数据'].set_index('门店编号')
+    current = pandas_tables['期数'].set_index('标准时段').loc['本期', '原始时段']
+    rows = daily[daily['查询时段'].astype(str) == current]
+    sums = rows.groupby(rows['门店编号'].astype(str))[['抖音团购_流水', '抖音小程序_流水', '快手团购_流水']].sum()
+    sums = sums.reindex(yoy.index, fill_value=0.0)
+    np.testing.assert_allclose(yoy['本期_抖音团购_流水'], sums['抖音团购_流水'])
+    parts = next(category['parts'] for category in CHANNEL_CATEGORIES if category['new_prefix'] == '抖音')
+    np.testing.assert_allclose(yoy['本期_抖音_流水'], sums[[f'{part}_流水' for part in parts]].sum(axis=1))
+    assert (yoy['本期_抖音_流水'] != yoy['本期_抖音团购_流水']).any()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import shutil
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from addition import GoalMatrix
+from benchmarks.synthetic_data import generate_goal_data
+from cleaning_module import cleaning_sales_data
+from db_module import SQLiteWriter
+from kpi_module import YOY_KPIS
+from main import CHANNEL_CATEGORIES, METRICS, PERIOD_TYPES, PRIORITY_ORDER, monthly_valid_store_mask, process_sales_data
+from schema_module import ColumnSchema
+from watch_module import SalesWatcher
+
+TABLES = ['同比数据', '同比数据(存量)', '期数', '目标数据']
+
+
+def _write_goal(db_path: str, goal: pd.DataFrame) -> None:
+    with sqlite3.connect(db_path) as conn:
+        goal.to_sql('goal', conn, index=False, if_exists='replace')
+
+
+def _watcher(db_path: str, sales_path: str, supplement_path: str) -> SalesWatcher:
+    writer = SQLiteWriter(db_path)
+    return SalesWatcher(writer, sales_path, supplement_path, CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER,
+                        {'同比数据': None, '同比数据(存量)': monthly_valid_store_mask}, YOY_KPIS,
+                        GoalMatrix.cached(writer.read_table('goal')),
+                        ColumnSchema.from_config(PRIORITY_ORDER, METRICS, PERIOD_TYPES, CHANNEL_CATEGORIES),
+                        goal_table='goal')
+
+
+def _sorted(data: pd.DataFrame) -> pd.DataFrame:
+    key = '门店编号' if '门店编号' in data.columns else '标准时段'
+    return data.sort_values(key).reset_index(drop=True)
+
+
+class WatchCase:
+    """监视模式的输入文件、目标表和常驻的 SalesWatcher"""
+
+    def __init__(self, synthetic_csv, tmp_path):
+        self.tmp_path = tmp_path
+        self.sales_path, self.supplement_path = str(tmp_path / 'main.csv'), str(tmp_path / 'sup.csv')
+        shutil.copy(synthetic_csv[0], self.sales_path)
+        shutil.copy(synthetic_csv[1], self.supplement_path)
+        stores = pd.read_csv(self.sales_path, usecols=['门店编号'])['门店编号'].astype(str).unique()
+        self.goal = generate_goal_data(stores, ['202509'])
+        self.db_path = str(tmp_path / 'watch.db')
+        _write_goal(self.db_path, self.goal)
+        self.watcher = _watcher(self.db_path, self.sales_path, self.supplement_path)
+        self.runs = 0
+
+    def assert_matches_full_run(self) -> None:
+        """增量改写后的结果表与全新的全量计算一致，同比数据与 pandas 引擎一致"""
+        self.runs += 1
+        full_db = str(self.tmp_path / f'full{self.runs}.db')
+        _write_goal(full_db, self.goal)
+        full = _watcher(full_db, self.sales_path, self.supplement_path)
+        assert full.poll()
+        for table in TABLES:
+            # 列的 SQLite 类型由建表时的数据决定（如新门店使营业天数变为浮点），只比较取值
+            pd.testing.assert_frame_equal(_sorted(self.watcher.writer.read_table(table)),
+                                          _sorted(full.writer.read_table(table)), check_dtype=False, obj=table)
+        full.writer.close()
+
+        daily = cleaning_sales_data(self.sales_path, self.supplement_path)
+        expected, _ = process_sales_data(daily, CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER, inplace=True)
+        pd.testing.assert_frame_equal(_sorted(self.watcher.writer.read_table('同比数据')), _sorted(expected),
+                                      check_dtype=False)
+
+
+@pytest.fixture
+def case(synthetic_csv, tmp_path):
+    case = WatchCase(synthetic_csv, tmp_path)
+    assert case.watcher.poll()
+    assert not case.watcher.poll()
+    yield case
+    case.watcher.writer.close()
+
+
+def test_supplement_edits_are_patched(case):
+    supplement = pd.read_csv(case.supplement_path)
+    rows = supplement.sample(5, random_state=1).index
+    supplement.loc[rows, '新增汇总_流水'] += 123.45
+    supplement.to_csv(case.supplement_path, index=False)
+    assert case.watcher.poll()
+    case.assert_matches_full_run()
+
+    # 删除补录行，并新增一家只存在于补录数据中的门店
+    supplement = pd.read_csv(case.supplement_path)
+    new_row = supplement.iloc[[0]].assign(门店编号='TLL_NEW')
+    pd.concat([supplement.drop(index=supplement.index[1:3]), new_row], ignore_index=True).to_csv(
+        case.supplement_path, index=False)
+    assert case.watcher.poll()
+    case.assert_matches_full_run()
+
+
+def test_removed_store_is_deleted(case):
+    sales = pd.read_csv(case.sales_path)
+    sales[sales['门店编号'] != sales['门店编号'].iloc[0]].to_csv(case.sales_path, index=False)
+    assert case.watcher.poll()
+    case.assert_matches_full_run()
+
+
+def test_goal_table_change_refreshes_goals(case):
+    before = case.watcher.writer.read_table('目标数据')
+    case.goal = case.goal.assign(全渠道202509=(case.goal['全渠道202509'].astype(int) * 2).astype(str))
+    _write_goal(case.db_path, case.goal)
+    assert case.watcher.poll()
+    assert not case.watcher.poll()
+    assert not case.watcher.writer.read_table('目标数据').equals(before)
+    case.assert_matches_full_run()
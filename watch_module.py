@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from addition import GoalMatrix, calculate_goals
+from channel_cube import process_sales_data_views
+from cleaning_module import MERGE_KEYS, fold_sub_channels, load_supplement_data, merge_supplement_chunks
+from instrument_module import stage
+from key_module import KeyEncoder, encode_keys
+from period_module import compared_years, identify_period_mapping
+
+GOAL_TABLE = '目标数据'
+PERIOD_TABLE = '期数'
+
+
+def file_state(file_path: str):
+    """文件的 (大小, 修改时间)，用于轮询判断文件是否变化；文件不存在时为 None"""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def changed_stores(previous: pd.DataFrame, current: pd.DataFrame):
+    """
+    按 (查询时段, 门店编号, 日期) 比较两版清洗后的日度数据，找出有新增、删除或数值变化的门店
+
+    参数:
+        previous: 上一次载入的日度数据
+        current: 本次载入的日度数据
+
+    返回:
+        np.ndarray | None: 受影响的门店编号；列集合不同或行键不唯一时返回 None（需全量重算）
+    """
+    if set(previous.columns) != set(current.columns):
+        return None
+    encoder = KeyEncoder.from_frames(previous, current)
+    previous_index = pd.Index(encoder.encode(previous))
+    current_keys = encoder.encode(current)
+    if not (previous_index.is_unique and pd.Index(current_keys).is_unique):
+        return None
+
+    # 同一行键的新旧数值逐行比较（两侧均为缺失视为相同）
+    positions = previous_index.get_indexer(current_keys)
+    matched = np.flatnonzero(positions >= 0)
+    value_columns = [col for col in current.columns if col not in MERGE_KEYS]
+    new_values = current[value_columns].iloc[matched].to_numpy(dtype=np.float64, na_value=np.nan)
+    old_values = previous[value_columns].iloc[positions[matched]].to_numpy(dtype=np.float64, na_value=np.nan)
+    same = ((new_values == old_values) | (np.isnan(new_values) & np.isnan(old_values))).all(axis=1)
+
+    changed = positions < 0
+    changed[matched[~same]] = True
+    removed = np.ones(len(previous), dtype=bool)
+    removed[positions[matched]] = False
+    stores = np.concatenate([np.asarray(current['门店编号'], dtype=object)[changed],
+                             np.asarray(previous['门店编号'], dtype=object)[removed]])
+    return pd.unique(stores)
+
+
+class SalesWatcher:
+    """
+    监视模式：常驻进程轮询两个输入文件，文件变化后只重算受影响门店的结果并按门店改写数据库
+
+    保存上一次载入的主数据原表和清洗后的日度数据；补录文件变化时不重新解析主数据。
+    新旧日度数据按 (查询时段, 门店编号, 日期) 比较得到受影响门店，只对这些门店重算
+    同比数据、同比数据(存量)、目标数据，并通过 SQLiteWriter.patch 改写对应行。
+    时段映射或列结构变化、结果表结构不一致时退化为全量重算。
+    指定 goal_table 时同时轮询数据库中的目标表（其他连接提交修改后 PRAGMA data_version 变化，再比较表内容），
+    目标变化后重建目标矩阵并重算全部门店的目标数据。
+
+    用法:
+        watcher = SalesWatcher(writer, sales_path, supplement_path, CHANNEL_CATEGORIES, METRICS, PRIORITY_ORDER,
+                               {'同比数据': None, '同比数据(存量)': monthly_valid_store_mask}, kpis, goals)
+        watcher.run(interval=2)
+
+    参数:
+        writer: SQLiteWriter
+        sales_path / supplement_path: 主销售数据、补录数据 CSV 路径
+        category_config: 渠道分类配置（包含新前缀和组成部分）
+        metrics: 需要统计的核心指标列表
+        priority_order: 指标优先级排序
+        views: {结果表名: None 表示全部行，或 掩码函数(日度数据, years=(同期年份, 本期年份)) -> 布尔数组}
+        kpis: 派生指标定义列表
+        goals: 目标矩阵（GoalMatrix）
+        goal_table: 目标矩阵来源的数据库表名（如 'goal'），指定时轮询该表的变化
+        cache_dir: 目标矩阵缓存目录（见 GoalMatrix.cached）
+        schema: 宽表列名注册表
+        prorate: 月度目标是否按本期覆盖天数折算
+        write_mode: 全量重算时的写库方式
+        on_refresh: 每次结果写入数据库后调用的无参函数（如通知查询服务切换快照）
+    """
+
+    def __init__(self, writer, sales_path: str, supplement_path: str, category_config: list, metrics: list,
+                 priority_order: list, views: dict, kpis: list, goals, schema=None, prorate: bool = False,
+                 write_mode: str = 'replace', on_refresh=None, goal_table: str = None, cache_dir: str = None):
+        self.writer = writer
+        self.sales_path = sales_path
+        self.supplement_path = supplement_path
+        self.category_config = category_config
+        self.metrics = metrics
+        self.priority_order = priority_order
+        self.views = views
+        self.kpis = kpis
+        self.goals = goals
+        self.goal_table = goal_table
+        self.cache_dir = cache_dir
+        self.goal_version = None
+        self.goals_pending = False
+        self.schema = schema
+        self.prorate = prorate
+        self.write_mode = write_mode
+        self.on_refresh = on_refresh
+        self.file_states = {}
+        self.sales_df = None
+        self.supplement_df = None
+        self.daily_data = None
+        self.period_mapping = None
+
+    # ---------------------- 载入 ----------------------
+    def _load(self, changed: set) -> pd.DataFrame:
+        """重新读取发生变化的文件，与另一份在内存中的数据合并为清洗后的日度数据"""
+        with stage('监视:载入') as st:
+            if 'sales' in changed or self.sales_df is None:
+                self.sales_df = pd.read_csv(self.sales_path)
+            if 'supplement' in changed or self.supplement_df is None:
+                self.supplement_df = load_supplement_data(self.supplement_path)
+            pieces = [fold_sub_channels(piece) for piece in merge_supplement_chunks([self.sales_df], self.supplement_df)]
+            daily_data = encode_keys(pieces[0] if len(pieces) == 1 else pd.concat(pieces, ignore_index=True))
+            st.set_output(daily_data)
+        return daily_data
+
+    # ---------------------- 计算 ----------------------
+    def _compute(self, daily_data: pd.DataFrame, period_mapping: dict,
+                 view_funcs: dict = None) -> tuple[dict, pd.DataFrame]:
+        """计算各视图的同比结果和目标数据（daily_data 可以只包含部分门店，view_funcs 默认为全部视图）"""
+        years = compared_years(period_mapping)
+        views = {name: None if mask_func is None else mask_func(daily_data, years=years)
+                 for name, mask_func in (view_funcs or self.views).items()}
+        tables, period_mapping_df = process_sales_data_views(
+            daily_data, self.category_config, self.metrics, self.priority_order, views, self.kpis, period_mapping
+        )
+        first_view = next(iter(views))
+        tables[GOAL_TABLE] = calculate_goals(tables[first_view], self.goals, period_mapping_df, self.schema,
+                                             prorate=self.prorate)
+        return tables, period_mapping_df
+
+    def full_refresh(self, daily_data: pd.DataFrame) -> None:
+        """全量重算并写入全部结果表"""
+        print("监视模式：全量重算...")
+        period_mapping = identify_period_mapping(daily_data)
+        tables, period_mapping_df = self._compute(daily_data, period_mapping)
+        tables[PERIOD_TABLE] = period_mapping_df
+        for table_name, data in tables.items():
+            stats = self.writer.write(data, table_name, mode=self.write_mode)
+            print(f"  {table_name}: 新增 {stats['inserted']}，更新 {stats['updated']}，删除 {stats['deleted']}")
+        self.daily_data, self.period_mapping = daily_data, period_mapping
+        self.goals_pending = False
+
+    def refresh_goals(self) -> None:
+        """目标表变化后按新目标矩阵重算全部门店的目标数据（同比结果不变，不改写）"""
+        print("监视模式：目标表有变化，重算目标数据...")
+        first_view = dict([next(iter(self.views.items()))])
+        tables, _ = self._compute(self.daily_data, self.period_mapping, first_view)
+        stats = self.writer.write(tables[GOAL_TABLE], GOAL_TABLE, mode=self.write_mode)
+        print(f"  {GOAL_TABLE}: 新增 {stats['inserted']}，更新 {stats['updated']}，删除 {stats['deleted']}")
+        self.goals_pending = False
+
+    def incremental_refresh(self, daily_data: pd.DataFrame) -> None:
+        """只重算受影响门店并按门店改写结果表；无法增量时退化为全量重算"""
+        stores = changed_stores(self.daily_data, daily_data)
+        period_mapping = identify_period_mapping(daily_data)
+        if stores is None or period_mapping != self.period_mapping:
+            self.full_refresh(daily_data)
+            return
+        if len(stores) == 0:
+            print("监视模式：数据无变化")
+            self.daily_data = daily_data
+            return
+
+        print(f"监视模式：{len(stores)} 家门店数据有变化，按门店重算...")
+        subset = daily_data[daily_data['门店编号'].isin(stores).to_numpy()]
+        tables, _ = self._compute(subset, period_mapping)
+        keys = pd.DataFrame({'门店编号': stores})
+        try:
+            for table_name, data in tables.items():
+                stats = self.writer.patch(data, table_name, keys)
+                print(f"  {table_name}: 新增 {stats['inserted']}，更新 {stats['updated']}，"
+                      f"删除 {stats['deleted']}，未变 {stats['unchanged']}")
+        except ValueError as e:
+            print(f"{e}，改为全量重算")
+            self.full_refresh(daily_data)
+            return
+        self.daily_data = daily_data
+
+    # ---------------------- 轮询 ----------------------
+    def poll_goals(self) -> bool:
+        """
+        检查目标表是否变化：其他连接提交修改后重新读取目标表，内容不同时重建目标矩阵并标记待重算
+
+        返回:
+            bool: 是否有待重算的目标
+        """
+        if self.goal_table is None:
+            return False
+        version = self.writer.conn.execute('PRAGMA data_version').fetchone()[0]
+        if version != self.goal_version:
+            try:
+                goal_df = self.writer.read_table(self.goal_table)
+            except (sqlite3.Error, pd.errors.DatabaseError) as e:
+                print(f"读取目标表失败（{e}），稍后重试")
+                return self.goals_pending
+            self.goal_version = version
+            # 按内容哈希缓存，内容未变时返回同一个目标矩阵
+            goals = GoalMatrix.cached(goal_df, self.cache_dir)
+            if goals is not self.goals:
+                self.goals = goals
+                self.goals_pending = True
+        return self.goals_pending
+
+    def poll(self) -> bool:
+        """
+        检查输入文件和目标表是否变化，变化时载入并刷新结果
+
+        返回:
+            bool: 本次是否执行了刷新
+        """
+        goals_changed = self.poll_goals()
+        states = {'sales': file_state(self.sales_path), 'supplement': file_state(self.supplement_path)}
+        changed = {name for name, state in states.items() if state != self.file_states.get(name)}
+        if not changed:
+            if not (goals_changed and self.daily_data is not None):
+                return False
+            start = time.perf_counter()
+            self.refresh_goals()
+            if self.on_refresh is not None:
+                self.on_refresh()
+            print(f"监视模式：刷新完成，用时 {time.perf_counter() - start:.2f}s")
+            return True
+        if states['sales'] is None:
+            print(f"主销售数据文件不存在: {self.sales_path}")
+            return False
+        start = time.perf_counter()
+        try:
+            daily_data = self._load(changed)
+        except (OSError, ValueError) as e:
+            # 导出程序可能仍在写文件，下次轮询时重试
+            print(f"读取输入文件失败（{e}），稍后重试")
+            return False
+        self.file_states = states
+        if self.daily_data is None:
+            self.full_refresh(daily_data)
+        else:
+            self.incremental_refresh(daily_data)
+            if self.goals_pending:
+                self.refresh_goals()
+        if self.on_refresh is not None:
+            self.on_refresh()
+        print(f"监视模式：刷新完成，用时 {time.perf_counter() - start:.2f}s")
+        return True
+
+    def run(self, interval: float = 2.0, max_cycles: int = None) -> None:
+        """
+        轮询输入文件直到 Ctrl+C（或达到 max_cycles 次轮询）
+
+        参数:
+            interval: 轮询间隔（秒）
+            max_cycles: 最多轮询次数，默认不限
+        """
+        goal_note = f" 和目标表 {self.goal_table}" if self.goal_table else ''
+        print(f"监视模式已启动，每 {interval}s 检查一次 {self.sales_path}、{self.supplement_path}{goal_note}（Ctrl+C 退出）")
+        cycles = 0
+        try:
+            while max_cycles is None or cycles < max_cycles:
+                self.poll()
+                cycles += 1
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("监视模式已退出")